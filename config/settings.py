@@ -4,11 +4,14 @@ import os
 import json
 from datetime import datetime
 
-
 load_dotenv()
 
 MONGO_URI = os.getenv("MONGO_URI")
 MONGO_DATABASE = os.getenv("MONGO_DATABASE")
+# Directory of mongoexport files to extract from instead of MongoDB
+SOURCE_DIR = os.getenv("ETL_SOURCE_DIR")
+# Directory to write flattened tables to instead of MySQL
+OUTPUT_DIR = os.getenv("ETL_OUTPUT_DIR")
 SQL_CONFIG = {
     "host": os.getenv("SQL_HOST", "localhost"),
     "user": os.getenv("SQL_USER"),
@@ -17,13 +20,35 @@ SQL_CONFIG = {
     "port": int(os.getenv("SQL_PORT", 3306)),
 }
 
+# Resolved next to this file, so the settings load from any working directory
+# (Airflow parses DAGs from its own)
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.json")
+
 # Load ETL configurations from config.json
-with open("config/config.json") as config_file:
+with open(CONFIG_PATH) as config_file:
     etl_config = json.load(config_file)
 
 
 # ETL Configuration
 ETL_BATCH_SIZE = etl_config.get("ETL_BATCH_SIZE", 1000)
+ETL_PARTITION_SIZE = etl_config.get("ETL_PARTITION_SIZE", 100000)
+DEAD_LETTER_DIR = etl_config.get("DEAD_LETTER_DIR", "data/dead_letter")
+EXISTENCE_FILTER_MEMORY_MB = etl_config.get("EXISTENCE_FILTER_MEMORY_MB", 8)
+PIPELINE_WORKERS = etl_config.get(
+    "PIPELINE_WORKERS", {"extract": 1, "transform": 2, "load": 1}
+)
+PIPELINE_QUEUE_SIZE = etl_config.get("PIPELINE_QUEUE_SIZE", 4)
+METRICS_CONFIG = etl_config.get("METRICS", {})
+COORDINATION_CONFIG = etl_config.get("COORDINATION", {})
+ID_LOOKUP_CONFIG = etl_config.get("ID_LOOKUP", {})
+ID_ALLOCATOR_CONFIG = etl_config.get("ID_ALLOCATOR", {})
+AGGREGATES_CONFIG = etl_config.get("AGGREGATES", {})
+PARTITIONING_CONFIG = etl_config.get("PARTITIONING", {})
+EXPORT_CONFIG = etl_config.get("EXPORT", {})
+SINK_CONFIG = etl_config.get("SINK", {})
+MONGO_CONFIG = etl_config.get("MONGO", {})
+VALIDATION_CONFIG = etl_config.get("VALIDATION", {})
+MEMORY_CONFIG = etl_config.get("MEMORY", {})
 LAST_UPDATED = datetime.fromisoformat(
     etl_config.get("last_updated", "2023-10-01T12:00:00Z")
 )
@@ -31,14 +56,14 @@ LAST_UPDATED = datetime.fromisoformat(
 
 def update_last_updated():
     # Load the current configuration
-    with open("config/config.json", "r") as config_file:
+    with open(CONFIG_PATH, "r") as config_file:
         config = json.load(config_file)
 
     # Update the LAST_UPDATED field with the current timestamp
     config["last_updated"] = datetime.now().astimezone().isoformat()
 
     # Write the updated configuration back to the file
-    with open("config/config.json", "w") as config_file:
+    with open(CONFIG_PATH, "w") as config_file:
         json.dump(config, config_file, indent=4)
 
 
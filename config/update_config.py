@@ -1,6 +1,6 @@
 import json
 
-CONFIG_PATH = "config/config.json"
+from config.settings import CONFIG_PATH
 
 
 def update_last_processed_id(collection_name, last_id):
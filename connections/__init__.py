@@ -1,2 +1,14 @@
-from .sql_connector import get_mysql_engine
-from .mongo_connector import get_mongo_client
+# The connectors pull in SQLAlchemy, the models and pymongo, so they are only
+# imported when one of them is first used
+_EXPORTS = {
+    "get_mysql_engine": ".sql_connector",
+    "get_mongo_client": ".mongo_connector",
+}
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    from importlib import import_module
+
+    return getattr(import_module(_EXPORTS[name], __name__), name)
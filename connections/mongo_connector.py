@@ -1,37 +1,212 @@
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
 from dotenv import load_dotenv
 
-from config.settings import MONGO_URI
+from config.settings import MONGO_CONFIG, MONGO_URI
 
 # Load environment variables from the .env file
 load_dotenv()
 
+# Profile of the clients used for the long `_id`-ordered extraction scans
+EXTRACTION_PROFILE = "extraction"
+# MongoClient options every client starts from
+DEFAULT_CLIENT_OPTIONS = {"serverSelectionTimeoutMS": 5000}
+DEFAULT_BATCH_SIZE = 1000
+# The server expires sessions idle for 30 minutes, cursors included
+DEFAULT_SESSION_REFRESH_SECONDS = 600
+
+_clients: Dict[str, Any] = {}
+_client_lock = threading.Lock()
+
+
+def _profile(profile: Optional[str]) -> Dict[str, Any]:
+    if profile is None:
+        return {}
+    profiles = MONGO_CONFIG.get("profiles", {})
+    if profile not in profiles:
+        raise KeyError(
+            f"MongoDB profile '{profile}' not found. Available profiles: {list(profiles)}"
+        )
+    return profiles[profile]
+
+
+def client_options(profile: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Returns the MongoClient keyword options of a profile.
+
+    `MONGO.client` applies to every client; a profile's `client` options
+    are applied on top (pool size, compressors, read preference, ...).
+    """
+    options = dict(DEFAULT_CLIENT_OPTIONS)
+    options.update(MONGO_CONFIG.get("client", {}))
+    options.update(_profile(profile).get("client", {}))
+    return options
+
 
-def get_mongo_client():
+def get_mongo_client(profile: Optional[str] = None):
     """
     Connect to MongoDB using the credentials from the .env file.
     Handles potential connection errors and prints appropriate messages.
+
+    Clients are created once per profile and shared, as each holds its own
+    connection pool.
+
+    Args:
+        profile: Name of a `MONGO.profiles` entry, e.g. EXTRACTION_PROFILE
+            (None: the default client)
     """
-    try:
-        client = MongoClient(
-            MONGO_URI, serverSelectionTimeoutMS=5000
-        )  # 5-second timeout
-        client.admin.command("ping")  # Ping the server to validate the connection
-        print(f"Connected to MongoDB")
-        return client
-
-    except ConnectionFailure as e:
-        # Handle connection errors
-        print(f"Failed to connect to MongoDB: {e}")
-        print(
-            "Please ensure the MongoDB service is running and the connection details are correct."
+    # Imported here so importing the ETL modules stays cheap
+    from pymongo import MongoClient
+    from pymongo.errors import ConnectionFailure
+
+    key = profile or "default"
+    with _client_lock:
+        if key in _clients:
+            return _clients[key]
+        try:
+            client = MongoClient(MONGO_URI, **client_options(profile))
+            client.admin.command("ping")  # Ping the server to validate the connection
+            print(f"Connected to MongoDB ({key} profile)")
+            _clients[key] = client
+            return client
+
+        except ConnectionFailure as e:
+            # Handle connection errors
+            print(f"Failed to connect to MongoDB: {e}")
+            print(
+                "Please ensure the MongoDB service is running and the connection details are correct."
+            )
+
+        except ValueError as ve:
+            # Handle missing environment variables
+            print(f"Error: {ve}")
+
+        except Exception as e:
+            # Handle any other unexpected errors
+            print(f"An unexpected error occurred: {e}")
+
+
+def _refresh_session(client, session, interval: float, stopped: threading.Event):
+    while not stopped.wait(interval):
+        try:
+            # Sessions are not thread-safe, so the command runs in its own
+            client.admin.command("refreshSessions", [session.session_id])
+        except Exception as e:
+            print(f"Failed to refresh MongoDB session: {e}")
+
+
+@contextmanager
+def scan_cursor(
+    collection, query, projection=None, profile: Optional[str] = EXTRACTION_PROFILE
+):
+    """
+    Opens an `_id`-ordered cursor over a collection for a long scan.
+
+    The profile's `batch_size` sets the documents per getMore round trip.
+    With `no_cursor_timeout`, a slow consumer does not lose the cursor
+    after the server's 10 minute idle timeout; the cursor is bound to an
+    explicit session that is refreshed in the background every
+    `session_refresh_seconds`, since an expired session kills its cursors
+    regardless. The cursor is closed when the context exits.
+
+    Args:
+        collection: pymongo collection to scan
+        query: Filter of the scan
+        projection: Optional projection of the returned documents
+        profile: Profile the cursor settings are read from
+
+    Yields:
+        The pymongo cursor
+    """
+    settings = _profile(profile)
+    no_cursor_timeout = settings.get("no_cursor_timeout", False)
+    client = collection.database.client
+    with client.start_session(causal_consistency=False) as session:
+        cursor = (
+            collection.find(
+                query,
+                projection,
+                no_cursor_timeout=no_cursor_timeout,
+                session=session,
+            )
+            .sort("_id")
+            .batch_size(settings.get("batch_size", DEFAULT_BATCH_SIZE))
         )
+        stopped = threading.Event()
+        if no_cursor_timeout:
+            threading.Thread(
+                target=_refresh_session,
+                args=(
+                    client,
+                    session,
+                    settings.get(
+                        "session_refresh_seconds", DEFAULT_SESSION_REFRESH_SECONDS
+                    ),
+                    stopped,
+                ),
+                daemon=True,
+            ).start()
+        try:
+            yield cursor
+        finally:
+            stopped.set()
+            cursor.close()
+
+
+def server_counters(client) -> Dict[str, Dict[str, int]]:
+    """
+    Reads the wire traffic and read operation counters of every member.
+
+    `bytesOut` counts the uncompressed bytes the server sent and
+    `physicalBytesOut` what actually went over the network, so their ratio
+    is the compression achieved; `query` and `getmore` show which members
+    served the reads.
+
+    Returns:
+        Dictionary mapping "host:port" to its counters
+    """
+    from pymongo import MongoClient
+
+    counters = {}
+    for host, port in client.nodes or {client.address}:
+        member = MongoClient(
+            host,
+            port,
+            directConnection=True,
+            **DEFAULT_CLIENT_OPTIONS,
+            **_credentials(),
+        )
+        try:
+            status = member.admin.command("serverStatus")
+        finally:
+            member.close()
+        network = status.get("network", {})
+        opcounters = status.get("opcounters", {})
+        repl = status.get("repl", {})
+        counters[f"{host}:{port}"] = {
+            "bytes_in": network.get("bytesIn", 0),
+            "bytes_out": network.get("bytesOut", 0),
+            "physical_bytes_in": network.get("physicalBytesIn", 0),
+            "physical_bytes_out": network.get("physicalBytesOut", 0),
+            "query": opcounters.get("query", 0),
+            "getmore": opcounters.get("getmore", 0),
+            "is_primary": bool(repl.get("isWritablePrimary", repl.get("ismaster"))),
+        }
+    return counters
+
 
-    except ValueError as ve:
-        # Handle missing environment variables
-        print(f"Error: {ve}")
+def _credentials() -> Dict[str, Any]:
+    """Authentication options of MONGO_URI, for direct connections to members."""
+    from pymongo.uri_parser import parse_uri
 
-    except Exception as e:
-        # Handle any other unexpected errors
-        print(f"An unexpected error occurred: {e}")
+    parsed = parse_uri(MONGO_URI)
+    options = {}
+    if parsed.get("username"):
+        options["username"] = parsed["username"]
+        options["password"] = parsed["password"]
+    for name in ("authSource", "authMechanism", "tls"):
+        if name in parsed["options"]:
+            options[name] = parsed["options"][name]
+    return options
@@ -1,13 +1,23 @@
 import mysql.connector
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.schema import CreateColumn, CreateIndex
 from typing import Optional, Dict, Any
 from contextlib import contextmanager
 import logging
+import threading
 from config.settings import SQL_CONFIG
 from models.sql.sql_models import Base
 
 logger = logging.getLogger(__name__)
 
+_engine = None
+_engine_lock = threading.Lock()
+
+# Data migrations of addresses.geo_location (see _migrate_geo_location)
+GEO_AXES_MIGRATION = "swap_address_geo_axes"
+ADDRESS_LOCATIONS_MIGRATION = "fill_address_locations"
+MIGRATION_CHUNK_ROWS = 10000
+
 
 class DatabaseConnectionError(Exception):
     """Custom exception for database connection errors."""
@@ -15,6 +25,12 @@ class DatabaseConnectionError(Exception):
     pass
 
 
+class SchemaMigrationError(Exception):
+    """Custom exception for schema migrations that could not be completed."""
+
+    pass
+
+
 class MySQLConnector:
     """Handles MySQL database connections and operations."""
 
@@ -58,7 +74,7 @@ class MySQLConnector:
         return (
             f"mysql+mysqlconnector://"
             f"{self.config['user']}:{self.config['password']}"
-            f"@{self.config['host']}/{self.config['database']}"
+            f"@{self.config['host']}:{self.config['port']}/{self.config['database']}"
         )
 
     def _initialize_engine(self) -> None:
@@ -90,6 +106,183 @@ class MySQLConnector:
         except Exception as e:
             logger.warning(f"Table creation skipped, tables may already exist: {e}")
 
+    def _add_missing_columns(self) -> None:
+        """
+        Adds columns declared in the models but missing from existing tables.
+        `create_all` only creates new tables, so this keeps older databases
+        in step with additive model changes.
+        """
+        try:
+            inspector = inspect(self.engine)
+            with self.engine.begin() as conn:
+                for table in Base.metadata.sorted_tables:
+                    existing = {
+                        col["name"] for col in inspector.get_columns(table.name)
+                    }
+                    for column in table.columns:
+                        if column.name in existing:
+                            continue
+                        column_ddl = CreateColumn(column).compile(
+                            dialect=self.engine.dialect
+                        )
+                        conn.execute(
+                            text(f"ALTER TABLE {table.name} ADD COLUMN {column_ddl}")
+                        )
+                        logger.info(f"Added missing column {table.name}.{column.name}")
+        except Exception as e:
+            logger.warning(f"Column synchronisation skipped: {e}")
+
+    def _migrate_geo_location(self) -> None:
+        """
+        Brings `addresses.geo_location` and its indexed copy in line with the models.
+
+        Tables created before the SPATIAL index was declared were loaded with
+        longitude-first WKT, which MySQL reads latitude first for SRID 4326,
+        so their points are swapped back. A NOT NULL column left by an
+        earlier release, which only wrote latitude-first points, loses its
+        index and is made nullable again. Located addresses are then copied
+        to `address_locations`, which carries the index.
+
+        Raises:
+            SchemaMigrationError: If a step fails; the next start resumes it
+        """
+        with self.engine.connect() as conn:
+            column = conn.execute(
+                text(
+                    "SELECT IS_NULLABLE, SRS_ID FROM information_schema.COLUMNS "
+                    "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'addresses' "
+                    "AND COLUMN_NAME = 'geo_location'"
+                )
+            ).one_or_none()
+        if column is None:
+            return
+
+        try:
+            if column[0] == "NO":
+                self._mark_migrated(GEO_AXES_MIGRATION)
+            self._run_chunked_migration(
+                GEO_AXES_MIGRATION,
+                "UPDATE addresses SET geo_location = ST_SwapXY(geo_location) "
+                "WHERE id > :last_id AND id <= :upper_id",
+            )
+            if column[0] == "NO" or column[1] != 4326:
+                with self.engine.begin() as conn:
+                    if conn.execute(
+                        text(
+                            "SELECT COUNT(*) FROM information_schema.STATISTICS "
+                            "WHERE TABLE_SCHEMA = DATABASE() "
+                            "AND TABLE_NAME = 'addresses' "
+                            "AND INDEX_NAME = 'idx_addresses_geo'"
+                        )
+                    ).scalar():
+                        conn.execute(
+                            text("ALTER TABLE addresses DROP INDEX idx_addresses_geo")
+                        )
+                    conn.execute(
+                        text(
+                            "ALTER TABLE addresses "
+                            "MODIFY geo_location POINT NULL SRID 4326"
+                        )
+                    )
+                logger.info("Migrated addresses.geo_location to POINT NULL SRID 4326")
+            self._run_chunked_migration(
+                ADDRESS_LOCATIONS_MIGRATION,
+                "INSERT IGNORE INTO address_locations (address_id, geo_point) "
+                "SELECT id, geo_location FROM addresses "
+                "WHERE id > :last_id AND id <= :upper_id "
+                "AND geo_location IS NOT NULL",
+            )
+        except Exception as e:
+            logger.error(f"Failed to migrate addresses.geo_location: {e}")
+            raise SchemaMigrationError(f"geo_location migration failed: {e}") from e
+
+    def _mark_migrated(self, name: str) -> None:
+        """Records a data migration as completed without running it."""
+        with self.engine.begin() as conn:
+            conn.execute(
+                text(
+                    "INSERT INTO schema_migrations (name, completed_at) "
+                    "VALUES (:name, NOW(6)) "
+                    "ON DUPLICATE KEY UPDATE "
+                    "completed_at = COALESCE(completed_at, NOW(6))"
+                ),
+                {"name": name},
+            )
+
+    def _run_chunked_migration(
+        self, name: str, statement: str, table: str = "addresses"
+    ) -> None:
+        """
+        Runs a data migration over every row of a table, once.
+
+        `statement` is run for consecutive id ranges (`:last_id`,
+        `:upper_id`] of MIGRATION_CHUNK_ROWS ids, each committed together
+        with its progress in `schema_migrations`. An interrupted migration
+        therefore resumes where it stopped instead of running on rows twice,
+        and processes starting concurrently take turns on the migration
+        row's lock. On an empty table the migration completes at once.
+        """
+        with self.engine.begin() as conn:
+            conn.execute(
+                text("INSERT IGNORE INTO schema_migrations (name) VALUES (:name)"),
+                {"name": name},
+            )
+            max_id = conn.execute(text(f"SELECT MAX(id) FROM {table}")).scalar() or 0
+
+        while True:
+            with self.engine.begin() as conn:
+                last_id, completed_at = conn.execute(
+                    text(
+                        "SELECT last_id, completed_at FROM schema_migrations "
+                        "WHERE name = :name FOR UPDATE"
+                    ),
+                    {"name": name},
+                ).one()
+                if completed_at is not None:
+                    return
+                upper_id = min(last_id + MIGRATION_CHUNK_ROWS, max_id)
+                conn.execute(
+                    text(statement), {"last_id": last_id, "upper_id": upper_id}
+                )
+                conn.execute(
+                    text(
+                        "UPDATE schema_migrations SET last_id = :upper_id, "
+                        "completed_at = IF(:done, NOW(6), NULL) WHERE name = :name"
+                    ),
+                    {"upper_id": upper_id, "done": upper_id >= max_id, "name": name},
+                )
+            logger.info(f"Migration {name} done up to {table} id {upper_id}")
+
+    def _add_missing_indexes(self) -> None:
+        """
+        Creates indexes declared in the models but missing from the database.
+
+        geoalchemy2 takes indexes on geometry columns out of `create_all`,
+        so the SPATIAL index on address_locations is only ever created here. Columns
+        already covered by an index of another name are left alone. A
+        failing index is logged and does not keep the others from being
+        created.
+        """
+        inspector = inspect(self.engine)
+        for table in Base.metadata.sorted_tables:
+            try:
+                existing = inspector.get_indexes(table.name)
+            except Exception as e:
+                logger.warning(f"Index synchronisation of {table.name} skipped: {e}")
+                continue
+            names = {index["name"] for index in existing}
+            covered = {tuple(index["column_names"]) for index in existing}
+            for index in table.indexes:
+                columns = tuple(column.name for column in index.columns)
+                if index.name in names or columns in covered:
+                    continue
+                try:
+                    with self.engine.begin() as conn:
+                        conn.execute(CreateIndex(index))
+                    logger.info(f"Added missing index {index.name}")
+                except Exception as e:
+                    logger.error(f"Failed to add index {index.name}: {e}")
+
     def _test_connection(self) -> None:
         """
         Tests the database connection by executing a simple query.
@@ -110,11 +303,18 @@ class MySQLConnector:
 
         Returns:
             MySQLConnector: Self reference if successful, None if failed
+
+        Raises:
+            SchemaMigrationError: If a data migration fails, so that the error
+                surfaces instead of a missing engine
         """
         try:
             self._create_database()
             self._initialize_engine()
             self._create_tables()
+            self._add_missing_columns()
+            self._migrate_geo_location()
+            self._add_missing_indexes()
             self._test_connection()
             logger.info("Successfully connected to MySQL database via SQLAlchemy")
             return self
@@ -146,12 +346,20 @@ def get_mysql_engine():
     """
     Factory function to create and initialize MySQL connection.
 
+    The engine is created on first use and shared afterwards, so its
+    connection pool is reused and the database and tables are only set up
+    once per process. A failed initialization is retried on the next call.
+
     Returns:
         SQLAlchemy engine instance or None if initialization fails
-    """
-    connector = MySQLConnector(SQL_CONFIG)
-    initialized_connector = connector.initialize()
 
-    if initialized_connector:
-        return initialized_connector.engine
-    return None
+    Raises:
+        SchemaMigrationError: If a data migration fails
+    """
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            initialized_connector = MySQLConnector(SQL_CONFIG).initialize()
+            if initialized_connector:
+                _engine = initialized_connector.engine
+        return _engine
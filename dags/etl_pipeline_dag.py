@@ -1,7 +1,7 @@
 from airflow import DAG
 from airflow.operators.python import PythonOperator
 from datetime import datetime
-from etl.etl_pipeline import first_pipeline, second_pipeline, third_pipeline
+from etl.table_graph import build_dependency_graph
 from utils.helpers import send_failure_email
 
 import logging
@@ -16,6 +16,20 @@ def send_failure_notification(context):
     send_failure_email(context)
 
 
+# The ETL modules import pandas and SQLAlchemy, so they are only imported
+# inside the task callables and never while the scheduler parses this file.
+def plan_table_partitions(table):
+    from etl.etl_pipeline import plan_table_partitions
+
+    return plan_table_partitions(table)
+
+
+def run_table_partition(table, lower_id=None, upper_id=None):
+    from etl.etl_pipeline import run_table_partition
+
+    run_table_partition(table, lower_id, upper_id)
+
+
 default_args = {
     "owner": "airflow",
     "depends_on_past": False,
@@ -27,27 +41,31 @@ default_args = {
 dag = DAG(
     "mongo_to_mysql_etl_pipeline_dag",
     default_args=default_args,
-    description="A simple ETL pipeline DAG",
+    description="ETL pipeline DAG with one mapped task per table partition",
     schedule="@daily",
 )
 
-first_pipeline_task = PythonOperator(
-    task_id="first_pipeline",
-    python_callable=first_pipeline,
-    dag=dag,
-)
+# One planning task per table splits its source collection into `_id` ranges
+# at run time, and one mapped task instance loads each range, so partitions
+# spread across workers and retry individually.
+dependency_graph = build_dependency_graph()
+load_tasks = {}
 
-second_pipeline_task = PythonOperator(
-    task_id="second_pipeline",
-    python_callable=second_pipeline,
-    dag=dag,
-)
-
-third_pipeline_task = PythonOperator(
-    task_id="third_pipeline",
-    python_callable=third_pipeline,
-    dag=dag,
-)
+for table in dependency_graph:
+    plan_task = PythonOperator(
+        task_id=f"plan_{table}",
+        python_callable=plan_table_partitions,
+        op_kwargs={"table": table},
+        dag=dag,
+    )
+    load_tasks[table] = PythonOperator.partial(
+        task_id=f"load_{table}",
+        python_callable=run_table_partition,
+        dag=dag,
+    ).expand(op_kwargs=plan_task.output)
 
-# Define the order of tasks
-first_pipeline_task >> second_pipeline_task >> third_pipeline_task
+# A table's partitions start once every partition of the tables it references
+# has been loaded
+for table, parents in dependency_graph.items():
+    for parent in parents:
+        load_tasks[parent] >> load_tasks[table]
@@ -0,0 +1,302 @@
+"""
+Command line entry point for the ETL pipeline.
+
+    python -m etl run --role local
+    python -m etl run --role coordinator --run-id 2024-06-01
+    python -m etl run --role worker --run-id 2024-06-01
+    python -m etl status --run-id 2024-06-01
+    python -m etl reconcile --tables orders cod_payments
+    python -m etl rebuild-aggregates --since 2024-01-01
+    python -m etl partitions convert --tables orders
+    python -m etl partitions archive --before 2023-01-01
+    python -m etl export --tables orders trackers
+
+A local run loads everything in this process. For multi-node runs, one
+coordinator splits every table into `_id` range work units, and any number
+of workers, on any host sharing the coordination database, claim and load
+them until the run is finished. `reconcile` compares MongoDB with MySQL
+through range checksums and exits with 1 when they differ.
+`rebuild-aggregates` recomputes the summary tables the loader maintains.
+`partitions` converts the fact tables to monthly partitions, creates
+upcoming months, and drops or archives old ones. `export` writes the
+tables to Parquet for analytics, incrementally after the first run.
+"""
+
+import argparse
+import json
+import logging
+import os
+import socket
+import sys
+from datetime import date
+
+from utils.profiling import PROFILE_DIR, profiling
+
+logger = logging.getLogger(__name__)
+
+
+def _default_owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _run_local(args) -> None:
+    from etl.etl_pipeline import run_pipeline
+
+    run_pipeline(
+        backfill=args.backfill, max_workers=args.max_workers, tables=args.tables
+    )
+
+
+def _run_coordinator(args) -> None:
+    from config.settings import ETL_PARTITION_SIZE
+    from etl.coordination import WorkCoordinator
+    from etl.etl_pipeline import plan_table_partitions
+    from etl.table_graph import build_dependency_graph
+
+    coordinator = WorkCoordinator(url=args.coordination_url)
+    partition_size = args.partition_size or ETL_PARTITION_SIZE
+    partitions = {
+        table: plan_table_partitions(table, partition_size)
+        for table in build_dependency_graph(args.tables)
+    }
+    coordinator.plan(args.run_id, partitions)
+
+
+def _run_worker(args) -> None:
+    from etl.coordination import WorkCoordinator, run_worker
+    from etl.etl_pipeline import run_table_partition
+    from etl.sinks import check_multi_process, get_sink
+    from utils.metrics import start_metrics_exporters
+
+    check_multi_process(get_sink())
+    start_metrics_exporters()
+    coordinator = WorkCoordinator(url=args.coordination_url)
+    run_worker(coordinator, args.run_id, args.owner, run_table_partition)
+
+
+def _status(args) -> int:
+    from etl.coordination import WorkCoordinator
+
+    status = WorkCoordinator(url=args.coordination_url).table_status(args.run_id)
+    if not status:
+        print(f"No work units for run {args.run_id}")
+        return 1
+    for table, counts in sorted(status.items()):
+        summary = ", ".join(f"{name}={count}" for name, count in sorted(counts.items()))
+        print(f"{table}: {summary}")
+    return 0
+
+
+def _reconcile(args) -> int:
+    from etl.reconcile import Reconciler
+
+    reports = Reconciler(
+        range_size=args.range_size,
+        leaf_size=args.leaf_size,
+        max_workers=args.max_workers,
+    ).reconcile(args.tables)
+    for name, report in reports.items():
+        status = "ok" if report["ok"] else "MISMATCH"
+        print(
+            f"{name:18} {status:8} source={report['source_rows']} "
+            f"target={report['target_rows']} "
+            f"mismatched_ranges={len(report['mismatched_ranges'])}/{report['ranges']} "
+            f"missing={report['missing_in_target_count']} "
+            f"unexpected={report['unexpected_in_target_count']} "
+            f"different={report['different_count']}"
+        )
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(reports, output_file, indent=2)
+    return 0 if all(report["ok"] for report in reports.values()) else 1
+
+
+def _rebuild_aggregates(args) -> int:
+    from etl.aggregates import rebuild_aggregates, refresh_pending
+
+    if args.pending:
+        days = refresh_pending(force=True)
+    else:
+        days = rebuild_aggregates(since=args.since, until=args.until)
+    print(f"Rebuilt order statistics of {days} days")
+    return 0
+
+
+def _partitions(args) -> int:
+    from connections.sql_connector import get_mysql_engine
+    from etl.partitioning import get_partition_manager
+
+    manager = get_partition_manager()
+    tables = args.tables or manager.tables
+    if args.action in ("drop", "archive") and args.before is None:
+        print(f"partitions {args.action} needs --before")
+        return 2
+    for table in tables:
+        if args.action == "convert":
+            with get_mysql_engine().connect() as conn:
+                names = manager.partition_table(conn, table)
+        elif args.action == "extend":
+            with get_mysql_engine().connect() as conn:
+                names = manager.extend(conn, table)
+        elif args.action == "drop":
+            names = manager.drop_partitions(table, args.before)
+        else:
+            names = manager.archive_partitions(table, args.before)
+        print(f"{table}: {args.action} {', '.join(names) or 'nothing to do'}")
+    return 0
+
+
+def _export(args) -> int:
+    from etl.export import TableExporter
+
+    options = {
+        name: value
+        for name, value in [
+            ("output_dir", args.output_dir),
+            ("range_size", args.range_size),
+            ("max_workers", args.max_workers),
+        ]
+        if value is not None
+    }
+    reports = TableExporter(**options).export(args.tables, full=args.full)
+    for name, report in reports.items():
+        print(
+            f"{name:18} {report['mode']:12} rows={report['rows']} "
+            f"files={report['files']} seconds={report['seconds']}"
+        )
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m etl", description=__doc__)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    coordination = argparse.ArgumentParser(add_help=False)
+    coordination.add_argument(
+        "--run-id",
+        default=date.today().isoformat(),
+        help="Run shared by the coordinator and its workers (default: today)",
+    )
+    coordination.add_argument(
+        "--coordination-url",
+        help="SQLAlchemy URL of the coordination database, "
+        "e.g. sqlite:///data/coordination.db (default: config.json, else MySQL)",
+    )
+
+    run = commands.add_parser("run", parents=[coordination], help="Run the pipeline")
+    run.add_argument(
+        "--role", choices=["local", "coordinator", "worker"], default="local"
+    )
+    run.add_argument("--tables", nargs="+", help="Tables to load (default: all)")
+    run.add_argument("--max-workers", type=int, default=3)
+    run.add_argument("--backfill", action="store_true")
+    run.add_argument("--partition-size", type=int, default=None)
+    run.add_argument("--owner", default=_default_owner())
+    run.add_argument(
+        "--profile",
+        action="store_true",
+        help="Profile every collection and stage, writing flamegraph-ready output",
+    )
+    run.add_argument(
+        "--profile-mode", choices=["sampling", "cprofile"], default="sampling"
+    )
+    run.add_argument("--profile-dir", default=PROFILE_DIR)
+
+    commands.add_parser(
+        "status", parents=[coordination], help="Show the work units of a run"
+    )
+
+    reconcile = commands.add_parser(
+        "reconcile", help="Compare MongoDB and MySQL through range checksums"
+    )
+    reconcile.add_argument(
+        "--tables",
+        nargs="+",
+        help="Pairs to compare, e.g. orders pickup_addresses (default: all)",
+    )
+    reconcile.add_argument(
+        "--range-size", type=int, default=100000, help="Documents per checked range"
+    )
+    reconcile.add_argument(
+        "--leaf-size",
+        type=int,
+        default=1000,
+        help="Mismatching ranges this small are compared row by row",
+    )
+    reconcile.add_argument("--max-workers", type=int, default=4)
+    reconcile.add_argument("--output", help="Write the full reports to this JSON file")
+
+    rebuild = commands.add_parser(
+        "rebuild-aggregates", help="Recompute the order statistics tables"
+    )
+    rebuild.add_argument(
+        "--since", type=date.fromisoformat, help="First day (default: first order)"
+    )
+    rebuild.add_argument(
+        "--until", type=date.fromisoformat, help="Last day (default: last order)"
+    )
+    rebuild.add_argument(
+        "--pending",
+        action="store_true",
+        help="Only recompute the days queued by the loader, e.g. after failures",
+    )
+
+    partitions = commands.add_parser(
+        "partitions", help="Maintain the monthly partitions of the fact tables"
+    )
+    partitions.add_argument(
+        "action",
+        choices=["convert", "extend", "drop", "archive"],
+        help="convert tables, create upcoming months, or drop/archive old months",
+    )
+    partitions.add_argument(
+        "--tables", nargs="+", help="Tables to maintain (default: PARTITIONING.tables)"
+    )
+    partitions.add_argument(
+        "--before",
+        type=date.fromisoformat,
+        help="drop/archive the months ending on or before this date",
+    )
+
+    export = commands.add_parser("export", help="Export the tables to Parquet")
+    export.add_argument("--tables", nargs="+", help="Tables to export (default: all)")
+    export.add_argument(
+        "--full",
+        action="store_true",
+        help="Export every row and replace earlier files, ignoring the watermarks",
+    )
+    export.add_argument("--output-dir", help="Default: EXPORT.output_dir")
+    export.add_argument("--range-size", type=int, help="Primary key values per range")
+    export.add_argument("--max-workers", type=int)
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.command == "status":
+        return _status(args)
+    if args.command == "reconcile":
+        return _reconcile(args)
+    if args.command == "rebuild-aggregates":
+        return _rebuild_aggregates(args)
+    if args.command == "partitions":
+        return _partitions(args)
+    if args.command == "export":
+        return _export(args)
+
+    runner = {
+        "coordinator": _run_coordinator,
+        "worker": _run_worker,
+        "local": _run_local,
+    }[args.role]
+    if not args.profile:
+        runner(args)
+        return 0
+
+    with profiling(args.profile_dir, args.profile_mode):
+        runner(args)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
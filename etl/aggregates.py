@@ -0,0 +1,288 @@
+import logging
+import threading
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import and_, delete, func, or_, select, text
+from sqlalchemy.dialects.mysql import insert
+
+from config.settings import AGGREGATES_CONFIG
+from connections.sql_connector import get_mysql_engine
+from models.sql.sql_models import (
+    Address,
+    CodPayment,
+    Order,
+    OrderDailyZoneStats,
+    OrderStatsPendingDay,
+)
+
+logger = logging.getLogger(__name__)
+
+# Days recomputed per transaction by a refresh or a full rebuild
+REBUILD_DAYS_PER_CHUNK = AGGREGATES_CONFIG.get("rebuild_days_per_chunk", 31)
+
+# For each loaded table: the batch field and the orders column that find the
+# orders whose statistics a written row can change
+AFFECTED_ORDERS = {
+    "orders": ("id", Order.id),
+    "addresses": ("id", Order.dropoff_address_id),
+    "cod_payments": ("order_id", Order.id),
+}
+
+# Switched off while backfilling, which rebuilds the statistics once at the end
+MAINTENANCE = {"incremental": AGGREGATES_CONFIG.get("incremental", True)}
+
+# Set once this process queued days, so `refresh_pending` has work to do
+_queued = threading.Event()
+
+
+def _day_runs(days: Iterable[date]) -> List[Tuple[date, date]]:
+    """Merges days into inclusive (first, last) runs of consecutive days."""
+    runs = []
+    for day in sorted(set(days)):
+        if runs and day - runs[-1][1] == timedelta(days=1):
+            runs[-1] = (runs[-1][0], day)
+        else:
+            runs.append((day, day))
+    return runs
+
+
+def _day_count(runs: List[Tuple[date, date]]) -> int:
+    return sum((last - first).days + 1 for first, last in runs)
+
+
+def _chunk_runs(
+    runs: List[Tuple[date, date]], days: int = REBUILD_DAYS_PER_CHUNK
+) -> Iterator[List[Tuple[date, date]]]:
+    """Splits day runs into groups covering at most `days` days each."""
+    chunk, size = [], 0
+    for first, last in runs:
+        while first <= last:
+            chunk_last = min(last, first + timedelta(days=days - size - 1))
+            chunk.append((first, chunk_last))
+            size += (chunk_last - first).days + 1
+            if size == days:
+                yield chunk
+                chunk, size = [], 0
+            first = chunk_last + timedelta(days=1)
+    if chunk:
+        yield chunk
+
+
+def _day_bounds(first: date, last: date):
+    """Condition on orders.created_at covering the days, usable by its index."""
+    return and_(
+        Order.created_at >= datetime.combine(first, datetime.min.time()),
+        Order.created_at
+        < datetime.combine(last + timedelta(days=1), datetime.min.time()),
+    )
+
+
+def refresh_days(conn, runs: List[Tuple[date, date]]) -> None:
+    """
+    Recomputes the statistics of the given day runs from the fact tables.
+
+    The groups are computed by a plain SELECT, a consistent read that takes
+    no locks on `orders`, `addresses` or `cod_payments`, unlike an
+    `INSERT ... SELECT`, which would block loaders writing those days. They
+    are then upserted, and groups of those days that were not produced
+    (e.g. an order moved to another zone) are deleted, all in the caller's
+    transaction. Stamping rows with the server clock keeps concurrent
+    refreshes of the same day from deleting each other's rows.
+
+    Args:
+        conn: Connection with an open transaction
+        runs: Inclusive (first, last) day ranges
+    """
+    if not runs:
+        return
+    refreshed_at = conn.execute(text("SELECT NOW(6)")).scalar()
+    day = func.date(Order.created_at)
+    city_id = func.coalesce(Address.city_id, 0)
+    zone_id = func.coalesce(Address.zone_id, 0)
+    query = (
+        select(
+            day.label("day"),
+            city_id.label("city_id"),
+            zone_id.label("zone_id"),
+            # An order with several COD payments is joined once per payment
+            func.count(Order.id.distinct()).label("order_count"),
+            func.count(CodPayment.order_id.distinct()).label("cod_order_count"),
+            func.coalesce(func.sum(CodPayment.amount), 0).label("cod_amount"),
+            func.coalesce(func.sum(CodPayment.collected_amount), 0).label(
+                "cod_collected_amount"
+            ),
+        )
+        .select_from(Order)
+        .outerjoin(Address, Address.id == Order.dropoff_address_id)
+        .outerjoin(CodPayment, CodPayment.order_id == Order.id)
+        .where(or_(*[_day_bounds(first, last) for first, last in runs]))
+        .group_by(day, city_id, zone_id)
+    )
+    rows = [
+        {**row._asdict(), "refreshed_at": refreshed_at} for row in conn.execute(query)
+    ]
+    if rows:
+        upsert = insert(OrderDailyZoneStats)
+        conn.execute(
+            upsert.on_duplicate_key_update(
+                {
+                    name: upsert.inserted[name]
+                    for name in (
+                        "order_count",
+                        "cod_order_count",
+                        "cod_amount",
+                        "cod_collected_amount",
+                        "refreshed_at",
+                    )
+                }
+            ),
+            rows,
+        )
+    conn.execute(
+        delete(OrderDailyZoneStats).where(
+            or_(
+                *[OrderDailyZoneStats.day.between(first, last) for first, last in runs]
+            ),
+            OrderDailyZoneStats.refreshed_at < refreshed_at,
+        )
+    )
+
+
+def _dequeue(conn, runs: List[Tuple[date, date]], queued_before: datetime) -> None:
+    """Removes days from the queue, unless they were queued again meanwhile."""
+    conn.execute(
+        delete(OrderStatsPendingDay).where(
+            or_(
+                *[OrderStatsPendingDay.day.between(first, last) for first, last in runs]
+            ),
+            OrderStatsPendingDay.queued_at < queued_before,
+        )
+    )
+
+
+def refresh_after_commit(conn, table_name: str, rows: List[Dict]) -> None:
+    """
+    Post-commit hook of the loader: queues the days a written batch touches.
+
+    Only the days are recorded here; `refresh_pending` recomputes them once
+    the collection has finished loading, instead of after every batch.
+
+    Args:
+        conn: Loading connection, outside of a transaction
+        table_name: Table the batch was written to
+        rows: Records of the committed batch
+    """
+    if not MAINTENANCE["incremental"] or table_name not in AFFECTED_ORDERS:
+        return
+    field, column = AFFECTED_ORDERS[table_name]
+    keys = {row[field] for row in rows if row.get(field) is not None}
+    if not keys:
+        return
+    days = conn.execute(
+        select(func.date(Order.created_at)).distinct().where(column.in_(keys))
+    ).scalars()
+    days = [{"day": day} for day in days if day is not None]
+    if not days:
+        conn.rollback()
+        return
+    queue = insert(OrderStatsPendingDay).values(days)
+    conn.execute(queue.on_duplicate_key_update(queued_at=text("CURRENT_TIMESTAMP(6)")))
+    conn.commit()
+    _queued.set()
+    logger.debug(
+        f"Queued order statistics of {len(days)} days after writing "
+        f"{len(rows)} {table_name} rows"
+    )
+
+
+def refresh_pending(engine=None, force: bool = False) -> int:
+    """
+    Recomputes the statistics of the queued days, then dequeues them.
+
+    Runs after each collection is loaded. Days of a chunk that fails stay
+    queued, so the next refresh (or `rebuild-aggregates --pending`) retries
+    them.
+
+    Args:
+        engine: SQLAlchemy engine (default: the MySQL target)
+        force: Refresh even if this process queued nothing, e.g. to retry
+            days left over by failed runs
+
+    Returns:
+        Number of days refreshed
+    """
+    if not force and not (MAINTENANCE["incremental"] and _queued.is_set()):
+        return 0
+    _queued.clear()
+    engine = engine or get_mysql_engine()
+    refreshed = 0
+    try:
+        with engine.connect() as conn:
+            started = conn.execute(text("SELECT NOW(6)")).scalar()
+            days = conn.execute(select(OrderStatsPendingDay.day)).scalars().all()
+        for runs in _chunk_runs(_day_runs(days)):
+            with engine.begin() as conn:
+                refresh_days(conn, runs)
+                _dequeue(conn, runs, started)
+            refreshed += _day_count(runs)
+    except Exception:
+        # The days left in the queue are retried by this process's next refresh
+        _queued.set()
+        raise
+    if refreshed:
+        logger.info(f"Refreshed order statistics of {refreshed} days")
+    return refreshed
+
+
+def rebuild_aggregates(
+    engine=None, since: Optional[date] = None, until: Optional[date] = None
+) -> int:
+    """
+    Recomputes the statistics of every day from the fact tables.
+
+    Queued days within the rebuilt range are dequeued.
+
+    Args:
+        engine: SQLAlchemy engine (default: the MySQL target)
+        since: First day to rebuild (default: the first order)
+        until: Last day to rebuild (default: the last order)
+
+    Returns:
+        Number of days rebuilt
+    """
+    engine = engine or get_mysql_engine()
+    with engine.connect() as conn:
+        started = conn.execute(text("SELECT NOW(6)")).scalar()
+        first, last = conn.execute(
+            select(func.min(Order.created_at), func.max(Order.created_at))
+        ).one()
+    if first is None:
+        if since is None and until is None:
+            with engine.begin() as conn:
+                conn.execute(delete(OrderDailyZoneStats))
+                conn.execute(
+                    delete(OrderStatsPendingDay).where(
+                        OrderStatsPendingDay.queued_at < started
+                    )
+                )
+        return 0
+    first = max(first.date(), since) if since else first.date()
+    last = min(last.date(), until) if until else last.date()
+
+    days = 0
+    for runs in _chunk_runs([(first, last)] if first <= last else []):
+        with engine.begin() as conn:
+            refresh_days(conn, runs)
+            _dequeue(conn, runs, started)
+        days += _day_count(runs)
+        logger.info(f"Rebuilt order statistics up to {runs[-1][1]}")
+
+    # Days outside the orders' range cannot have statistics
+    if since is None and until is None:
+        with engine.begin() as conn:
+            for table in (OrderDailyZoneStats, OrderStatsPendingDay):
+                conn.execute(
+                    delete(table).where(or_(table.day < first, table.day > last))
+                )
+    return days
@@ -0,0 +1,178 @@
+import logging
+import time
+from typing import Dict, Iterable, List
+
+from geoalchemy2 import Geometry
+from sqlalchemy import Index, Table, inspect, text
+
+from connections.sql_connector import get_mysql_engine
+from etl.aggregates import AFFECTED_ORDERS, MAINTENANCE, rebuild_aggregates
+from etl.load import SESSION_VARIABLES
+from models.sql.sql_models import Base
+
+logger = logging.getLogger(__name__)
+
+# Checks switched off on every loading session while backfilling. unique_checks
+# stays on: with it off InnoDB may skip duplicate-key checks, and the loader's
+# plain inserts rely on them to fall back to upserts
+BACKFILL_SESSION_VARIABLES = {"foreign_key_checks": 0}
+
+
+class BackfillError(Exception):
+    """Custom exception for rows left with dangling foreign keys after a backfill"""
+
+    pass
+
+
+class BackfillManager:
+    """
+    Defers index maintenance and constraint checks during a large load.
+
+    On enter, secondary and spatial indexes are dropped and loading sessions
+    run with `foreign_key_checks=0`. On exit, each table's indexes are
+    rebuilt in a single `ALTER TABLE` and every foreign key is validated
+    with one set-based anti-join.
+
+    Unique keys stay checked: rows another worker wrote after the existence
+    filter was built must still be rejected as duplicates.
+
+    Aggregate tables are not refreshed after every batch either; they are
+    rebuilt once when the backfill succeeds.
+    """
+
+    def __init__(self, engine=None, tables: Iterable[str] = None):
+        """
+        Args:
+            engine: SQLAlchemy engine (default: a new MySQL engine)
+            tables: Names of the tables to manage (default: all model tables)
+        """
+        self.engine = engine or get_mysql_engine()
+        names = set(tables) if tables else None
+        self.tables: List[Table] = [
+            table
+            for table in Base.metadata.sorted_tables
+            if names is None or table.name in names
+        ]
+        self._dropped: Dict[str, List[Index]] = {}
+        self._incremental = MAINTENANCE["incremental"]
+        self.maintains_aggregates = any(
+            table.name in AFFECTED_ORDERS for table in self.tables
+        )
+
+    @staticmethod
+    def _is_spatial(index: Index) -> bool:
+        return any(isinstance(col.type, Geometry) for col in index.columns)
+
+    @staticmethod
+    def deferrable_indexes(table: Table) -> List[Index]:
+        """
+        Returns the indexes of a table that can be dropped during a backfill.
+
+        Unique indexes are kept because upserts depend on them, and so are
+        indexes leading with a foreign key column, which InnoDB needs to keep.
+        """
+        fk_columns = {fk.parent.name for fk in table.foreign_keys}
+        return [
+            index
+            for index in sorted(table.indexes, key=lambda idx: idx.name)
+            if not index.unique and list(index.columns)[0].name not in fk_columns
+        ]
+
+    def _index_clause(self, index: Index) -> str:
+        columns = ", ".join(col.name for col in index.columns)
+        kind = "SPATIAL INDEX" if self._is_spatial(index) else "INDEX"
+        return f"ADD {kind} {index.name} ({columns})"
+
+    def drop_indexes(self) -> None:
+        """Drops the deferrable indexes that currently exist in the database."""
+        inspector = inspect(self.engine)
+        for position, table in enumerate(self.tables, start=1):
+            existing = {idx["name"] for idx in inspector.get_indexes(table.name)}
+            indexes = [
+                index
+                for index in self.deferrable_indexes(table)
+                if index.name in existing
+            ]
+            if not indexes:
+                continue
+
+            clauses = ", ".join(f"DROP INDEX {index.name}" for index in indexes)
+            with self.engine.begin() as conn:
+                conn.execute(text(f"ALTER TABLE {table.name} {clauses}"))
+            self._dropped[table.name] = indexes
+            logger.info(
+                f"[backfill] Dropped {len(indexes)} indexes on {table.name} "
+                f"({position}/{len(self.tables)} tables)"
+            )
+
+    def rebuild_indexes(self) -> None:
+        """Recreates the dropped indexes, one bulk `ALTER TABLE` per table."""
+        total_tables = len(self._dropped)
+        for position, (table_name, indexes) in enumerate(
+            list(self._dropped.items()), start=1
+        ):
+            start_time = time.time()
+            clauses = ", ".join(self._index_clause(index) for index in indexes)
+            with self.engine.begin() as conn:
+                conn.execute(text(f"ALTER TABLE {table_name} {clauses}"))
+            del self._dropped[table_name]
+            logger.info(
+                f"[backfill] Rebuilt {len(indexes)} indexes on {table_name} in "
+                f"{time.time() - start_time:.2f}s ({position}/{total_tables} tables)"
+            )
+
+    def validate_foreign_keys(self) -> Dict[str, int]:
+        """
+        Counts rows whose foreign keys reference missing parents.
+
+        Returns:
+            Dictionary mapping "child.column -> parent.column" to orphan counts
+        """
+        orphans = {}
+        with self.engine.connect() as conn:
+            for table in self.tables:
+                for fk in sorted(table.foreign_keys, key=lambda fk: fk.parent.name):
+                    child, parent = fk.parent, fk.column
+                    name = (
+                        f"{table.name}.{child.name} -> "
+                        f"{parent.table.name}.{parent.name}"
+                    )
+                    orphans[name] = conn.execute(
+                        text(
+                            f"SELECT COUNT(*) FROM {table.name} c "
+                            f"LEFT JOIN {parent.table.name} p "
+                            f"ON c.{child.name} = p.{parent.name} "
+                            f"WHERE c.{child.name} IS NOT NULL "
+                            f"AND p.{parent.name} IS NULL"
+                        )
+                    ).scalar()
+                    logger.info(
+                        f"[backfill] Validated {name}: {orphans[name]} orphaned rows"
+                    )
+        return orphans
+
+    def __enter__(self) -> "BackfillManager":
+        logger.info(f"[backfill] Entering backfill mode for {len(self.tables)} tables")
+        self.drop_indexes()
+        SESSION_VARIABLES.update(BACKFILL_SESSION_VARIABLES)
+        if self.maintains_aggregates:
+            MAINTENANCE["incremental"] = False
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> bool:
+        for name in BACKFILL_SESSION_VARIABLES:
+            SESSION_VARIABLES.pop(name, None)
+        self.rebuild_indexes()
+        broken = {
+            name: count for name, count in self.validate_foreign_keys().items() if count
+        }
+        if self.maintains_aggregates:
+            MAINTENANCE["incremental"] = self._incremental
+            if exc_type is None:
+                days = rebuild_aggregates(self.engine)
+                logger.info(f"[backfill] Rebuilt aggregates of {days} days")
+        logger.info("[backfill] Left backfill mode")
+
+        if broken and exc_type is None:
+            raise BackfillError(f"Orphaned foreign keys after backfill: {broken}")
+        return False
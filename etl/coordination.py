@@ -0,0 +1,388 @@
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import create_engine, func, insert, or_, select, update
+
+from config.settings import COORDINATION_CONFIG
+from connections.sql_connector import get_mysql_engine
+from etl.table_graph import build_dependency_graph
+from models.sql.coordination_models import CoordinationBase, WorkUnit
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class CoordinationError(Exception):
+    """Custom exception for errors in the work coordination table"""
+
+    pass
+
+
+class LeaseLost(CoordinationError):
+    """Raised when a worker's lease on a unit was taken over by another worker"""
+
+    pass
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class WorkCoordinator:
+    """
+    Hands out table partitions to workers on any number of hosts.
+
+    Work units live in the `etl_work_units` table, in MySQL or in a SQLite
+    file for single-host runs. A worker owns a unit through a lease that it
+    renews while loading; units whose lease expired are taken over by the
+    next worker asking for work, resuming from the last checkpointed `_id`.
+    Claims are optimistic updates guarded by a version column, so no row
+    stays locked while a unit is being loaded. A table's units only become
+    claimable once every unit of the tables it references is done.
+    """
+
+    def __init__(
+        self,
+        url: Optional[str] = None,
+        lease_seconds: int = None,
+        max_attempts: int = None,
+        engine=None,
+    ):
+        """
+        Args:
+            url: SQLAlchemy URL of the coordination database
+                (default: COORDINATION.url from config.json, else the MySQL target)
+            lease_seconds: How long a claim stays valid without a heartbeat
+            max_attempts: Claims of a unit before it is marked as failed
+            engine: Existing engine to use instead of `url`
+        """
+        url = url or COORDINATION_CONFIG.get("url")
+        if engine is None:
+            engine = create_engine(url) if url else get_mysql_engine()
+        self.engine = engine
+        self.lease_seconds = lease_seconds or COORDINATION_CONFIG.get(
+            "lease_seconds", 300
+        )
+        self.max_attempts = max_attempts or COORDINATION_CONFIG.get("max_attempts", 3)
+        CoordinationBase.metadata.create_all(self.engine, checkfirst=True)
+
+    def _lease_expiry(self) -> datetime:
+        return _utcnow() + timedelta(seconds=self.lease_seconds)
+
+    def plan(self, run_id: str, partitions: Dict[str, List[Dict]]) -> int:
+        """
+        Registers the work units of a run, unless the run is already planned.
+
+        Args:
+            run_id: Identifier shared by the coordinator and its workers
+            partitions: Table name -> `plan_table_partitions` output
+
+        Returns:
+            Number of units created
+        """
+        with self.engine.begin() as conn:
+            planned = conn.execute(
+                select(func.count()).where(WorkUnit.run_id == run_id)
+            ).scalar()
+            if planned:
+                logger.info(f"Run {run_id} already has {planned} work units")
+                return 0
+
+            rows = [
+                {
+                    "run_id": run_id,
+                    "table_name": table,
+                    "partition_index": index,
+                    "lower_id": partition["lower_id"],
+                    "upper_id": partition["upper_id"],
+                    "status": PENDING,
+                    "attempts": 0,
+                    "version": 0,
+                    "updated_at": _utcnow(),
+                }
+                for table, table_partitions in partitions.items()
+                for index, partition in enumerate(table_partitions)
+            ]
+            if rows:
+                conn.execute(insert(WorkUnit), rows)
+        logger.info(f"Planned {len(rows)} work units for run {run_id}")
+        return len(rows)
+
+    def table_status(self, run_id: str) -> Dict[str, Counter]:
+        """Returns the number of units per status for every table of a run."""
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                select(WorkUnit.table_name, WorkUnit.status, func.count())
+                .where(WorkUnit.run_id == run_id)
+                .group_by(WorkUnit.table_name, WorkUnit.status)
+            ).all()
+        status = defaultdict(Counter)
+        for table, unit_status, count in rows:
+            status[table][unit_status] = count
+        return dict(status)
+
+    def _blocked_tables(self, status: Dict[str, Counter]) -> Dict[str, bool]:
+        """
+        Finds the tables whose units cannot be claimed yet.
+
+        Returns:
+            Dictionary of table -> True for tables that can never run because
+            a table they depend on failed, False for tables still waiting on
+            unfinished parents. Ready tables are absent.
+        """
+        graph = build_dependency_graph(status)
+        states: Dict[str, Optional[bool]] = {}
+
+        def state(table: str) -> Optional[bool]:
+            if table not in states:
+                parents = graph.get(table, set())
+                if any(status[parent][FAILED] or state(parent) for parent in parents):
+                    states[table] = True
+                elif any(
+                    sum(status[parent].values()) != status[parent][DONE]
+                    for parent in parents
+                ):
+                    states[table] = False
+                else:
+                    states[table] = None
+            return states[table]
+
+        for table in status:
+            state(table)
+        return {table: dead for table, dead in states.items() if dead is not None}
+
+    def claim(self, run_id: str, owner: str) -> Optional[Dict]:
+        """
+        Leases the next claimable unit of a run to `owner`.
+
+        Pending units are handed out first, then units whose lease expired.
+
+        Returns:
+            The leased unit as a dictionary, or None if nothing is claimable
+        """
+        status = self.table_status(run_id)
+        blocked = self._blocked_tables(status)
+        ready = [table for table in status if table not in blocked]
+        if not ready:
+            return None
+
+        now = _utcnow()
+        with self.engine.connect() as conn:
+            candidates = conn.execute(
+                select(WorkUnit.__table__)
+                .where(
+                    WorkUnit.run_id == run_id,
+                    WorkUnit.table_name.in_(ready),
+                    or_(
+                        WorkUnit.status == PENDING,
+                        (WorkUnit.status == RUNNING)
+                        & (WorkUnit.lease_expires_at < now),
+                    ),
+                )
+                # "pending" sorts before "running", so fresh units go first
+                .order_by(WorkUnit.status, WorkUnit.id)
+                .limit(20)
+            ).all()
+
+            for candidate in candidates:
+                unit = dict(candidate._mapping)
+                if unit["status"] == RUNNING:
+                    logger.warning(
+                        f"Taking over expired lease of unit {unit['id']} "
+                        f"from {unit['owner']}"
+                    )
+                values = {
+                    "status": RUNNING,
+                    "owner": owner,
+                    "lease_expires_at": self._lease_expiry(),
+                    "attempts": unit["attempts"] + 1,
+                    "version": unit["version"] + 1,
+                    "updated_at": now,
+                }
+                result = conn.execute(
+                    update(WorkUnit)
+                    .where(
+                        WorkUnit.id == unit["id"],
+                        WorkUnit.version == unit["version"],
+                    )
+                    .values(**values)
+                )
+                conn.commit()
+                if result.rowcount == 1:
+                    unit.update(values)
+                    return unit
+        return None
+
+    def _update_owned(self, unit: Dict, **values) -> None:
+        """Updates a unit only while `unit` still holds its lease."""
+        values["updated_at"] = _utcnow()
+        with self.engine.begin() as conn:
+            result = conn.execute(
+                update(WorkUnit)
+                .where(
+                    WorkUnit.id == unit["id"],
+                    WorkUnit.version == unit["version"],
+                )
+                .values(**values)
+            )
+        if result.rowcount != 1:
+            raise LeaseLost(f"Lease on work unit {unit['id']} was taken over")
+
+    def heartbeat(self, unit: Dict) -> None:
+        """Extends the lease on a unit."""
+        self._update_owned(unit, lease_expires_at=self._lease_expiry())
+
+    def checkpoint(self, unit: Dict, last_id: str) -> None:
+        """Records that every document of a unit up to `last_id` is loaded."""
+        self._update_owned(
+            unit, checkpoint_id=last_id, lease_expires_at=self._lease_expiry()
+        )
+        unit["checkpoint_id"] = last_id
+
+    def complete(self, unit: Dict) -> None:
+        self._update_owned(unit, status=DONE, lease_expires_at=None, error=None)
+
+    def fail(self, unit: Dict, error: str) -> None:
+        """Releases a failed unit for retry, or marks it failed after max_attempts."""
+        status = FAILED if unit["attempts"] >= self.max_attempts else PENDING
+        self._update_owned(
+            unit,
+            status=status,
+            owner=None,
+            lease_expires_at=None,
+            error=error,
+            version=unit["version"] + 1,
+        )
+
+    def has_pending_work(self, run_id: str) -> bool:
+        """Whether any unit of a run can still be loaded, now or later."""
+        status = self.table_status(run_id)
+        blocked = self._blocked_tables(status)
+        return any(
+            counts[PENDING] or counts[RUNNING]
+            for table, counts in status.items()
+            if not blocked.get(table, False)
+        )
+
+
+class _LeaseKeeper:
+    """
+    Renews a unit's lease from a background thread while it is loaded.
+
+    `lost` is set as soon as a renewal finds the lease taken over, and is
+    passed to `process_partition` as its `abort` event.
+    """
+
+    def __init__(self, coordinator: WorkCoordinator, unit: Dict, interval: float):
+        self.coordinator = coordinator
+        self.unit = unit
+        self.interval = interval
+        self.lost = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name=f"lease-{unit['id']}", daemon=True
+        )
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.coordinator.heartbeat(self.unit)
+            except LeaseLost:
+                self.lost.set()
+                return
+            except Exception as e:
+                logger.warning(f"Heartbeat for unit {self.unit['id']} failed: {e}")
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stopped.set()
+        self._thread.join()
+
+
+def run_worker(
+    coordinator: WorkCoordinator,
+    run_id: str,
+    owner: str,
+    process_partition: Callable,
+    heartbeat_seconds: float = None,
+    poll_seconds: float = None,
+) -> int:
+    """
+    Claims and loads units of a run until none are left.
+
+    Args:
+        coordinator: Coordinator holding the run's work units
+        run_id: Run to work on
+        owner: Name of this worker, recorded on the units it leases
+        process_partition: Callable with the `run_table_partition` signature;
+            it must stop loading once its `abort` event is set
+        heartbeat_seconds: Interval between lease renewals
+        poll_seconds: Wait between claims while units are blocked or leased
+
+    Returns:
+        Number of units this worker completed
+    """
+    heartbeat_seconds = heartbeat_seconds or COORDINATION_CONFIG.get(
+        "heartbeat_seconds", 60
+    )
+    poll_seconds = poll_seconds or COORDINATION_CONFIG.get("poll_seconds", 10)
+    completed = 0
+
+    while True:
+        unit = coordinator.claim(run_id, owner)
+        if unit is None:
+            if not coordinator.has_pending_work(run_id):
+                break
+            time.sleep(poll_seconds)
+            continue
+
+        # Resuming at the checkpoint reloads that one document, which the
+        # upserts make harmless
+        lower_id = unit["checkpoint_id"] or unit["lower_id"]
+        logger.info(
+            f"{owner} loading {unit['table_name']} unit {unit['partition_index']} "
+            f"from {lower_id} to {unit['upper_id']}"
+        )
+
+        keeper = _LeaseKeeper(coordinator, unit, heartbeat_seconds)
+
+        def on_checkpoint(last_id: str, unit=unit, keeper=keeper) -> None:
+            if keeper.lost.is_set():
+                raise LeaseLost(f"Lease on work unit {unit['id']} was taken over")
+            coordinator.checkpoint(unit, last_id)
+
+        try:
+            with keeper:
+                process_partition(
+                    unit["table_name"],
+                    lower_id,
+                    unit["upper_id"],
+                    on_checkpoint=on_checkpoint,
+                    abort=keeper.lost,
+                )
+            if keeper.lost.is_set():
+                raise LeaseLost(f"Lease on work unit {unit['id']} was taken over")
+            coordinator.complete(unit)
+            completed += 1
+        except LeaseLost as e:
+            logger.warning(f"{owner} abandoning unit: {e}")
+        except Exception as e:
+            logger.error(f"{owner} failed unit {unit['id']}: {e}")
+            try:
+                coordinator.fail(unit, str(e))
+            except LeaseLost:
+                pass
+
+    logger.info(f"{owner} finished run {run_id} after completing {completed} units")
+    return completed
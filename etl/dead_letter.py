@@ -0,0 +1,51 @@
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict
+
+from config.settings import DEAD_LETTER_DIR
+
+logger = logging.getLogger(__name__)
+
+
+class DeadLetterSink:
+    """
+    Collects records the database rejected, so a batch can commit without them.
+
+    Each rejected record is appended as one JSON line to
+    `<directory>/<table>.jsonl`, together with the error that rejected it.
+    """
+
+    def __init__(self, directory: str = DEAD_LETTER_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self.counts: Dict[str, int] = {}
+
+    def write(self, table_name: str, record: Dict[str, Any], error: Exception) -> None:
+        """Appends a rejected record and its error to the table's dead-letter file."""
+        entry = {
+            "table": table_name,
+            "failed_at": datetime.now(timezone.utc).isoformat(),
+            "error": str(getattr(error, "orig", None) or error),
+            "record": record,
+        }
+        line = json.dumps(entry, default=str)
+
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, f"{table_name}.jsonl")
+            with open(path, "a", encoding="utf-8") as dead_letter_file:
+                dead_letter_file.write(line + "\n")
+            self.counts[table_name] = self.counts.get(table_name, 0) + 1
+
+        logger.warning(f"Dead-lettered a {table_name} record: {entry['error']}")
+
+
+_sink = DeadLetterSink()
+
+
+def get_dead_letter_sink() -> DeadLetterSink:
+    """Returns the process-wide dead-letter sink."""
+    return _sink
@@ -1,9 +1,14 @@
-from concurrent.futures import ThreadPoolExecutor
-from typing import Callable, Dict, List
+import threading
+from contextlib import nullcontext
+from typing import Callable, Dict, Iterable, List, Optional
 from functools import partial
-from etl.extract import extract_data
-from etl.transform import *
-from etl.load import *
+from itertools import islice
+from config.settings import COORDINATION_CONFIG, ETL_PARTITION_SIZE
+from etl.extract import extract_data, plan_partitions
+from etl.scheduler import TableScheduler
+from etl.table_graph import TABLE_STEPS, resolve_steps
+from etl.executor import PipelinedExecutor
+from utils.metrics import start_metrics_exporters
 
 import logging
 
@@ -16,102 +21,193 @@ logger = logging.getLogger(__name__)
 def process_collection(
     collection_name: str, transform_func: Callable, load_func: Callable, data=None
 ) -> None:
-    """Process a single collection with transformation and loading."""
+    """
+    Process a single collection with transformation and loading.
+
+    Extract, transform and load run as pipelined stages (see
+    `PipelinedExecutor`), with worker counts from config.json.
+    """
     try:
-        print(f"Starting processing of collection: {collection_name}")
-        data_batches = extract_data(collection_name) if data is None else data
-        print(f"Successfully extracted data for collection: {collection_name}")
+        logger.info(f"Starting processing of collection: {collection_name}")
+        PipelinedExecutor.from_settings().run(
+            collection_name, transform_func, load_func, data
+        )
+        logger.info(f"Completed processing collection: {collection_name}")
+        _refresh_aggregates()
+    except Exception as e:
+        # Rejected rows are dead-lettered by the loader, so anything reaching
+        # this point is a systemic failure that must not pass silently
+        logger.error(f"Error processing {collection_name}: {str(e)}")
+        raise
 
-        for batch in data_batches:
-            print(f"Transforming batch for collection: {collection_name}")
-            df = transform_func(batch)
-            print(f"Successfully transformed batch for collection: {collection_name}")
 
-            print(f"Loading transformed data for collection: {collection_name}")
-            load_func(df)
-            print(f"Successfully loaded data for collection: {collection_name}")
+def _refresh_aggregates() -> None:
+    """Recomputes the statistics of the days queued while loading."""
+    # Imported here as it pulls in SQLAlchemy and the models
+    from etl.aggregates import refresh_pending
 
-        print(f"Completed processing collection: {collection_name}")
+    try:
+        refresh_pending()
     except Exception as e:
-        print(f"Error processing {collection_name}: {str(e)}")
+        # The loaded rows are committed; the days stay queued for a retry
+        logger.error(f"Refreshing order statistics failed: {e}")
+
+
+# Tables loaded by each stage of the scheduled Airflow DAG
+FIRST_PIPELINE_TABLES = ["stars", "countries", "cities", "zones", "receivers"]
+SECOND_PIPELINE_TABLES = ["addresses"]
+THIRD_PIPELINE_TABLES = ["orders", "confirmations", "cod_payments", "trackers"]
+
+
+def run_tables(tables: List[str] = None, max_workers: int = 3) -> None:
+    """
+    Load tables through the dependency-graph scheduler.
+
+    Args:
+        tables: Tables to load (default: all tables).
+        max_workers: Maximum number of tables loaded concurrently.
+    """
+    TableScheduler(process_collection, tables, max_workers=max_workers).run()
 
 
 def first_pipeline(max_workers: int = 3) -> None:
     """
-    Execute the ETL pipeline with parallel processing.
+    Execute the ETL pipeline for the tables without foreign keys.
 
     Args:
         max_workers: Maximum number of concurrent threads.
     """
-    collection_configs = {
-        "star": (transform_star_data, load_star_data),
-        "country": (transform_country_data, load_country_data),
-        "city": (transform_city_data, load_city_data),
-        "zone": (transform_zone_data, load_zone_data),
-        "receiver": (transform_receiver_data, load_receiver_data),
-    }
-
-    process_collection(
-        "star", *collection_configs["star"]
-    )  # Ensure star is loaded first
-
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        executor.map(
-            lambda cfg: process_collection(*cfg),
-            [
-                (name, *funcs)
-                for name, funcs in collection_configs.items()
-                if name != "star"
-            ],
-        )
+    run_tables(FIRST_PIPELINE_TABLES, max_workers)
 
 
 def second_pipeline(max_workers: int = 3) -> None:
     """
     Execute the second ETL pipeline for address data.
     """
-    order_data = list(extract_data("order"))  # Convert to list to avoid exhaustion
-    process_collection(
-        "order", transform_pickup_address_data, load_address_data, order_data
-    )
-    process_collection(
-        "order", transform_dropoff_address_data, load_address_data, order_data
-    )
+    run_tables(SECOND_PIPELINE_TABLES, max_workers)
 
 
-def third_pipeline() -> None:
+def third_pipeline(max_workers: int = 3) -> None:
     """
     Execute the third ETL pipeline for order and related data.
+
+    Order ids are reserved by the id allocator during the order transform,
+    so confirmations and COD payments resolve them without re-querying orders.
     """
-    order_data = list(extract_data("order"))
-    process_collection("order", transform_order_data, load_order_data, order_data)
+    run_tables(THIRD_PIPELINE_TABLES, max_workers)
 
-    # # TODO: take the order sql ids, and pass it with transform function instead of re-access the DB again (since they are the same order and we need the id)
-    process_collection(
-        "order", transform_confirmation_data, load_confirmation_data, order_data
-    )
-    process_collection(
-        "order", transform_cod_payment_data, load_codpayment_data, order_data
-    )
-    process_collection("tracker", transform_tracker_data, load_tracker_data)
 
+def plan_table_partitions(
+    table: str, partition_size: int = ETL_PARTITION_SIZE
+) -> List[Dict]:
+    """
+    Split the source collection of a table into `_id` range partitions.
 
-def run_pipeline():
+    Args:
+        table: Table whose source collection is split.
+        partition_size: Approximate number of documents per partition.
+
+    Returns:
+        Keyword arguments for `run_table_partition`, one dict per partition.
     """
-    Main function to execute ETL pipelines sequentially.
+    collection = TABLE_STEPS[table][0][0]
+    partitions = plan_partitions(collection, partition_size)
+    logger.info(f"Planned {len(partitions)} partitions of {collection} for {table}")
+    return [
+        {"table": table, "lower_id": lower_id, "upper_id": upper_id}
+        for lower_id, upper_id in partitions
+    ]
+
+
+def _until(abort: Optional[threading.Event], batches: Iterable) -> Iterable:
+    """Yields batches until `abort` is set."""
+    for batch in batches:
+        if abort is not None and abort.is_set():
+            return
+        yield batch
+
+
+def run_table_partition(
+    table: str,
+    lower_id: str = None,
+    upper_id: str = None,
+    on_checkpoint: Callable = None,
+    checkpoint_batches: int = COORDINATION_CONFIG.get("checkpoint_batches", 10),
+    abort: Optional[threading.Event] = None,
+):
     """
-    try:
-        print("Starting first ETL pipeline...")
-        first_pipeline()
-        print("First pipeline completed successfully")
+    Load one `_id` range partition of a table.
+
+    Args:
+        table: Table to load.
+        lower_id: Inclusive lower `_id` bound of the partition.
+        upper_id: Exclusive upper `_id` bound of the partition.
+        on_checkpoint: Called with the last loaded `_id` whenever every
+            document up to it has been loaded by all of the table's steps.
+        checkpoint_batches: Extracted batches loaded between checkpoints.
+        abort: Once set, no further batch is loaded or checkpointed and the
+            partition is left unfinished (e.g. when its lease was lost).
+
+    Raises:
+        SinkError: If the run writes to files, which other processes
+            loading partitions of the same run cannot share
+    """
+    # Imported here as it pulls in pandas
+    from etl.sinks import check_multi_process, get_sink
+
+    check_multi_process(get_sink())
+    steps = resolve_steps(table)
+    batches = _until(abort, extract_data(steps[0][0], lower_id, upper_id))
+
+    if len(steps) == 1 and on_checkpoint is None:
+        collection, transform_func, load_func = steps[0]
+        process_collection(collection, transform_func, load_func, batches)
+        return
+
+    # Loading in segments bounds the batches held for tables with several
+    # steps, and gives resumable points once every step has loaded a segment
+    while True:
+        segment = list(islice(batches, checkpoint_batches))
+        if not segment:
+            break
+        for collection, transform_func, load_func in steps:
+            process_collection(
+                collection, transform_func, load_func, _until(abort, segment)
+            )
+        if abort is not None and abort.is_set():
+            return
+        if on_checkpoint is not None:
+            on_checkpoint(str(segment[-1][-1]["_id"]))
+
+
+def run_pipeline(
+    backfill: bool = False, max_workers: int = 3, tables: List[str] = None
+):
+    """
+    Main function to execute the ETL pipeline.
 
-        print("Starting second ETL pipeline...")
-        second_pipeline()
-        print("Second pipeline completed successfully")
+    Each table starts as soon as the tables it references are loaded.
 
-        print("Starting third ETL pipeline...")
-        third_pipeline()
-        print("Third pipeline completed successfully")
+    Args:
+        backfill: Defer secondary indexes and constraint checks until the
+            load finishes (for full migrations into large tables).
+        max_workers: Maximum number of tables loaded concurrently.
+        tables: Tables to load (default: all tables).
+    """
+    # Imported here as they pull in SQLAlchemy and the models
+    from etl.backfill import BackfillManager
+    from etl.sinks import get_sink
+
+    start_metrics_exporters()
+    # A file sink must replace the id allocator before the first transform
+    sink = get_sink()
+    try:
+        with BackfillManager(tables=tables) if backfill else nullcontext():
+            print("Starting ETL pipeline...")
+            run_tables(tables, max_workers=max_workers)
+            # Publishes the last files of a file sink
+            sink.close()
+            print("ETL pipeline completed successfully")
 
     except Exception as e:
         print(f"Error executing pipelines: {str(e)}")
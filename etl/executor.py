@@ -0,0 +1,271 @@
+import logging
+import queue
+import threading
+import time
+from typing import Callable, Dict, Iterable, List
+
+import bson
+
+from config.settings import PIPELINE_QUEUE_SIZE, PIPELINE_WORKERS
+from etl.extract import extract_data
+from utils.memory import SpillableList, SpilledBatch, get_memory_budget, spill
+from utils.metrics import BATCH_SECONDS, BYTES, QUEUE_DEPTH, ROWS
+from utils.profiling import profile_stage
+
+logger = logging.getLogger(__name__)
+
+# Marks the end of a stage's input
+_DONE = object()
+# How often blocked workers re-check whether the run was aborted (seconds)
+_POLL_INTERVAL = 0.1
+# Documents per extracted batch encoded to estimate its size in bytes
+SIZE_SAMPLE = 16
+
+
+def estimate_bson_size(batch: List) -> int:
+    """Estimates a batch's BSON size from an evenly spread sample of its documents."""
+    if not batch:
+        return 0
+    step = max(1, len(batch) // SIZE_SAMPLE)
+    sample = batch[::step]
+    return (
+        sum(len(bson.encode(document)) for document in sample)
+        * len(batch)
+        // len(sample)
+    )
+
+
+class PipelineAborted(Exception):
+    """Raised inside workers once another stage has failed"""
+
+    pass
+
+
+class PipelinedExecutor:
+    """
+    Runs a collection's extract, transform and load as concurrent stages.
+
+    Stages are joined by bounded queues, so batch N+1 is extracted while
+    batch N is transformed and batch N-1 is loaded, and a slow stage applies
+    backpressure to the ones feeding it. Each stage has its own worker count.
+    A single source iterator is consumed by one extract worker at a time;
+    extra extract workers only help when several sources are given.
+
+    While the memory budget is exceeded, batches are spilled to disk as
+    they are queued and read back by the stage taking them, so queued
+    batches hold no memory until they are processed. Batches a shared
+    `SpillableList` already holds on disk are queued as they are, and only
+    read back by the transform stage.
+    """
+
+    def __init__(
+        self,
+        extract_workers: int = 1,
+        transform_workers: int = 2,
+        load_workers: int = 1,
+        queue_size: int = 4,
+    ):
+        self.extract_workers = max(1, extract_workers)
+        self.transform_workers = max(1, transform_workers)
+        self.load_workers = max(1, load_workers)
+        self.queue_size = max(1, queue_size)
+
+    @classmethod
+    def from_settings(cls) -> "PipelinedExecutor":
+        """Creates an executor with the worker counts from config.json."""
+        return cls(
+            extract_workers=PIPELINE_WORKERS.get("extract", 1),
+            transform_workers=PIPELINE_WORKERS.get("transform", 2),
+            load_workers=PIPELINE_WORKERS.get("load", 1),
+            queue_size=PIPELINE_QUEUE_SIZE,
+        )
+
+    def run(
+        self,
+        collection_name: str,
+        transform_func: Callable,
+        load_func: Callable,
+        data: Iterable = None,
+        sources: List[Iterable] = None,
+    ) -> None:
+        """
+        Extracts, transforms and loads every batch of a collection.
+
+        Args:
+            collection_name: MongoDB collection to extract
+            transform_func: Function turning a batch of documents into a DataFrame
+            load_func: Function loading a transformed DataFrame
+            data: Already extracted batches to use instead of querying MongoDB
+            sources: Several batch iterables to extract from in parallel
+
+        Raises:
+            Exception: The first error raised by any stage
+        """
+        if sources is None:
+            sources = [extract_data(collection_name) if data is None else data]
+
+        source_queue = queue.Queue()
+        for source in sources:
+            source_queue.put(source)
+        batch_queue = queue.Queue(maxsize=self.queue_size)
+        frame_queue = queue.Queue(maxsize=self.queue_size)
+
+        labels = {
+            "collection": collection_name,
+            "step": getattr(transform_func, "__name__", str(transform_func)),
+        }
+
+        budget = get_memory_budget()
+
+        def record(stage: str, seconds: float, rows: int, size: int) -> None:
+            BATCH_SECONDS.observe(seconds, stage=stage, **labels)
+            ROWS.inc(rows, stage=stage, **labels)
+            BYTES.inc(size, stage=stage, **labels)
+            # Refreshes the process-wide resident memory gauge
+            budget.resident()
+
+        def record_depths() -> None:
+            QUEUE_DEPTH.set(batch_queue.qsize(), queue="extracted", **labels)
+            QUEUE_DEPTH.set(frame_queue.qsize(), queue="transformed", **labels)
+
+        abort = threading.Event()
+        errors: List[BaseException] = []
+        remaining: Dict[str, int] = {
+            "extract": self.extract_workers,
+            "transform": self.transform_workers,
+        }
+        lock = threading.Lock()
+
+        def put(target: queue.Queue, item) -> None:
+            if (
+                item is not _DONE
+                and not isinstance(item, SpilledBatch)
+                and budget.exceeded()
+            ):
+                item = spill(item)
+            while True:
+                if abort.is_set():
+                    raise PipelineAborted()
+                try:
+                    target.put(item, timeout=_POLL_INTERVAL)
+                    return
+                except queue.Full:
+                    continue
+
+        def get(source: queue.Queue):
+            while True:
+                if abort.is_set():
+                    raise PipelineAborted()
+                try:
+                    item = source.get(timeout=_POLL_INTERVAL)
+                except queue.Empty:
+                    continue
+                if isinstance(item, SpilledBatch):
+                    # Segments of a shared list are read by other consumers too
+                    return item.load(remove=not item.shared)
+                return item
+
+        def finish(stage: str, downstream: queue.Queue, consumers: int) -> None:
+            """Signals end of input downstream once the last worker of a stage exits."""
+            with lock:
+                remaining[stage] -= 1
+                last = remaining[stage] == 0
+            if last:
+                for _ in range(consumers):
+                    put(downstream, _DONE)
+
+        def extract_worker() -> None:
+            while True:
+                try:
+                    source = source_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if isinstance(source, SpillableList):
+                    batches = source.batches()
+                else:
+                    batches = iter(source)
+                while True:
+                    start_time = time.perf_counter()
+                    with profile_stage(collection_name, labels["step"], "extract"):
+                        batch = next(batches, _DONE)
+                    if batch is _DONE:
+                        break
+                    if isinstance(batch, SpilledBatch):
+                        rows, size = batch.rows, batch.raw_size
+                    else:
+                        rows, size = len(batch), estimate_bson_size(batch)
+                    record("extract", time.perf_counter() - start_time, rows, size)
+                    put(batch_queue, batch)
+                    record_depths()
+            finish("extract", batch_queue, self.transform_workers)
+
+        def transform_worker() -> None:
+            while True:
+                batch = get(batch_queue)
+                if batch is _DONE:
+                    break
+                logger.debug(f"Transforming batch for collection: {collection_name}")
+                start_time = time.perf_counter()
+                with profile_stage(collection_name, labels["step"], "transform"):
+                    df = transform_func(batch)
+                record(
+                    "transform",
+                    time.perf_counter() - start_time,
+                    len(df),
+                    int(df.memory_usage(index=False).sum()),
+                )
+                put(frame_queue, df)
+                record_depths()
+            finish("transform", frame_queue, self.load_workers)
+
+        def load_worker() -> None:
+            while True:
+                df = get(frame_queue)
+                if df is _DONE:
+                    break
+                logger.debug(f"Loading batch for collection: {collection_name}")
+                record_depths()
+                start_time = time.perf_counter()
+                with profile_stage(collection_name, labels["step"], "load"):
+                    load_func(df)
+                record(
+                    "load",
+                    time.perf_counter() - start_time,
+                    len(df),
+                    int(df.memory_usage(index=False).sum()),
+                )
+
+        def guarded(target: Callable) -> Callable:
+            def wrapper():
+                try:
+                    target()
+                except PipelineAborted:
+                    pass
+                except BaseException as e:
+                    with lock:
+                        errors.append(e)
+                    abort.set()
+
+            return wrapper
+
+        stages = [
+            (extract_worker, self.extract_workers, "extract"),
+            (transform_worker, self.transform_workers, "transform"),
+            (load_worker, self.load_workers, "load"),
+        ]
+        threads = [
+            threading.Thread(
+                target=guarded(target),
+                name=f"{collection_name}-{stage}-{index}",
+                daemon=True,
+            )
+            for target, count, stage in stages
+            for index in range(count)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if errors:
+            raise errors[0]
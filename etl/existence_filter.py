@@ -0,0 +1,151 @@
+import hashlib
+import logging
+import math
+import threading
+from typing import Any, Dict, List, Tuple, Type
+
+from sqlalchemy import func, select
+
+from config.settings import EXISTENCE_FILTER_MEMORY_MB
+from etl.row_hash import record_key_column
+from utils.id_allocator import id_key
+
+logger = logging.getLogger(__name__)
+
+# Hash functions per key are capped, beyond this lookups cost more than they save
+MAX_HASHES = 12
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over string keys.
+
+    Membership tests never give false negatives; false positives occur at the
+    rate reported by `false_positive_rate()`.
+    """
+
+    def __init__(self, num_bits: int, num_hashes: int):
+        self.num_bits = max(8, num_bits)
+        self.num_hashes = max(1, num_hashes)
+        self.count = 0
+        self._bits = bytearray((self.num_bits + 7) // 8)
+
+    @classmethod
+    def for_capacity(cls, capacity: int, memory_bytes: int) -> "BloomFilter":
+        """Creates a filter of `memory_bytes` tuned for `capacity` keys."""
+        num_bits = memory_bytes * 8
+        num_hashes = round(num_bits / max(capacity, 1) * math.log(2))
+        return cls(num_bits, min(MAX_HASHES, num_hashes))
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.num_bits for i in range(self.num_hashes))
+
+    def add(self, key: str) -> None:
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(
+            self._bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(key)
+        )
+
+    def false_positive_rate(self) -> float:
+        """Expected false-positive rate for the number of keys added so far."""
+        return (
+            1 - math.exp(-self.num_hashes * self.count / self.num_bits)
+        ) ** self.num_hashes
+
+
+class ExistenceIndex:
+    """
+    Per-table Bloom filters telling which records are definitely not stored yet.
+
+    Each table's filter is built from MySQL the first time the table is loaded
+    and is updated as batches commit, so definitely-new rows can skip
+    `ON DUPLICATE KEY UPDATE` and the stored-hash lookup.
+    """
+
+    def __init__(self, memory_mb: float = EXISTENCE_FILTER_MEMORY_MB):
+        self.memory_bytes = int(memory_mb * 1024 * 1024)
+        self._filters: Dict[Tuple[str, str], BloomFilter] = {}
+        self._lock = threading.Lock()
+
+    def _get_filter(self, conn, model: Type, key_column: str) -> BloomFilter:
+        """Returns the table's filter, building it from MySQL on first use."""
+        filter_key = (model.__tablename__, key_column)
+        with self._lock:
+            if filter_key in self._filters:
+                return self._filters[filter_key]
+
+            key = getattr(model, key_column)
+            stored_rows = conn.execute(select(func.count()).select_from(model)).scalar()
+            bloom = BloomFilter.for_capacity(max(stored_rows * 2, 1), self.memory_bytes)
+            rows = conn.execution_options(stream_results=True).execute(select(key))
+            for (value,) in rows:
+                if value is not None:
+                    bloom.add(id_key(value))
+
+            self._filters[filter_key] = bloom
+            logger.info(
+                f"Built existence filter for {model.__tablename__}.{key_column}: "
+                f"{bloom.count} keys, {self.memory_bytes / 1024 / 1024:.1f} MB, "
+                f"{bloom.num_hashes} hashes, "
+                f"false-positive rate {bloom.false_positive_rate():.4%}"
+            )
+            return bloom
+
+    def split(
+        self, conn, model: Type, records: List[Dict[str, Any]]
+    ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        Splits records into definitely-new and possibly-existing ones.
+
+        Returns:
+            Tuple of (new records, possibly existing records)
+        """
+        key_column = record_key_column(model, records)
+        if key_column is None:
+            return [], records
+
+        bloom = self._get_filter(conn, model, key_column)
+        new_records, known_records = [], []
+        for record in records:
+            key = id_key(record[key_column])
+            if key is None or key in bloom:
+                known_records.append(record)
+            else:
+                new_records.append(record)
+        return new_records, known_records
+
+    def add(self, model: Type, records: List[Dict[str, Any]]) -> None:
+        """Registers committed records so later batches treat them as existing."""
+        key_column = record_key_column(model, records)
+        bloom = self._filters.get((model.__tablename__, key_column))
+        if bloom is None:
+            return
+
+        with self._lock:
+            for record in records:
+                key = id_key(record[key_column])
+                if key is not None:
+                    bloom.add(key)
+
+    def false_positive_rates(self) -> Dict[str, float]:
+        """Current expected false-positive rate of every table's filter."""
+        return {
+            f"{table}.{column}": bloom.false_positive_rate()
+            for (table, column), bloom in self._filters.items()
+        }
+
+
+_index = ExistenceIndex()
+
+
+def get_existence_index() -> ExistenceIndex:
+    """Returns the process-wide existence index."""
+    return _index
@@ -0,0 +1,425 @@
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from geoalchemy2 import Geometry
+from sqlalchemy import Boolean, Date, DateTime, Float, Integer, Numeric
+
+from config.settings import EXPORT_CONFIG
+from connections.sql_connector import get_mysql_engine
+from utils.sql_data_access import TABLE_MAPPING
+
+logger = logging.getLogger(__name__)
+
+EXPORT_DIR = EXPORT_CONFIG.get("output_dir", "data/export")
+# Rows per primary key range; each range is exported by one worker
+EXPORT_RANGE_SIZE = EXPORT_CONFIG.get("range_size", 100000)
+EXPORT_WORKERS = EXPORT_CONFIG.get("max_workers", 4)
+# Rows fetched from the cursor, and buffered per date, at a time
+EXPORT_FETCH_SIZE = EXPORT_CONFIG.get("fetch_size", 10000)
+EXPORT_COMPRESSION = EXPORT_CONFIG.get("compression", "zstd")
+# How far back the watermark stays from the clock when open transactions
+# cannot be listed (information_schema.INNODB_TRX needs the PROCESS privilege)
+EXPORT_COMMIT_LAG_SECONDS = EXPORT_CONFIG.get("commit_lag_seconds", 300)
+WATERMARK_FILE = "_watermarks.json"
+# Server-kept time each row was last written (see models.sql.sql_models)
+WATERMARK_COLUMN = "loaded_at"
+PARTITION_COLUMN = "created_date"
+# Hive's name for the partition of rows without a date
+NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+
+
+class ExportError(Exception):
+    """Custom exception for export failures"""
+
+    pass
+
+
+def arrow_type(column) -> pa.DataType:
+    """Maps a model column to its Parquet column type."""
+    column_type = column.type
+    if isinstance(column_type, Geometry):
+        # Well-known binary, longitude first
+        return pa.binary()
+    if isinstance(column_type, Boolean):
+        return pa.bool_()
+    if isinstance(column_type, Float):
+        return pa.float64()
+    if isinstance(column_type, Numeric):
+        return pa.decimal128(column_type.precision, column_type.scale)
+    if isinstance(column_type, Integer):
+        return pa.uint32() if getattr(column_type, "unsigned", False) else pa.int32()
+    if isinstance(column_type, DateTime):
+        return pa.timestamp("us")
+    if isinstance(column_type, Date):
+        return pa.date32()
+    # Strings and enums
+    return pa.string()
+
+
+def arrow_schema(Model) -> pa.Schema:
+    return pa.schema(
+        [
+            pa.field(column.name, arrow_type(column), nullable=column.nullable)
+            for column in Model.__table__.columns
+        ]
+    )
+
+
+def _select_list(Model) -> str:
+    return ", ".join(
+        (
+            f"ST_AsBinary({column.name}, 'axis-order=long-lat')"
+            if isinstance(column.type, Geometry)
+            else column.name
+        )
+        for column in Model.__table__.columns
+    )
+
+
+def _watermark_condition(
+    since: Optional[datetime], until: datetime
+) -> Tuple[str, Tuple]:
+    """Condition selecting the rows written in [since, until)."""
+    if since is None:
+        return f"{WATERMARK_COLUMN} < %s", (until,)
+    return (
+        f"{WATERMARK_COLUMN} >= %s AND {WATERMARK_COLUMN} < %s",
+        (since, until),
+    )
+
+
+def _arrow_array(values: List, data_type: pa.DataType) -> pa.Array:
+    if pa.types.is_boolean(data_type):
+        values = [None if value is None else bool(value) for value in values]
+    elif pa.types.is_binary(data_type):
+        values = [None if value is None else bytes(value) for value in values]
+    return pa.array(values, type=data_type)
+
+
+class TableExporter:
+    """
+    Exports MySQL tables to date-partitioned, compressed Parquet files.
+
+    Each table is split into primary key ranges exported in parallel. A
+    range streams its rows through an unbuffered cursor (SQLAlchemy always
+    buffers results with mysql-connector), so a worker holds at most a
+    fetch of rows per date. Files are laid out Hive-style by day of
+    creation, `<table>/created_date=YYYY-MM-DD/part-<run>-<range>.parquet`.
+
+    Every run exports the rows written before a watermark taken from the
+    database when it starts: the server clock, held back to the start of
+    the oldest open transaction, so no row written before it can still
+    commit afterwards. Runs are incremental once a table has been
+    exported: only rows whose `loaded_at` lies between the previous
+    watermark (inclusive) and the new one (exclusive) are written, as new
+    files next to the old ones, so each change is exported once and
+    readers keep the latest `loaded_at` per id. A full export replaces the
+    table's directory. Files are written to a staging directory and moved
+    into place when the table completes.
+    """
+
+    def __init__(
+        self,
+        engine=None,
+        output_dir: str = EXPORT_DIR,
+        range_size: int = EXPORT_RANGE_SIZE,
+        max_workers: int = EXPORT_WORKERS,
+        fetch_size: int = EXPORT_FETCH_SIZE,
+        compression: str = EXPORT_COMPRESSION,
+    ):
+        """
+        Args:
+            engine: SQLAlchemy engine (default: the MySQL target)
+            output_dir: Root directory of the exported tables
+            range_size: Primary key values per exported range
+            max_workers: Ranges exported concurrently, across all tables
+            fetch_size: Rows fetched per round trip and written per row group
+            compression: Parquet compression codec
+        """
+        self.engine = engine or get_mysql_engine()
+        self.output_dir = output_dir
+        self.range_size = range_size
+        self.max_workers = max_workers
+        self.fetch_size = fetch_size
+        self.compression = compression
+        self.run_id = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+        self._watermark_lock = threading.Lock()
+
+    def _watermark_path(self) -> str:
+        return os.path.join(self.output_dir, WATERMARK_FILE)
+
+    def read_watermarks(self) -> Dict[str, Dict]:
+        try:
+            with open(self._watermark_path()) as watermark_file:
+                return json.load(watermark_file)
+        except FileNotFoundError:
+            return {}
+
+    def _save_watermark(self, table_name: str, loaded_before: datetime) -> None:
+        with self._watermark_lock:
+            watermarks = self.read_watermarks()
+            watermarks[table_name] = {
+                "loaded_before": loaded_before.isoformat(),
+                "run_id": self.run_id,
+            }
+            path = self._watermark_path()
+            with open(f"{path}.tmp", "w") as watermark_file:
+                json.dump(watermarks, watermark_file, indent=2)
+            os.replace(f"{path}.tmp", path)
+
+    def _committed_before(self, cursor) -> datetime:
+        """
+        Returns a time before which every row written has been committed.
+
+        `loaded_at` is stamped when a statement runs, not when its
+        transaction commits, so the server clock is held back to the start
+        of the oldest open transaction.
+        """
+        try:
+            cursor.execute(
+                "SELECT LEAST(NOW(6), COALESCE(MIN(trx_started), NOW(6))) "
+                "FROM information_schema.INNODB_TRX"
+            )
+        except Exception as e:
+            logger.warning(
+                f"Cannot list open transactions ({e}); holding the export "
+                f"watermark {EXPORT_COMMIT_LAG_SECONDS} seconds back instead"
+            )
+            cursor.execute(
+                "SELECT NOW(6) - INTERVAL %s SECOND", (EXPORT_COMMIT_LAG_SECONDS,)
+            )
+        return cursor.fetchone()[0]
+
+    def plan(self, table_name: str, since: Optional[datetime]) -> Tuple[List, Dict]:
+        """
+        Splits a table into primary key ranges of the rows to export.
+
+        Args:
+            table_name: Table to export
+            since: Only rows written at or after this time, the previous
+                run's watermark (None: all rows)
+
+        Returns:
+            List of (first_id, end_id) ranges, and the bounds of the run:
+            `since` and `until`, the watermark before which it exports
+        """
+        connection = self.engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            until = self._committed_before(cursor)
+            where, params = _watermark_condition(since, until)
+            cursor.execute(
+                f"SELECT MIN(id), MAX(id) FROM {table_name} WHERE {where}", params
+            )
+            first_id, last_id = cursor.fetchone()
+            cursor.close()
+        finally:
+            connection.close()
+
+        if first_id is None:
+            return [], {"since": since, "until": until}
+        ranges = [
+            (start, min(start + self.range_size, last_id + 1))
+            for start in range(first_id, last_id + 1, self.range_size)
+        ]
+        return ranges, {"since": since, "until": until}
+
+    def export_range(
+        self,
+        table_name: str,
+        staging_dir: str,
+        range_index: int,
+        id_range: Tuple[int, int],
+        bounds: Dict,
+    ) -> int:
+        """
+        Streams one primary key range into Parquet files, one per day of creation.
+
+        Rows arrive ordered by creation time, so each day's file is written
+        and closed before the next one opens, and a worker holds a single
+        writer whatever the number of days in its range.
+
+        Returns:
+            Number of rows written
+        """
+        Model = TABLE_MAPPING[table_name]
+        schema = arrow_schema(Model)
+        date_index = schema.get_field_index("created_at")
+        where, params = _watermark_condition(bounds["since"], bounds["until"])
+        query = (
+            f"SELECT {_select_list(Model)} FROM {table_name} "
+            f"WHERE id >= %s AND id < %s AND {where}"
+        )
+        if date_index >= 0:
+            # NULLs sort first, into the default partition
+            query += " ORDER BY created_at, id"
+        params = [*id_range, *params]
+
+        writer: Optional[pq.ParquetWriter] = None
+        writer_day = None
+        buffer: List = []
+        rows_written = 0
+
+        def flush() -> None:
+            nonlocal writer
+            if not buffer:
+                return
+            if writer is None:
+                directory = os.path.join(
+                    staging_dir, f"{PARTITION_COLUMN}={writer_day}"
+                )
+                os.makedirs(directory, exist_ok=True)
+                writer = pq.ParquetWriter(
+                    os.path.join(
+                        directory, f"part-{self.run_id}-{range_index:05d}.parquet"
+                    ),
+                    schema,
+                    compression=self.compression,
+                )
+            columns = [
+                _arrow_array(list(values), field.type)
+                for values, field in zip(zip(*buffer), schema)
+            ]
+            writer.write_batch(pa.record_batch(columns, schema=schema))
+            buffer.clear()
+
+        connection = self.engine.raw_connection()
+        try:
+            cursor = connection.cursor(buffered=False)
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(self.fetch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    created_at = row[date_index] if date_index >= 0 else None
+                    day = (
+                        created_at.date().isoformat() if created_at else NULL_PARTITION
+                    )
+                    if day != writer_day:
+                        flush()
+                        if writer is not None:
+                            writer.close()
+                            writer = None
+                        writer_day = day
+                    buffer.append(row)
+                    if len(buffer) >= self.fetch_size:
+                        flush()
+                rows_written += len(rows)
+            flush()
+            cursor.close()
+        finally:
+            if writer is not None:
+                writer.close()
+            connection.close()
+        return rows_written
+
+    def _publish(self, table_name: str, staging_dir: str, full: bool) -> int:
+        """Moves a completed table's staged files into place, returning their count."""
+        target_dir = os.path.join(self.output_dir, table_name)
+        files = [
+            os.path.join(directory, name)
+            for directory, _, names in os.walk(staging_dir)
+            for name in names
+        ]
+        if full:
+            if os.path.exists(target_dir):
+                shutil.rmtree(target_dir)
+            os.makedirs(staging_dir, exist_ok=True)
+            os.replace(staging_dir, target_dir)
+            return len(files)
+        for path in files:
+            destination = os.path.join(target_dir, os.path.relpath(path, staging_dir))
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            os.replace(path, destination)
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        return len(files)
+
+    def export(self, tables: List[str] = None, full: bool = False) -> Dict[str, Dict]:
+        """
+        Exports tables in parallel ranges, incrementally unless `full` is set.
+
+        Args:
+            tables: Tables of TABLE_MAPPING to export (default: all)
+            full: Export every row and replace the table's previous files
+
+        Returns:
+            Dictionary mapping each table to its rows, files, mode and seconds
+
+        Raises:
+            ValueError: If a table is not in TABLE_MAPPING
+            ExportError: If a range fails; that table's files are not published
+        """
+        tables = tables or list(TABLE_MAPPING)
+        unknown = [name for name in tables if name not in TABLE_MAPPING]
+        if unknown:
+            raise ValueError(f"Invalid table name provided: {', '.join(unknown)}")
+        os.makedirs(self.output_dir, exist_ok=True)
+        watermarks = self.read_watermarks()
+
+        reports = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            submitted = []
+            for table_name in tables:
+                # Tables last exported by `updated_at` are exported in full once
+                watermark = watermarks.get(table_name, {}).get("loaded_before")
+                table_full = full or not watermark
+                since = None if table_full else datetime.fromisoformat(watermark)
+                start_time = time.perf_counter()
+                ranges, bounds = self.plan(table_name, since)
+                staging_dir = os.path.join(
+                    self.output_dir, f".{table_name}.staging-{self.run_id}"
+                )
+                futures = [
+                    executor.submit(
+                        self.export_range,
+                        table_name,
+                        staging_dir,
+                        index,
+                        id_range,
+                        bounds,
+                    )
+                    for index, id_range in enumerate(ranges)
+                ]
+                submitted.append(
+                    (table_name, table_full, staging_dir, bounds, futures, start_time)
+                )
+                logger.info(
+                    f"Exporting {table_name} "
+                    f"({'full' if table_full else f'written since {since}'}) "
+                    f"in {len(ranges)} ranges"
+                )
+
+            for (
+                table_name,
+                table_full,
+                staging_dir,
+                bounds,
+                futures,
+                start_time,
+            ) in submitted:
+                try:
+                    rows = sum(future.result() for future in futures)
+                except Exception as e:
+                    shutil.rmtree(staging_dir, ignore_errors=True)
+                    logger.error(f"Export of {table_name} failed: {e}")
+                    raise ExportError(f"Export of {table_name} failed: {e}")
+                files = self._publish(table_name, staging_dir, table_full)
+                self._save_watermark(table_name, bounds["until"])
+                reports[table_name] = {
+                    "mode": "full" if table_full else "incremental",
+                    "rows": rows,
+                    "files": files,
+                    "seconds": round(time.perf_counter() - start_time, 2),
+                }
+                logger.info(f"Exported {rows} {table_name} rows to {files} files")
+        return reports
@@ -1,49 +1,201 @@
-from connections.mongo_connector import get_mongo_client
+import threading
+from contextlib import nullcontext
+from itertools import islice
+
+from bson import ObjectId
+
+from connections.mongo_connector import (
+    EXTRACTION_PROFILE,
+    get_mongo_client,
+    scan_cursor,
+)
 from config.settings import (
     LAST_PROCESSED_IDS,
     ETL_BATCH_SIZE,
     LAST_UPDATED,
     MONGO_DATABASE,
+    SOURCE_DIR,
 )
 from config.update_config import update_last_processed_id
+from etl.file_source import FileSource
+from etl.validate import get_document_validator
+
+COLLECTION_NAMES = ["country", "zone", "star", "city", "receiver", "tracker", "order"]
+
+_databases = {}
+_file_source = None
+_source_lock = threading.Lock()
+
+
+def _get_database(profile=None):
+    """Connects to MongoDB on first use rather than on import."""
+    with _source_lock:
+        if profile not in _databases:
+            _databases[profile] = get_mongo_client(profile)[MONGO_DATABASE]
+        return _databases[profile]
 
-client = get_mongo_client()
-db = client[MONGO_DATABASE]
 
-COLLECTIONS = {
-    "country": db["country"],
-    "zone": db["zone"],
-    "star": db["star"],
-    "city": db["city"],
-    "receiver": db["receiver"],
-    "tracker": db["tracker"],
-    "order": db["order"],
-}
+def get_file_source():
+    """Returns the mongoexport file source when SOURCE_DIR is set, else None."""
+    global _file_source
+    if not SOURCE_DIR:
+        return None
+    with _source_lock:
+        if _file_source is None:
+            _file_source = FileSource(SOURCE_DIR)
+        return _file_source
 
 
-def extract_data(collection_name):
-    """Extract data from a MongoDB collection using `_id` pagination."""
-    if collection_name not in COLLECTIONS:
+def get_collection(collection_name, profile=None):
+    """
+    Returns a MongoDB collection, connecting on first use.
+
+    Args:
+        collection_name: Name of the collection
+        profile: Client profile to read through (None: the default client)
+    """
+    if collection_name not in COLLECTION_NAMES:
         raise KeyError(
-            f"Collection '{collection_name}' not found. Available collections: {list(COLLECTIONS.keys())}"
+            f"Collection '{collection_name}' not found. Available collections: {COLLECTION_NAMES}"
+        )
+    return _get_database(profile)[collection_name]
+
+
+def _to_object_id(value):
+    """Accepts ObjectIds or their hex strings (as passed through Airflow XComs)."""
+    if value is None or isinstance(value, ObjectId):
+        return value
+    return ObjectId(value)
+
+
+def extract_data(collection_name, lower_id=None, upper_id=None):
+    """
+    Extract data from a MongoDB collection using `_id` pagination.
+
+    When SOURCE_DIR is set, the collection is read from mongoexport files
+    in that directory instead (see `FileSource`). Documents that do not
+    match their mongoengine model are dead-lettered here, before any
+    transform sees them (see `DocumentValidator`).
+
+    Args:
+        collection_name: Name of the collection to extract
+        lower_id: Optional inclusive lower `_id` bound of the partition to extract
+        upper_id: Optional exclusive upper `_id` bound of the partition to extract
+    """
+    last_id = _to_object_id(LAST_PROCESSED_IDS.get(collection_name))
+    lower_id = _to_object_id(lower_id)
+    upper_id = _to_object_id(upper_id)
+
+    validator = get_document_validator()
+    file_source = get_file_source()
+    if file_source is not None:
+        documents = file_source.find(
+            collection_name, LAST_UPDATED, last_id, lower_id, upper_id
         )
+        while True:
+            batch = list(islice(documents, ETL_BATCH_SIZE))
+            if not batch:
+                break
+            batch = validator.split(collection_name, batch)
+            if batch:
+                yield batch
+        return
+
+    query = {"updatedAt": {"$gt": LAST_UPDATED}}
+    id_range = {}
+    if last_id:
+        id_range["$gt"] = last_id
+    if lower_id is not None:
+        id_range["$gte"] = lower_id
+    if upper_id is not None:
+        id_range["$lt"] = upper_id
+    if id_range:
+        query["_id"] = id_range
+
+    # One cursor for the whole scan; the consumer may hold it for as long
+    # as loading the previous batches takes
+    collection = get_collection(collection_name, EXTRACTION_PROFILE)
+    with scan_cursor(collection, query) as cursor:
+        while True:
+            batch = list(islice(cursor, ETL_BATCH_SIZE))
+
+            if not batch:
+                print(f"No more records for {collection_name}")
+                break
+
+            valid = validator.split(collection_name, batch)
+            if valid:
+                yield valid
+            # update_last_processed_id(collection_name, batch[-1]["_id"])
 
-    collection = COLLECTIONS[collection_name]
-    last_id = LAST_PROCESSED_IDS.get(collection_name)
 
-    while True:
-        query = {"updatedAt": {"$gt": LAST_UPDATED}}
+def plan_partitions(
+    collection_name, partition_size, lower_id=None, upper_id=None, pending_only=True
+):
+    """
+    Splits the pending documents of a collection into `_id` range partitions.
+
+    Only `_id`s are read, walking the `_id` index once, so planning stays
+    cheap compared to extracting the documents themselves.
+
+    Args:
+        collection_name: Name of the collection to split
+        partition_size: Approximate number of documents per partition
+        lower_id: Optional inclusive lower `_id` bound of the range to split
+        upper_id: Optional exclusive upper `_id` bound of the range to split
+        pending_only: Only count documents the next extraction would read;
+            when False every document in the range is counted
+
+    Returns:
+        List of (lower_id, upper_id) hex string pairs usable as `extract_data`
+        bounds; the outer bounds are the given ones (None when open). Always
+        contains at least one partition, so downstream work is never skipped.
+    """
+    lower_id = _to_object_id(lower_id)
+    upper_id = _to_object_id(upper_id)
+    last_id = None
+    updated_after = None
+    if pending_only:
+        last_id = _to_object_id(LAST_PROCESSED_IDS.get(collection_name))
+        updated_after = LAST_UPDATED
+
+    file_source = get_file_source()
+    if file_source is not None:
+        source = nullcontext(
+            file_source.find(
+                collection_name, updated_after, last_id, lower_id, upper_id
+            )
+        )
+    else:
+        query = {}
+        id_range = {}
+        if updated_after is not None:
+            query["updatedAt"] = {"$gt": updated_after}
         if last_id:
-            query["_id"] = {"$gt": last_id}
+            id_range["$gt"] = last_id
+        if lower_id is not None:
+            id_range["$gte"] = lower_id
+        if upper_id is not None:
+            id_range["$lt"] = upper_id
+        if id_range:
+            query["_id"] = id_range
+        collection = get_collection(collection_name, EXTRACTION_PROFILE)
+        source = scan_cursor(collection, query, {"_id": 1})
+
+    boundaries = []
+    with source as documents:
+        for position, document in enumerate(documents):
+            if position and position % partition_size == 0:
+                boundaries.append(str(document["_id"]))
 
-        cursor = collection.find(query).sort("_id").limit(ETL_BATCH_SIZE)
-        batch = list(cursor)
+    lower_bounds = [str(lower_id) if lower_id else None] + boundaries
+    upper_bounds = boundaries + [str(upper_id) if upper_id else None]
+    return list(zip(lower_bounds, upper_bounds))
 
-        if not batch:
-            print(f"No more records for {collection_name}")
-            break
 
-        yield batch
-        if batch:
-            last_id = batch[-1]["_id"]
-            # update_last_processed_id(collection_name, last_id)
+def estimate_document_count(collection_name):
+    """Cheap, metadata-based size estimate of a MongoDB collection."""
+    file_source = get_file_source()
+    if file_source is not None:
+        return file_source.estimated_document_count(collection_name)
+    return get_collection(collection_name).estimated_document_count()
@@ -0,0 +1,85 @@
+import glob
+import os
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional
+
+from bson import ObjectId, json_util
+
+
+def _naive_utc(value: datetime) -> datetime:
+    """Matches the naive UTC datetimes pymongo and json_util return."""
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+class FileSource:
+    """
+    Serves collections from mongoexport files instead of MongoDB.
+
+    Each collection is read from `<directory>/<name>.json` or
+    `<directory>/<database>.<name>.json`, in mongoexport's JSON lines format
+    or as a JSON array (`--jsonArray`). Extended JSON types ($oid, $date)
+    are decoded, so documents look exactly like pymongo results. Files are
+    parsed once and kept sorted by `_id`, which makes this a stand-in for
+    local runs and benchmarks rather than a replacement for MongoDB.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._documents: Dict[str, List[Dict]] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, collection_name: str) -> str:
+        candidates = [os.path.join(self.directory, f"{collection_name}.json")]
+        candidates += sorted(
+            glob.glob(os.path.join(self.directory, f"*.{collection_name}.json"))
+        )
+        for path in candidates:
+            if os.path.exists(path):
+                return path
+        raise KeyError(f"Collection '{collection_name}' not found in {self.directory}")
+
+    def documents(self, collection_name: str) -> List[Dict]:
+        """Returns every document of a collection, sorted by `_id`."""
+        with self._lock:
+            if collection_name not in self._documents:
+                with open(self._path(collection_name)) as export_file:
+                    content = export_file.read()
+                if content.lstrip().startswith("["):
+                    documents = json_util.loads(content)
+                else:
+                    documents = [
+                        json_util.loads(line) for line in content.splitlines() if line
+                    ]
+                documents.sort(key=lambda document: document["_id"])
+                self._documents[collection_name] = documents
+            return self._documents[collection_name]
+
+    def find(
+        self,
+        collection_name: str,
+        updated_after: Optional[datetime] = None,
+        after_id: Optional[ObjectId] = None,
+        lower_id: Optional[ObjectId] = None,
+        upper_id: Optional[ObjectId] = None,
+    ) -> Iterator[Dict]:
+        """Yields the documents matching the filters extract_data applies, by `_id`."""
+        updated_after = _naive_utc(updated_after) if updated_after else None
+        for document in self.documents(collection_name):
+            _id = document["_id"]
+            if after_id is not None and _id <= after_id:
+                continue
+            if lower_id is not None and _id < lower_id:
+                continue
+            if upper_id is not None and _id >= upper_id:
+                break
+            if updated_after is not None and not (
+                document.get("updatedAt") and document["updatedAt"] > updated_after
+            ):
+                continue
+            yield document
+
+    def estimated_document_count(self, collection_name: str) -> int:
+        return len(self.documents(collection_name))
@@ -1,15 +1,24 @@
 from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy.exc import DataError, IntegrityError
 from sqlalchemy.dialects.mysql import insert
 from models.sql.sql_models import *
 import pandas as pd
-from typing import Dict, Any, Type
+from typing import Dict, Any, Callable, List, Type
 from contextlib import contextmanager
 import logging
 from functools import wraps
 import time
 from connections.sql_connector import get_mysql_engine
+from etl.aggregates import refresh_after_commit
+from etl.row_hash import add_row_hashes, filter_changed_records
+from etl.dead_letter import get_dead_letter_sink
+from etl.existence_filter import get_existence_index
+from etl.partitioning import get_partition_manager
+from etl.sinks import Sink, get_sink
+from utils.id_allocator import resolve_after_commit
+from utils.metrics import FUNCTION_SECONDS
+from utils.spatial_queries import sync_locations_after_commit
 
 logging.basicConfig(
     level=logging.DEBUG, format="%(asctime)s - %(levelname)s - %(message)s"
@@ -18,6 +27,16 @@ logger = logging.getLogger(__name__)
 
 # Constants
 BATCH_SIZE = 1000
+# Columns that keep their stored value when an existing row is upserted
+IMMUTABLE_COLUMNS = {"id", "created_at"}
+# Session variables set on every loading connection (see etl.backfill)
+SESSION_VARIABLES: Dict[str, int] = {}
+# Called with (connection, table name, written records) after each batch commits
+POST_COMMIT_HOOKS: List[Callable] = [
+    resolve_after_commit,
+    sync_locations_after_commit,
+    refresh_after_commit,
+]
 
 
 class LoaderError(Exception):
@@ -34,6 +53,7 @@ def timing_decorator(func):
         start_time = time.time()
         result = func(*args, **kwargs)
         end_time = time.time()
+        FUNCTION_SECONDS.observe(end_time - start_time, function=func.__name__)
         logger.info(
             f"{func.__name__} took {end_time - start_time:.2f} seconds to execute"
         )
@@ -60,58 +80,180 @@ class DataLoader:
         finally:
             session.close()
 
+    @contextmanager
+    def _loading_connection(self):
+        """Open a connection with the configured session variables applied"""
+        session_variables = dict(SESSION_VARIABLES)
+        with self.engine.connect() as conn:
+            for name, value in session_variables.items():
+                conn.execute(text(f"SET SESSION {name} = {int(value)}"))
+            try:
+                yield conn
+            finally:
+                # Pooled connections must not leak the settings to later users
+                if conn.in_transaction():
+                    conn.rollback()
+                for name in session_variables:
+                    conn.execute(text(f"SET SESSION {name} = DEFAULT"))
+
     def _prepare_batch(self, df: pd.DataFrame, batch_size: int = BATCH_SIZE):
         """Generator function to yield data in batches"""
         for start in range(0, len(df), batch_size):
             yield df[start : start + batch_size].to_dict("records")
 
-    def _create_upsert_statement(self, model: Type, data: Dict[str, Any]):
-        """Create an upsert statement for the given model and data"""
-        # Filter out columns that don't exist in the model
+    def _filter_columns(self, model: Type, data: List[Dict[str, Any]]):
+        """Filter out columns that don't exist in the model"""
         valid_columns = set(model.__table__.columns.keys())
-        filtered_data = [
+        return [
             {k: v for k, v in record.items() if k in valid_columns} for record in data
         ]
 
+    def _create_insert_statement(self, model: Type, data: List[Dict[str, Any]]):
+        """Create a plain multi-row insert statement for rows known to be new"""
+        return insert(model).values(self._filter_columns(model, data))
+
+    def _create_upsert_statement(self, model: Type, data: Dict[str, Any]):
+        """Create an upsert statement for the given model and data"""
+        filtered_data = self._filter_columns(model, data)
+
         stmt = insert(model).values(filtered_data)
 
-        # Get all columns except id for update
+        # Get all columns except the immutable ones for update
         update_cols = {
             col.name: getattr(stmt.inserted, col.name)
             for col in model.__table__.columns
-            if col.name != "id" and col.name in filtered_data[0]
+            if col.name not in IMMUTABLE_COLUMNS and col.name in filtered_data[0]
         }
 
         return stmt.on_duplicate_key_update(**update_cols)
 
+    def _write_batch(
+        self, conn, model: Type, batch: List[Dict[str, Any]], upsert: bool = True
+    ) -> int:
+        """
+        Upsert a batch in its own transaction, bisecting it when rows are rejected.
+
+        A batch that violates a constraint is split in half and each half is
+        retried, until the offending rows are isolated and dead-lettered.
+        All other rows still commit in as few statements as possible.
+
+        Args:
+            upsert: Use `ON DUPLICATE KEY UPDATE`; plain inserts are for rows
+                the existence filter reports as new.
+
+        Returns:
+            Number of records written
+        """
+        if upsert:
+            stmt = self._create_upsert_statement(model, batch)
+        else:
+            stmt = self._create_insert_statement(model, batch)
+
+        try:
+            conn.execute(stmt)
+            conn.commit()
+            return len(batch)
+        except (IntegrityError, DataError) as e:
+            conn.rollback()
+            if not upsert:
+                # Rows written by another worker after the filter was built
+                # show up as duplicates; they take the upsert path instead
+                return self._write_batch(conn, model, batch)
+            if len(batch) == 1:
+                get_dead_letter_sink().write(model.__tablename__, batch[0], e)
+                return 0
+
+            middle = len(batch) // 2
+            return self._write_batch(conn, model, batch[:middle]) + self._write_batch(
+                conn, model, batch[middle:]
+            )
+
+    def _run_post_commit_hooks(self, conn, model: Type, records: List[Dict]) -> None:
+        """
+        Runs the post-commit hooks for a written batch.
+
+        The batch is already committed, so a failing hook is logged rather
+        than failing the load; what it maintains can be rebuilt later.
+        """
+        for hook in POST_COMMIT_HOOKS:
+            try:
+                hook(conn, model.__tablename__, records)
+            except Exception as e:
+                conn.rollback()
+                logger.error(
+                    f"Post-commit hook {hook.__name__} failed for "
+                    f"{model.__tablename__}: {e}"
+                )
+
     @timing_decorator
     def bulk_upsert(self, df: pd.DataFrame, model: Type) -> None:
         """
         Perform bulk upsert operation with batching and error handling.
 
+        Each batch commits on its own. Records rejected by the database are
+        isolated by bisection and sent to the dead-letter sink. Batches for
+        partitioned tables are written one partition at a time.
+
         Args:
             df: DataFrame containing the data to upsert
             model: SQLAlchemy model class
         """
         total_records = len(df)
         processed_records = 0
+        skipped_records = 0
+        inserted_records = 0
+        written_records = 0
+        existence_index = get_existence_index()
+        partitions = get_partition_manager()
+        table_name = model.__tablename__
 
         try:
-            with self.engine.connect() as conn:
+            with self._loading_connection() as conn:
                 for batch in self._prepare_batch(df):
-                    stmt = self._create_upsert_statement(model, batch)
-                    conn.execute(stmt)
-
                     processed_records += len(batch)
+                    add_row_hashes(model, batch)
+
+                    # Definitely-new rows go through a plain INSERT
+                    new, known = existence_index.split(conn, model, batch)
+                    if new:
+                        inserted_records += len(new)
+                        for group in partitions.group_by_partition(
+                            conn, table_name, new
+                        ):
+                            written_records += self._write_batch(
+                                conn, model, group, upsert=False
+                            )
+
+                    # Rows whose content hash is unchanged need no write at all
+                    changed = (
+                        filter_changed_records(conn, model, known) if known else []
+                    )
+                    skipped_records += len(known) - len(changed)
+
+                    if changed:
+                        for group in partitions.group_by_partition(
+                            conn, table_name, changed
+                        ):
+                            written_records += self._write_batch(conn, model, group)
+                    else:
+                        conn.rollback()
+
+                    existence_index.add(model, batch)
+                    if new or changed:
+                        self._run_post_commit_hooks(conn, model, new + changed)
                     logger.info(
                         f"Processed {processed_records}/{total_records} records"
                     )
 
-                conn.commit()
-
+            rejected_records = total_records - skipped_records - written_records
             logger.info(
-                f"Successfully upserted {total_records} records to {model.__tablename__}"
+                f"Successfully upserted {written_records} records to "
+                f"{model.__tablename__} ({inserted_records} routed to plain insert, "
+                f"{skipped_records} unchanged records skipped, "
+                f"{rejected_records} records dead-lettered)"
             )
+            for name, rate in existence_index.false_positive_rates().items():
+                logger.debug(f"Existence filter {name} false-positive rate: {rate:.4%}")
 
         except Exception as e:
             logger.error(f"Error during bulk upsert to {model.__tablename__}: {str(e)}")
@@ -121,69 +263,69 @@ class DataLoader:
 class ModelLoader:
     """Base class for specific model loaders"""
 
-    def __init__(self, model: Type, loader: DataLoader):
+    def __init__(self, model: Type, loader: Sink):
         self.model = model
         self.loader = loader
 
     @timing_decorator
     def load(self, df: pd.DataFrame) -> None:
         """Load data for specific model"""
-        self.loader.bulk_upsert(df, self.model)
+        self.loader.write(df, self.model)
 
 
 class CountryLoader(ModelLoader):
-    def __init__(self, loader: DataLoader):
+    def __init__(self, loader: Sink):
         super().__init__(Country, loader)
 
 
 class CityLoader(ModelLoader):
-    def __init__(self, loader: DataLoader):
+    def __init__(self, loader: Sink):
         super().__init__(City, loader)
 
 
 class ZoneLoader(ModelLoader):
-    def __init__(self, loader: DataLoader):
+    def __init__(self, loader: Sink):
         super().__init__(Zone, loader)
 
 
 class AddressLoader(ModelLoader):
-    def __init__(self, loader: DataLoader):
+    def __init__(self, loader: Sink):
         super().__init__(Address, loader)
 
 
 class ReceiverLoader(ModelLoader):
-    def __init__(self, loader: DataLoader):
+    def __init__(self, loader: Sink):
         super().__init__(Receiver, loader)
 
 
 class StarLoader(ModelLoader):
-    def __init__(self, loader: DataLoader):
+    def __init__(self, loader: Sink):
         super().__init__(Star, loader)
 
 
 class OrderLoader(ModelLoader):
-    def __init__(self, loader: DataLoader):
+    def __init__(self, loader: Sink):
         super().__init__(Order, loader)
 
 
 class CodPaymentLoader(ModelLoader):
-    def __init__(self, loader: DataLoader):
+    def __init__(self, loader: Sink):
         super().__init__(CodPayment, loader)
 
 
 class ConfirmationLoader(ModelLoader):
-    def __init__(self, loader: DataLoader):
+    def __init__(self, loader: Sink):
         super().__init__(Confirmation, loader)
 
 
 class TrackerLoader(ModelLoader):
-    def __init__(self, loader: DataLoader):
+    def __init__(self, loader: Sink):
         super().__init__(Tracker, loader)
 
 
 def get_loader(model_type: str) -> ModelLoader:
     """Factory function to create appropriate loader instance"""
-    loader = DataLoader()
+    loader = get_sink()
     loaders = {
         "country": CountryLoader(loader),
         "city": CityLoader(loader),
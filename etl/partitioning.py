@@ -0,0 +1,454 @@
+import logging
+import re
+import threading
+from collections import defaultdict
+from datetime import date
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import bindparam, inspect, text
+
+from config.settings import PARTITIONING_CONFIG
+from connections.sql_connector import get_mysql_engine
+from etl.dead_letter import get_dead_letter_sink
+
+logger = logging.getLogger(__name__)
+
+# Fact tables that can be range partitioned by month of creation
+PARTITIONED_TABLES = PARTITIONING_CONFIG.get(
+    "tables", ["orders", "cod_payments", "confirmations", "trackers"]
+)
+# Monthly partitions kept ready beyond the current month
+MONTHS_AHEAD = PARTITIONING_CONFIG.get("months_ahead", 3)
+PARTITION_COLUMN = "created_at"
+# Catch-alls below the first and above the last monthly partition
+START_PARTITION = "p_start"
+FUTURE_PARTITION = "p_future"
+MONTHLY_PARTITION = re.compile(r"^p(\d{4})(\d{2})$")
+
+
+class PartitioningError(Exception):
+    """Custom exception for partition maintenance failures"""
+
+    pass
+
+
+def _month(value) -> Optional[date]:
+    """First day of the month of a date, datetime or 'YYYY-MM-DD...' string."""
+    try:
+        if isinstance(value, str):
+            return date(int(value[:4]), int(value[5:7]), 1)
+        return date(value.year, value.month, 1)
+    except (AttributeError, TypeError, ValueError):
+        # None, NaN and NaT have no month
+        return None
+
+
+def _add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _month_range(first: date, last: date) -> List[date]:
+    months = []
+    while first <= last:
+        months.append(first)
+        first = _add_months(first, 1)
+    return months
+
+
+def partition_name(month: date) -> str:
+    return f"p{month:%Y%m}"
+
+
+def _partition_clause(month: date) -> str:
+    return (
+        f"PARTITION {partition_name(month)} "
+        f"VALUES LESS THAN ('{_add_months(month, 1).isoformat()}')"
+    )
+
+
+class PartitionManager:
+    """
+    Maintains monthly `RANGE COLUMNS(created_at)` partitions of the fact tables.
+
+    MySQL requires every unique key of a partitioned table to include the
+    partitioning column and does not allow foreign keys on or to it, so
+    converting a table makes the primary key `(id, created_at)`, turns the
+    other unique keys into plain indexes and drops the foreign keys. Ids are
+    still allocated per mongo_id, and backfills still validate references
+    (see etl.backfill). Rows already stored keep their `created_at`, as on
+    unpartitioned tables, so they stay in their partition and a changed
+    source `created_at` updates the row instead of inserting it again.
+
+    Every table keeps an empty `p_future` partition above the monthly ones,
+    which is split cheaply whenever new months are needed, and a `p_start`
+    partition below them.
+    """
+
+    def __init__(
+        self,
+        engine=None,
+        tables: Iterable[str] = PARTITIONED_TABLES,
+        months_ahead: int = MONTHS_AHEAD,
+        enabled: bool = PARTITIONING_CONFIG.get("enabled", False),
+    ):
+        """
+        Args:
+            engine: SQLAlchemy engine (default: the MySQL target, on first use)
+            tables: Tables that are partitioned
+            months_ahead: Monthly partitions created beyond the current month
+            enabled: Whether the loader partitions and groups its writes
+        """
+        self._engine = engine
+        self.tables = list(tables)
+        self.months_ahead = months_ahead
+        self.enabled = enabled
+        # Months with a partition per table, None when the table is not partitioned
+        self._layouts: Dict[str, Optional[List[date]]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            self._engine = get_mysql_engine()
+        return self._engine
+
+    def _check_table(self, table: str) -> None:
+        if table not in self.tables:
+            raise ValueError(f"Table {table} is not a partitioned table")
+
+    def months(self, conn, table: str) -> Optional[List[date]]:
+        """
+        Reads the months that have a partition.
+
+        Returns:
+            Sorted months, or None if the table is not partitioned
+        """
+        names = conn.execute(
+            text(
+                "SELECT PARTITION_NAME FROM information_schema.PARTITIONS "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table "
+                "AND PARTITION_NAME IS NOT NULL"
+            ),
+            {"table": table},
+        ).scalars()
+        names = list(names)
+        if not names:
+            return None
+        months = []
+        for name in names:
+            match = MONTHLY_PARTITION.match(name)
+            if match:
+                months.append(date(int(match.group(1)), int(match.group(2)), 1))
+        return sorted(months)
+
+    def partition_table(self, conn, table: str) -> List[str]:
+        """
+        Converts a table to monthly partitions, covering its existing rows.
+
+        This rebuilds the table in a single `ALTER TABLE`, so large tables
+        should be converted outside of loads (`python -m etl partitions convert`).
+
+        Args:
+            conn: Connection outside of a transaction; DDL commits implicitly
+            table: Table to convert
+
+        Returns:
+            Names of the monthly partitions created
+
+        Raises:
+            PartitioningError: If rows have no created_at to partition by
+        """
+        self._check_table(table)
+        if self.months(conn, table) is not None:
+            return self.extend(conn, table)
+
+        nulls = conn.execute(
+            text(f"SELECT COUNT(*) FROM {table} WHERE {PARTITION_COLUMN} IS NULL")
+        ).scalar()
+        if nulls:
+            raise PartitioningError(
+                f"{nulls} rows of {table} have no {PARTITION_COLUMN} to partition by"
+            )
+        oldest, newest = conn.execute(
+            text(
+                f"SELECT MIN({PARTITION_COLUMN}), MAX({PARTITION_COLUMN}) FROM {table}"
+            )
+        ).one()
+        upcoming = _add_months(_month(date.today()), self.months_ahead)
+        months = _month_range(
+            _month(oldest) or _month(date.today()),
+            max(_month(newest) or upcoming, upcoming),
+        )
+
+        foreign_keys = conn.execute(
+            text(
+                "SELECT TABLE_NAME, CONSTRAINT_NAME "
+                "FROM information_schema.REFERENTIAL_CONSTRAINTS "
+                "WHERE CONSTRAINT_SCHEMA = DATABASE() "
+                "AND (TABLE_NAME = :table OR REFERENCED_TABLE_NAME = :table)"
+            ),
+            {"table": table},
+        ).fetchall()
+        for owner, constraint in foreign_keys:
+            conn.execute(text(f"ALTER TABLE {owner} DROP FOREIGN KEY {constraint}"))
+            logger.info(
+                f"Dropped foreign key {owner}.{constraint} to partition {table}"
+            )
+
+        inspector = inspect(conn)
+        clauses = []
+        for index in inspector.get_indexes(table):
+            if index["unique"] and PARTITION_COLUMN not in index["column_names"]:
+                columns = ", ".join(index["column_names"])
+                clauses.append(f"DROP INDEX {index['name']}")
+                clauses.append(f"ADD INDEX {index['name']} ({columns})")
+        primary_key = inspector.get_pk_constraint(table)["constrained_columns"]
+        if PARTITION_COLUMN not in primary_key:
+            columns = ", ".join(primary_key + [PARTITION_COLUMN])
+            clauses.append(f"DROP PRIMARY KEY, ADD PRIMARY KEY ({columns})")
+        partitions = ", ".join(
+            [
+                f"PARTITION {START_PARTITION} VALUES LESS THAN ('{months[0].isoformat()}')"
+            ]
+            + [_partition_clause(month) for month in months]
+            + [f"PARTITION {FUTURE_PARTITION} VALUES LESS THAN (MAXVALUE)"]
+        )
+        conn.execute(
+            text(
+                f"ALTER TABLE {table} {', '.join(clauses)} "
+                f"PARTITION BY RANGE COLUMNS({PARTITION_COLUMN}) ({partitions})"
+            )
+        )
+        conn.commit()
+        self._layouts[table] = months
+        logger.info(
+            f"Partitioned {table} by month: {partition_name(months[0])} "
+            f"to {partition_name(months[-1])}"
+        )
+        return [partition_name(month) for month in months]
+
+    def extend(self, conn, table: str, through: Optional[date] = None) -> List[str]:
+        """
+        Creates the monthly partitions missing up to `months_ahead` (or `through`).
+
+        New months are split off the empty `p_future` partition, which
+        takes no row copying.
+
+        Args:
+            conn: Connection outside of a transaction; DDL commits implicitly
+            table: Partitioned table
+            through: Last month needed, if beyond the usual horizon
+
+        Returns:
+            Names of the partitions created
+        """
+        months = self.months(conn, table)
+        if months is None:
+            return []
+        upcoming = _add_months(_month(date.today()), self.months_ahead)
+        last = max(_month(through) or upcoming, upcoming)
+        # With every month dropped, p_future spans from p_start upwards
+        start = _add_months(months[-1], 1) if months else _month(date.today())
+        missing = _month_range(start, last)
+        if missing:
+            partitions = ", ".join(
+                [_partition_clause(month) for month in missing]
+                + [f"PARTITION {FUTURE_PARTITION} VALUES LESS THAN (MAXVALUE)"]
+            )
+            try:
+                conn.execute(
+                    text(
+                        f"ALTER TABLE {table} REORGANIZE PARTITION "
+                        f"{FUTURE_PARTITION} INTO ({partitions})"
+                    )
+                )
+                conn.commit()
+            except Exception as e:
+                # Another process may have created them first
+                conn.rollback()
+                months = self.months(conn, table)
+                if not months or months[-1] < last:
+                    raise PartitioningError(f"Could not extend {table}: {e}")
+                missing = []
+            else:
+                months = months + missing
+                logger.info(
+                    f"Added partitions {partition_name(missing[0])} to "
+                    f"{partition_name(missing[-1])} to {table}"
+                )
+        self._layouts[table] = months
+        return [partition_name(month) for month in missing]
+
+    def _prepare(self, conn, table: str) -> Optional[List[date]]:
+        """Partitions an empty table on first use and keeps upcoming months ready."""
+        if self.months(conn, table) is None:
+            if conn.execute(text(f"SELECT 1 FROM {table} LIMIT 1")).first():
+                logger.warning(
+                    f"{table} is not partitioned; convert it with "
+                    f"`python -m etl partitions convert --tables {table}`"
+                )
+                return None
+            conn.rollback()
+            self.partition_table(conn, table)
+        self.extend(conn, table)
+        return self._layouts.get(table)
+
+    @staticmethod
+    def _keep_stored_created_at(conn, table: str, records: List[Dict]) -> None:
+        """Gives records of stored rows their stored `created_at`."""
+        ids = [record["id"] for record in records if record.get("id") is not None]
+        if not ids:
+            return
+        stored = dict(
+            conn.execute(
+                text(
+                    f"SELECT id, {PARTITION_COLUMN} FROM {table} WHERE id IN :ids"
+                ).bindparams(bindparam("ids", expanding=True)),
+                {"ids": ids},
+            ).all()
+        )
+        for record in records:
+            created_at = stored.get(record.get("id"))
+            if created_at is not None:
+                record[PARTITION_COLUMN] = created_at
+
+    def group_by_partition(
+        self, conn, table: str, records: List[Dict]
+    ) -> List[List[Dict]]:
+        """
+        Splits a batch into one group per target partition, oldest first.
+
+        Writing each group with its own statement keeps inserts and their
+        locks within one partition. Partitions for months beyond the last
+        one are created first, so rows never pile up in `p_future`. Records
+        of stored rows are given the stored `created_at`, which upserts never
+        change, so that they match the row's `(id, created_at)` key. Records
+        without a `created_at` are dead-lettered instead of grouped, since
+        MySQL would file them under `p_start`, outside every month.
+
+        Args:
+            conn: Loading connection; any open transaction is rolled back
+                before partitions are created
+            table: Table the records are written to
+            records: Records of the batch
+
+        Returns:
+            Groups of records; the whole batch if the table is not partitioned
+        """
+        if not self.enabled or table not in self.tables or not records:
+            return [records]
+        with self._lock:
+            if table not in self._layouts:
+                if conn.in_transaction():
+                    conn.rollback()
+                self._layouts[table] = self._prepare(conn, table)
+            if self._layouts[table] is None:
+                return [records]
+
+        self._keep_stored_created_at(conn, table, records)
+        with self._lock:
+            months = self._layouts[table]
+            groups = defaultdict(list)
+            for record in records:
+                groups[_month(record.get(PARTITION_COLUMN))].append(record)
+            undated = groups.pop(None, [])
+            newest = max(groups, default=None)
+            if newest and (not months or newest > months[-1]):
+                if conn.in_transaction():
+                    conn.rollback()
+                self.extend(conn, table, through=newest)
+
+        if undated:
+            sink = get_dead_letter_sink()
+            for record in undated:
+                sink.write(
+                    table,
+                    record,
+                    PartitioningError(f"{table}.{PARTITION_COLUMN} is missing"),
+                )
+            logger.warning(
+                f"Dead-lettered {len(undated)} {table} records without "
+                f"{PARTITION_COLUMN}"
+            )
+        return [groups[month] for month in sorted(groups)]
+
+    def _monthly_before(self, conn, table: str, before: date) -> List[date]:
+        self._check_table(table)
+        months = self.months(conn, table)
+        if months is None:
+            raise PartitioningError(f"{table} is not partitioned")
+        return [month for month in months if _add_months(month, 1) <= before]
+
+    def drop_partitions(self, table: str, before: date) -> List[str]:
+        """
+        Deletes the months ending on or before `before`, by dropping their partitions.
+
+        Args:
+            table: Partitioned table
+            before: Months entirely before this date are dropped
+
+        Returns:
+            Names of the dropped partitions
+        """
+        with self.engine.connect() as conn:
+            names = [
+                partition_name(month)
+                for month in self._monthly_before(conn, table, before)
+            ]
+            if names:
+                conn.execute(
+                    text(f"ALTER TABLE {table} DROP PARTITION {', '.join(names)}")
+                )
+                conn.commit()
+                logger.info(f"Dropped {len(names)} partitions of {table}")
+            self._layouts.pop(table, None)
+        return names
+
+    def archive_partitions(self, table: str, before: date) -> List[str]:
+        """
+        Moves the months ending on or before `before` into archive tables.
+
+        Each partition is swapped with a new empty table `<table>_<partition>`
+        by `ALTER TABLE ... EXCHANGE PARTITION`, which moves no rows, and the
+        emptied partition is then dropped.
+
+        Args:
+            table: Partitioned table
+            before: Months entirely before this date are archived
+
+        Returns:
+            Names of the archive tables
+        """
+        archives = []
+        with self.engine.connect() as conn:
+            for month in self._monthly_before(conn, table, before):
+                name = partition_name(month)
+                archive = f"{table}_{name}"
+                conn.execute(text(f"CREATE TABLE {archive} LIKE {table}"))
+                conn.execute(text(f"ALTER TABLE {archive} REMOVE PARTITIONING"))
+                conn.execute(
+                    text(
+                        f"ALTER TABLE {table} EXCHANGE PARTITION {name} "
+                        f"WITH TABLE {archive}"
+                    )
+                )
+                conn.execute(text(f"ALTER TABLE {table} DROP PARTITION {name}"))
+                conn.commit()
+                archives.append(archive)
+                logger.info(f"Archived partition {name} of {table} to {archive}")
+            self._layouts.pop(table, None)
+        return archives
+
+
+_manager: Optional[PartitionManager] = None
+_manager_lock = threading.Lock()
+
+
+def get_partition_manager() -> PartitionManager:
+    """Returns the process-wide partition manager."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = PartitionManager()
+        return _manager
@@ -0,0 +1,451 @@
+import logging
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import reduce
+from operator import xor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import Integer, String, cast, func, select
+
+from connections.sql_connector import get_mysql_engine
+from etl.extract import _to_object_id, get_collection, get_file_source, plan_partitions
+from models.sql.sql_models import Order
+from utils.sql_data_access import TABLE_MAPPING
+
+logger = logging.getLogger(__name__)
+
+# Joins the key and formatted fields of a row before hashing. The key keeps
+# identical rows from cancelling out of the XOR; the separator is never data.
+SEPARATOR = "\x1f"
+
+# Pairs to compare: source collection, target table, how target rows are keyed
+# by the source `_id`, and the mapped fields as (source path, format, column).
+# Tables without a mongo_id are keyed through the order they belong to.
+RECONCILIATION_SPECS: Dict[str, Dict] = {
+    "countries": {
+        "collection": "country",
+        "table": "countries",
+        "fields": [("name", "text", "name"), ("code", "text", "code")],
+    },
+    "cities": {
+        "collection": "city",
+        "table": "cities",
+        "fields": [("name", "text", "name")],
+    },
+    "zones": {
+        "collection": "zone",
+        "table": "zones",
+        "fields": [("name", "text", "name")],
+    },
+    "receivers": {
+        "collection": "receiver",
+        "table": "receivers",
+        "fields": [
+            ("firstName", "text", "first_name"),
+            ("lastName", "text", "last_name"),
+            ("phone", "text", "phone"),
+        ],
+    },
+    "stars": {
+        "collection": "star",
+        "table": "stars",
+        "fields": [("name", "text", "name"), ("phone", "text", "phone")],
+    },
+    "pickup_addresses": {
+        "collection": "order",
+        "table": "addresses",
+        "key": "order_mongo_id",
+        "filters": {"type": "pickup"},
+        "fields": [
+            ("pickupAddress.firstLine", "text", "first_line"),
+            ("pickupAddress.secondLine", "text", "second_line"),
+            ("pickupAddress.district", "text", "district"),
+            ("pickupAddress.floor", "text", "floor"),
+            ("pickupAddress.apartment", "text", "apartment"),
+        ],
+    },
+    "dropoff_addresses": {
+        "collection": "order",
+        "table": "addresses",
+        "key": "order_mongo_id",
+        "filters": {"type": "dropoff"},
+        "fields": [
+            ("dropOffAddress.firstLine", "text", "first_line"),
+            ("dropOffAddress.secondLine", "text", "second_line"),
+            ("dropOffAddress.district", "text", "district"),
+            ("dropOffAddress.floor", "text", "floor"),
+            ("dropOffAddress.apartment", "text", "apartment"),
+        ],
+    },
+    "orders": {
+        "collection": "order",
+        "table": "orders",
+        "fields": [
+            ("orderId", "text", "order_number"),
+            ("type", "text", "type"),
+            ("createdAt", "date", "created_at"),
+        ],
+    },
+    "confirmations": {
+        "collection": "order",
+        "table": "confirmations",
+        "key": "order",
+        "fields": [
+            ("confirmation.isConfirmed", "flag", "is_confirmed"),
+            ("confirmation.numberOfSmsTrials", "count", "number_of_sms_trials"),
+        ],
+    },
+    "cod_payments": {
+        "collection": "order",
+        "table": "cod_payments",
+        "key": "order",
+        "fields": [
+            ("cod.amount", "cents", "amount"),
+            ("cod.collectedAmount", "cents", "collected_amount"),
+            ("cod.isPaidBack", "flag", "is_paid_back"),
+        ],
+    },
+    "trackers": {
+        "collection": "tracker",
+        "table": "trackers",
+        "fields": [("orderId", "text", "order_number")],
+    },
+}
+
+# The same formatting on each side, so equal values produce equal strings:
+# MongoDB aggregation expressions, SQL expressions, and Python functions for
+# documents read from mongoexport files.
+MONGO_FORMATS = {
+    "text": lambda path: {"$ifNull": [{"$toString": f"${path}"}, ""]},
+    "date": lambda path: {
+        "$ifNull": [
+            {"$dateToString": {"format": "%Y-%m-%d %H:%M:%S", "date": f"${path}"}},
+            "",
+        ]
+    },
+    "count": lambda path: {"$toString": {"$ifNull": [f"${path}", 0]}},
+    "flag": lambda path: {"$cond": [{"$eq": [f"${path}", True]}, "1", "0"]},
+    "cents": lambda path: {
+        "$ifNull": [
+            {
+                "$toString": {
+                    "$toLong": {"$round": [{"$multiply": [f"${path}", 100]}, 0]}
+                }
+            },
+            "",
+        ]
+    },
+}
+
+SQL_FORMATS = {
+    "text": lambda column: func.coalesce(cast(column, String), ""),
+    "date": lambda column: func.coalesce(
+        func.date_format(column, "%Y-%m-%d %H:%i:%s"), ""
+    ),
+    "count": lambda column: func.coalesce(cast(column, String), "0"),
+    "flag": lambda column: func.if_(column, "1", "0"),
+    "cents": lambda column: func.coalesce(
+        cast(cast(func.round(column * 100), Integer), String), ""
+    ),
+}
+
+
+def _python_text(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        # $toString drops the fraction of integral doubles
+        return str(int(value))
+    return str(value)
+
+
+PYTHON_FORMATS = {
+    "text": _python_text,
+    "date": lambda value: value.strftime("%Y-%m-%d %H:%M:%S") if value else "",
+    "count": lambda value: _python_text(0 if value is None else value),
+    "flag": lambda value: "1" if value is True else "0",
+    "cents": lambda value: "" if value is None else str(int(round(value * 100))),
+}
+
+
+def _get_path(document: Dict, path: str):
+    for part in path.split("."):
+        if not isinstance(document, dict):
+            return None
+        document = document.get(part)
+    return document
+
+
+def row_checksum(strings: Iterable[str]) -> Tuple[int, int]:
+    """Order-independent (count, XOR of CRC32) of formatted rows."""
+    count = 0
+    checksum = 0
+    for string in strings:
+        count += 1
+        checksum ^= zlib.crc32(string.encode("utf-8"))
+    return count, checksum
+
+
+class Reconciler:
+    """
+    Verifies that MySQL holds what MongoDB holds, without comparing every row.
+
+    Each collection/table pair is split into `_id` ranges. Per range, both
+    sides reduce the mapped fields of every row to one string, and the
+    range is summarised by its row count and the XOR of the strings' CRC32s,
+    an order-independent checksum. MySQL computes it with a BIT_XOR/CRC32
+    aggregate; MongoDB projects the strings in an aggregation and only
+    those are hashed client side. Mismatching ranges are split again until
+    they are small enough to compare row by row.
+    """
+
+    def __init__(
+        self,
+        engine=None,
+        range_size: int = 100000,
+        leaf_size: int = 1000,
+        split_factor: int = 16,
+        max_workers: int = 4,
+        sample_limit: int = 100,
+    ):
+        """
+        Args:
+            engine: SQLAlchemy engine (default: the MySQL target)
+            range_size: Documents per top-level range
+            leaf_size: Ranges at most this large are compared row by row
+            split_factor: Number of sub-ranges a mismatching range is split into
+            max_workers: Ranges checksummed concurrently
+            sample_limit: Keys reported per kind of difference
+        """
+        self.engine = engine or get_mysql_engine()
+        self.range_size = range_size
+        self.leaf_size = leaf_size
+        self.split_factor = split_factor
+        self.max_workers = max_workers
+        self.sample_limit = sample_limit
+
+    def _target(self, spec: Dict):
+        """Returns (key column, FROM clause, table, filter conditions) of a spec."""
+        table = TABLE_MAPPING[spec["table"]].__table__
+        conditions = [
+            table.c[name] == value for name, value in spec.get("filters", {}).items()
+        ]
+        key = spec.get("key", "mongo_id")
+        if key == "order":
+            from_clause = table.join(Order.__table__, Order.id == table.c.order_id)
+            return Order.__table__.c.mongo_id, from_clause, table, conditions
+        return table.c[key], table, table, conditions
+
+    def _target_query(self, spec: Dict, columns, lower_id, upper_id):
+        key_column, from_clause, table, conditions = self._target(spec)
+        row_string = func.concat_ws(
+            SEPARATOR,
+            key_column,
+            *[SQL_FORMATS[kind](table.c[column]) for _, kind, column in spec["fields"]],
+        )
+        if lower_id is not None:
+            conditions.append(key_column >= str(lower_id))
+        if upper_id is not None:
+            conditions.append(key_column < str(upper_id))
+        return (
+            select(*columns(key_column, row_string))
+            .select_from(from_clause)
+            .where(*conditions)
+        )
+
+    def target_checksum(
+        self, spec: Dict, lower_id=None, upper_id=None
+    ) -> Tuple[int, int]:
+        query = self._target_query(
+            spec,
+            lambda key, row: [
+                func.count(),
+                func.coalesce(func.bit_xor(func.crc32(row)), 0),
+            ],
+            lower_id,
+            upper_id,
+        )
+        with self.engine.connect() as conn:
+            count, checksum = conn.execute(query).one()
+        return int(count), int(checksum)
+
+    def target_rows(self, spec: Dict, lower_id=None, upper_id=None) -> Dict[str, int]:
+        query = self._target_query(
+            spec, lambda key, row: [key, func.crc32(row)], lower_id, upper_id
+        )
+        with self.engine.connect() as conn:
+            return {key: int(crc) for key, crc in conn.execute(query)}
+
+    def source_rows(
+        self, spec: Dict, lower_id=None, upper_id=None, keys: bool = True
+    ) -> Iterator[Tuple[str, str]]:
+        """
+        Yields (key, formatted row) of every source document in a range.
+
+        Args:
+            keys: Also return the keys; without them MongoDB sends only the
+                row strings, and the keys are None
+        """
+        lower_id = _to_object_id(lower_id)
+        upper_id = _to_object_id(upper_id)
+        file_source = get_file_source()
+        if file_source is not None:
+            for document in file_source.find(
+                spec["collection"], lower_id=lower_id, upper_id=upper_id
+            ):
+                key = str(document["_id"])
+                yield key, SEPARATOR.join(
+                    [key]
+                    + [
+                        PYTHON_FORMATS[kind](_get_path(document, path))
+                        for path, kind, _ in spec["fields"]
+                    ]
+                )
+            return
+
+        id_range = {}
+        if lower_id is not None:
+            id_range["$gte"] = lower_id
+        if upper_id is not None:
+            id_range["$lt"] = upper_id
+        parts = [{"$toString": "$_id"}]
+        for path, kind, _ in spec["fields"]:
+            parts += [SEPARATOR, MONGO_FORMATS[kind](path)]
+        pipeline = [
+            {"$match": {"_id": id_range} if id_range else {}},
+            {"$project": {"_id": 0, "s": {"$concat": parts}}},
+        ]
+        if keys:
+            pipeline[1]["$project"]["k"] = {"$toString": "$_id"}
+        cursor = get_collection(spec["collection"]).aggregate(pipeline, batchSize=10000)
+        for row in cursor:
+            yield row.get("k"), row["s"]
+
+    def source_checksum(
+        self, spec: Dict, lower_id=None, upper_id=None
+    ) -> Tuple[int, int]:
+        # The aggregation language has no CRC32, so the rows are hashed here
+        return row_checksum(
+            row for _, row in self.source_rows(spec, lower_id, upper_id, keys=False)
+        )
+
+    def _compare_rows(self, spec: Dict, lower_id, upper_id, report: Dict) -> None:
+        source = {
+            key: zlib.crc32(row.encode("utf-8"))
+            for key, row in self.source_rows(spec, lower_id, upper_id)
+        }
+        target = self.target_rows(spec, lower_id, upper_id)
+        differences = {
+            "missing_in_target": [key for key in source if key not in target],
+            "unexpected_in_target": [key for key in target if key not in source],
+            "different": [
+                key for key in source if key in target and source[key] != target[key]
+            ],
+        }
+        for kind, keys in differences.items():
+            report[f"{kind}_count"] += len(keys)
+            room = self.sample_limit - len(report[kind])
+            report[kind].extend(sorted(keys)[: max(0, room)])
+
+    def _check_range(
+        self,
+        spec: Dict,
+        lower_id,
+        upper_id,
+        report: Dict,
+        depth: int = 0,
+        checksums: Optional[Tuple[Tuple[int, int], Tuple[int, int]]] = None,
+    ):
+        """
+        Narrows a range down to its differing rows.
+
+        Args:
+            checksums: (source, target) checksums of the range when already
+                computed, so the range is not read again
+        """
+        if checksums is None:
+            checksums = (
+                self.source_checksum(spec, lower_id, upper_id),
+                self.target_checksum(spec, lower_id, upper_id),
+            )
+        source, target = checksums
+        if source == target:
+            return
+        if depth == 0:
+            report["mismatched_ranges"].append([lower_id, upper_id])
+        logger.info(
+            f"Range [{lower_id}, {upper_id}) of {spec['table']} differs: "
+            f"source {source}, target {target}"
+        )
+
+        if source[0] <= self.leaf_size or target[0] <= self.leaf_size:
+            self._compare_rows(spec, lower_id, upper_id, report)
+            return
+        size = max(self.leaf_size, source[0] // self.split_factor)
+        sub_ranges = plan_partitions(
+            spec["collection"], size, lower_id, upper_id, pending_only=False
+        )
+        if len(sub_ranges) == 1:
+            self._compare_rows(spec, lower_id, upper_id, report)
+            return
+        for sub_lower, sub_upper in sub_ranges:
+            self._check_range(spec, sub_lower, sub_upper, report, depth + 1)
+
+    def reconcile_spec(self, name: str) -> Dict:
+        """Compares one collection/table pair, returning a report."""
+        spec = RECONCILIATION_SPECS[name]
+        ranges = plan_partitions(
+            spec["collection"], self.range_size, pending_only=False
+        )
+        report = {
+            "name": name,
+            "ranges": len(ranges),
+            "mismatched_ranges": [],
+            "missing_in_target": [],
+            "missing_in_target_count": 0,
+            "unexpected_in_target": [],
+            "unexpected_in_target_count": 0,
+            "different": [],
+            "different_count": 0,
+        }
+        # The ranges cover every key, so their checksums also give the totals
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            checksums = list(
+                executor.map(
+                    lambda bounds: (
+                        bounds,
+                        self.source_checksum(spec, *bounds),
+                        self.target_checksum(spec, *bounds),
+                    ),
+                    ranges,
+                )
+            )
+        report["source_rows"] = sum(source[0] for _, source, _ in checksums)
+        report["target_rows"] = sum(target[0] for _, _, target in checksums)
+        for (lower_id, upper_id), source, target in checksums:
+            if source != target:
+                self._check_range(
+                    spec, lower_id, upper_id, report, checksums=(source, target)
+                )
+        report["ok"] = not report["mismatched_ranges"]
+        return report
+
+    def reconcile(self, names: Optional[List[str]] = None) -> Dict[str, Dict]:
+        """
+        Compares every requested pair (default: all of RECONCILIATION_SPECS).
+
+        Returns:
+            Dictionary mapping each pair name to its report
+        """
+        reports = {}
+        for name in names or RECONCILIATION_SPECS:
+            started = datetime.now()
+            reports[name] = self.reconcile_spec(name)
+            reports[name]["seconds"] = (datetime.now() - started).total_seconds()
+            status = "matches" if reports[name]["ok"] else "DIFFERS"
+            logger.info(
+                f"{name} {status}: {reports[name]['source_rows']} source rows, "
+                f"{reports[name]['target_rows']} target rows"
+            )
+        return reports
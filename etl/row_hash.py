@@ -0,0 +1,87 @@
+import hashlib
+import math
+from typing import Any, Dict, List, Type
+
+from sqlalchemy import select
+
+# Columns that identify a row or carry the hash itself, never part of the content
+EXCLUDED_COLUMNS = {"id", "row_hash"}
+
+
+def _is_missing(value: Any) -> bool:
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+def _canonical(value: Any) -> str:
+    """Renders a value the same way regardless of the Python type it arrived as."""
+    if _is_missing(value):
+        return "\x00"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if hasattr(value, "isoformat"):
+        return value.isoformat(sep=" ")
+    return str(value)
+
+
+def hashed_columns(model: Type) -> List[str]:
+    """Returns the model columns that make up a row's content hash."""
+    return [
+        col.name for col in model.__table__.columns if col.name not in EXCLUDED_COLUMNS
+    ]
+
+
+def compute_row_hash(record: Dict[str, Any], columns: List[str]) -> str:
+    """Computes an MD5 content hash over the given columns of a record."""
+    payload = "\x1f".join(_canonical(record.get(col)) for col in columns)
+    return hashlib.md5(payload.encode("utf-8")).hexdigest()
+
+
+def add_row_hashes(model: Type, records: List[Dict[str, Any]]) -> None:
+    """Stores the content hash of each record in its `row_hash` field."""
+    columns = [col for col in hashed_columns(model) if col in records[0]]
+    for record in records:
+        record["row_hash"] = compute_row_hash(record, columns)
+
+
+def record_key_column(model: Type, records: List[Dict[str, Any]]) -> str:
+    """Picks the column used to match records against stored rows."""
+    if "id" in records[0]:
+        return "id"
+    if "mongo_id" in model.__table__.columns.keys() and "mongo_id" in records[0]:
+        return "mongo_id"
+    return None
+
+
+def filter_changed_records(
+    conn, model: Type, records: List[Dict[str, Any]]
+) -> List[Dict[str, Any]]:
+    """
+    Drops records whose content hash matches the row already stored in MySQL.
+
+    Args:
+        conn: Open SQLAlchemy connection
+        model: SQLAlchemy model class
+        records: Records carrying a `row_hash` field
+
+    Returns:
+        Records that are new or differ from their stored version
+    """
+    key_column = record_key_column(model, records)
+    if key_column is None:
+        return records
+
+    keys = [
+        record[key_column] for record in records if not _is_missing(record[key_column])
+    ]
+    if not keys:
+        return records
+
+    key = getattr(model, key_column)
+    stored = dict(
+        conn.execute(select(key, model.row_hash).where(key.in_(keys))).fetchall()
+    )
+    return [
+        record
+        for record in records
+        if stored.get(record[key_column]) != record["row_hash"]
+    ]
@@ -0,0 +1,207 @@
+import logging
+import threading
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, List
+
+from etl.extract import estimate_document_count, extract_data
+from etl.table_graph import (
+    TABLE_STEPS,
+    build_dependency_graph,
+    build_dependents,
+    resolve_steps,
+)
+from utils.memory import SpillableList
+from utils.metrics import TABLE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class SchedulerError(Exception):
+    """Custom exception for tables that failed or were skipped during a run"""
+
+    pass
+
+
+class TableScheduler:
+    """
+    Runs table loads as soon as the tables they reference have committed.
+
+    Dependencies come from the ForeignKeys in the SQL models, so for example
+    addresses start once zones, cities and countries are loaded, without
+    waiting for receivers. Among the tables that are ready, the one heading
+    the largest remaining chain of work starts first.
+    """
+
+    def __init__(
+        self,
+        process_func: Callable,
+        tables: Iterable[str] = None,
+        max_workers: int = 3,
+        work_estimates: Dict[str, int] = None,
+    ):
+        """
+        Args:
+            process_func: Callable with the `process_collection` signature
+            tables: Tables to load (default: every table in TABLE_STEPS)
+            max_workers: Maximum number of tables loaded concurrently
+            work_estimates: Relative size of each table's work
+                (default: estimated size of its source collection)
+        """
+        self.process_func = process_func
+        self.graph = build_dependency_graph(tables)
+        self.dependents = build_dependents(self.graph)
+        self.max_workers = max_workers
+        self.work_estimates = work_estimates
+
+        # Collections read by several steps are extracted once per run
+        self._consumers = Counter(
+            collection
+            for table in self.graph
+            for collection, _, _ in TABLE_STEPS[table]
+        )
+        # Future of each shared collection's SpillableList, set once extracted
+        self._shared_data: Dict[str, Future] = {}
+        self._data_lock = threading.Lock()
+
+    def _estimate_work(self) -> Dict[str, int]:
+        if self.work_estimates is not None:
+            return self.work_estimates
+
+        estimates = {}
+        for table in self.graph:
+            collection = TABLE_STEPS[table][0][0]
+            try:
+                size = estimate_document_count(collection)
+            except Exception as e:
+                logger.warning(f"Could not estimate size of {collection}: {e}")
+                size = 1
+            estimates[table] = size * len(TABLE_STEPS[table])
+        return estimates
+
+    def _priorities(self) -> Dict[str, int]:
+        """Ranks each table by its own work plus the heaviest chain depending on it."""
+        work = self._estimate_work()
+        priorities = {}
+
+        def rank(table):
+            if table not in priorities:
+                priorities[table] = work.get(table, 1) + max(
+                    (rank(child) for child in self.dependents[table]), default=0
+                )
+            return priorities[table]
+
+        for table in self.graph:
+            rank(table)
+        return priorities
+
+    def _acquire_data(self, collection: str):
+        """Returns shared extracted batches for a collection, or None to stream it."""
+        with self._data_lock:
+            if self._consumers[collection] <= 1:
+                return None
+            shared = self._shared_data.get(collection)
+            extracting = shared is None
+            if extracting:
+                shared = self._shared_data[collection] = Future()
+
+        # Extracted outside the lock, so other tables are not held up; later
+        # consumers of the collection wait for the first one
+        if extracting:
+            try:
+                # Every consumer iterates the batches; those extracted while
+                # the memory budget is exceeded are kept on disk
+                shared.set_result(SpillableList(extract_data(collection)))
+            except BaseException as e:
+                with self._data_lock:
+                    # The next consumer retries the extraction
+                    self._shared_data.pop(collection, None)
+                shared.set_exception(e)
+        return shared.result()
+
+    def _release_data(self, collection: str) -> None:
+        with self._data_lock:
+            self._consumers[collection] -= 1
+            if self._consumers[collection] > 0:
+                return
+            shared = self._shared_data.pop(collection, None)
+        if shared is not None and shared.done() and shared.exception() is None:
+            shared.result().close()
+
+    def _run_table(self, table: str) -> None:
+        start_time = time.perf_counter()
+        steps = resolve_steps(table)
+        for position, (collection, transform_func, load_func) in enumerate(steps):
+            try:
+                self.process_func(
+                    collection,
+                    transform_func,
+                    load_func,
+                    self._acquire_data(collection),
+                )
+            except Exception:
+                for remaining_collection, _, _ in steps[position + 1 :]:
+                    self._release_data(remaining_collection)
+                raise
+            finally:
+                self._release_data(collection)
+        TABLE_SECONDS.set(time.perf_counter() - start_time, table=table)
+
+    def _skip_descendants(self, table: str, skipped: set) -> List[str]:
+        """Marks every table depending on `table` as skipped, returning new ones."""
+        newly_skipped = []
+        for child in self.dependents[table]:
+            if child not in skipped:
+                skipped.add(child)
+                newly_skipped.append(child)
+                newly_skipped.extend(self._skip_descendants(child, skipped))
+        return newly_skipped
+
+    def run(self) -> None:
+        """
+        Loads every table, respecting the dependency graph.
+
+        Raises:
+            SchedulerError: If any table failed; its dependents are skipped
+        """
+        priorities = self._priorities()
+        waiting = {table: set(parents) for table, parents in self.graph.items()}
+        ready = [table for table, parents in waiting.items() if not parents]
+        running = {}
+        failed: Dict[str, Exception] = {}
+        skipped = set()
+
+        logger.info(f"Scheduling {len(self.graph)} tables with priorities {priorities}")
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while ready or running:
+                ready.sort(key=lambda table: priorities[table])
+                while ready and len(running) < self.max_workers:
+                    table = ready.pop()
+                    logger.info(f"Starting table {table}")
+                    running[executor.submit(self._run_table, table)] = table
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    table = running.pop(future)
+                    try:
+                        future.result()
+                        logger.info(f"Completed table {table}")
+                    except Exception as e:
+                        logger.error(f"Table {table} failed: {e}")
+                        failed[table] = e
+                        for child in self._skip_descendants(table, skipped):
+                            # Skipped tables never run, so their data is not needed
+                            for collection, _, _ in TABLE_STEPS[child]:
+                                self._release_data(collection)
+                        continue
+
+                    for child in self.dependents[table]:
+                        waiting[child].discard(table)
+                        if not waiting[child] and child not in skipped:
+                            ready.append(child)
+
+        if failed:
+            raise SchedulerError(
+                f"Tables failed: {sorted(failed)}; skipped dependents: {sorted(skipped)}"
+            )
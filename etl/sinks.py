@@ -0,0 +1,328 @@
+import atexit
+import csv
+import logging
+import os
+import re
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple, Type
+
+import pandas as pd
+
+from config.settings import OUTPUT_DIR, SINK_CONFIG
+
+logger = logging.getLogger(__name__)
+
+SINK_FORMAT = SINK_CONFIG.get("format", "csv")
+# Files are closed and published once they hold this many rows
+ROWS_PER_FILE = SINK_CONFIG.get("rows_per_file", 1000000)
+ID_MAP_FILE = "_ids.json"
+# Columns only MySQL uses, for change detection and incremental exports
+INTERNAL_COLUMNS = {"row_hash", "loaded_at"}
+POINT_WKT = re.compile(r"^POINT\(\s*(\S+)\s+(\S+)\s*\)$")
+
+
+class SinkError(Exception):
+    """Custom exception for sink failures"""
+
+    pass
+
+
+class Sink(ABC):
+    """Destination of transformed table batches."""
+
+    @abstractmethod
+    def write(self, df: pd.DataFrame, model: Type) -> None:
+        """
+        Writes a transformed batch of a table.
+
+        Args:
+            df: Transformed rows, with ids already assigned
+            model: SQLAlchemy model of the table
+        """
+
+    def close(self) -> None:
+        """Flushes whatever the sink buffers; the sink is unusable afterwards."""
+        pass
+
+
+class MySQLSink(Sink):
+    """Upserts batches into MySQL through the `DataLoader`."""
+
+    def __init__(self):
+        # etl.load imports this module
+        from etl.load import DataLoader
+
+        self.loader = DataLoader()
+
+    def write(self, df: pd.DataFrame, model: Type) -> None:
+        self.loader.bulk_upsert(df, model)
+
+
+def _lon_lat_wkt(value):
+    """Turns the latitude-first WKT written for MySQL back into standard WKT."""
+    match = POINT_WKT.match(value) if isinstance(value, str) else None
+    return f"POINT({match.group(2)} {match.group(1)})" if match else value
+
+
+class _TableFile:
+    """One output file being written, published under its final name on close."""
+
+    def __init__(self, path: str, columns: List[str], file_format: str, model: Type):
+        directory, name = os.path.split(path)
+        self.path = path
+        # Hidden until complete, so readers never see a partial file
+        self.temp_path = os.path.join(directory, f".{name}.inprogress")
+        self.rows = 0
+        self.file_format = file_format
+        if file_format == "parquet":
+            import pyarrow.parquet as pq
+
+            self.schema = _parquet_schema(model, columns)
+            self.writer = pq.ParquetWriter(
+                self.temp_path, self.schema, compression="zstd"
+            )
+        else:
+            self.handle = open(self.temp_path, "w", newline="")
+            csv.writer(self.handle, quoting=csv.QUOTE_ALL).writerow(columns)
+
+    def write(self, frame: pd.DataFrame) -> None:
+        if self.file_format == "parquet":
+            import pyarrow as pa
+
+            arrays = []
+            for field in self.schema:
+                values = frame[field.name]
+                if pa.types.is_decimal(field.type):
+                    # Floats are rounded to the column's scale, as MySQL does
+                    exponent = Decimal(1).scaleb(-field.type.scale)
+                    values = [
+                        (
+                            None
+                            if pd.isna(value)
+                            else Decimal(str(value)).quantize(exponent)
+                        )
+                        for value in values
+                    ]
+                    arrays.append(pa.array(values, type=field.type))
+                else:
+                    arrays.append(pa.array(values, from_pandas=True).cast(field.type))
+            self.writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+        else:
+            frame.to_csv(self.handle, header=False, index=False, quoting=csv.QUOTE_ALL)
+        self.rows += len(frame)
+
+    def close(self) -> None:
+        if self.file_format == "parquet":
+            self.writer.close()
+        else:
+            self.handle.close()
+        os.replace(self.temp_path, self.path)
+
+
+def _parquet_schema(model: Type, columns: List[str]):
+    import pyarrow as pa
+
+    from etl.export import arrow_type
+
+    types = {column.name: column for column in model.__table__.columns}
+    return pa.schema(
+        [
+            pa.field(
+                name,
+                # Points are written as WKT text
+                (pa.string() if name == "geo_location" else arrow_type(types[name])),
+            )
+            for name in columns
+        ]
+    )
+
+
+class FileSink(Sink):
+    """
+    Writes each table's batches to CSV or Parquet files instead of MySQL.
+
+    Every loading thread writes its own file per table, so load workers
+    never wait on each other. Files are written under a hidden name and
+    renamed into `<output_dir>/<table>/` once they reach `rows_per_file`
+    rows or the sink closes, so complete files appear atomically.
+
+    Foreign keys come from the `LocalIdAllocator`, whose id map is saved
+    next to the files before any of them is published, and loaded again by
+    the next run, so later runs (or runs of single tables) resolve the ids
+    of earlier ones. Ids are allocated in this process only, so the sink
+    cannot be shared by several processes (see `check_multi_process`).
+    """
+
+    def __init__(
+        self,
+        output_dir: str,
+        file_format: str = SINK_FORMAT,
+        rows_per_file: int = ROWS_PER_FILE,
+    ):
+        """
+        Args:
+            output_dir: Directory the table directories are written to
+            file_format: "csv" or "parquet"
+            rows_per_file: Rows after which a file is published and a new one started
+        """
+        if file_format not in ("csv", "parquet"):
+            raise SinkError(f"Unsupported file format: {file_format}")
+        self.output_dir = output_dir
+        self.file_format = file_format
+        self.rows_per_file = rows_per_file
+        self.run_id = (
+            f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')}-{os.getpid()}"
+        )
+        self._files: Dict[Tuple[str, int], _TableFile] = {}
+        self._sequence: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._ids_lock = threading.Lock()
+        self._closed = False
+        os.makedirs(output_dir, exist_ok=True)
+
+    @property
+    def id_map_path(self) -> str:
+        return os.path.join(self.output_dir, ID_MAP_FILE)
+
+    @staticmethod
+    def columns(model: Type) -> List[str]:
+        return [
+            column.name
+            for column in model.__table__.columns
+            if column.name not in INTERNAL_COLUMNS
+        ]
+
+    def _frame(self, df: pd.DataFrame, model: Type) -> pd.DataFrame:
+        """Orders a batch by the model's columns, with nullable integer types."""
+        frame = df.reindex(columns=self.columns(model))
+        for column in model.__table__.columns:
+            if column.name not in frame.columns:
+                continue
+            try:
+                python_type = column.type.python_type
+            except NotImplementedError:
+                python_type = None
+            if python_type is bool:
+                frame[column.name] = frame[column.name].astype("boolean")
+            elif python_type is int:
+                frame[column.name] = pd.to_numeric(frame[column.name]).astype("Int64")
+        if "geo_location" in frame.columns:
+            frame["geo_location"] = frame["geo_location"].map(_lon_lat_wkt)
+        return frame
+
+    def _save_ids(self) -> None:
+        """Saves the id map, so no published file references ids it lacks."""
+        from utils.id_allocator import LocalIdAllocator, get_id_allocator
+
+        allocator = get_id_allocator()
+        if isinstance(allocator, LocalIdAllocator):
+            with self._ids_lock:
+                allocator.save(self.id_map_path)
+
+    def _open(self, table_name: str, model: Type) -> _TableFile:
+        sequence = self._sequence.get(table_name, 0)
+        self._sequence[table_name] = sequence + 1
+        directory = os.path.join(self.output_dir, table_name)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(
+            directory, f"part-{self.run_id}-{sequence:05d}.{self.file_format}"
+        )
+        return _TableFile(path, self.columns(model), self.file_format, model)
+
+    def write(self, df: pd.DataFrame, model: Type) -> None:
+        table_name = model.__tablename__
+        frame = self._frame(df, model)
+        key = (table_name, threading.get_ident())
+        position = 0
+        while position < len(frame):
+            with self._lock:
+                if self._closed:
+                    raise SinkError("File sink is closed")
+                table_file = self._files.get(key)
+                if table_file is None:
+                    table_file = self._files[key] = self._open(table_name, model)
+
+            # Only this thread writes to its file
+            room = self.rows_per_file - table_file.rows
+            table_file.write(frame.iloc[position : position + room])
+            position += room
+            if table_file.rows >= self.rows_per_file:
+                with self._lock:
+                    del self._files[key]
+                self._save_ids()
+                table_file.close()
+        logger.debug(f"Wrote {len(frame)} {table_name} rows")
+
+    def close(self) -> None:
+        """Saves the id map and publishes every open file."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            files, self._files = list(self._files.values()), {}
+        self._save_ids()
+        for table_file in files:
+            table_file.close()
+        logger.info(f"Closed file sink at {self.output_dir}")
+
+
+def check_multi_process(sink: Sink) -> None:
+    """
+    Rejects sinks that several processes of one run cannot share.
+
+    A file sink allocates ids and keeps their map in its own process, so
+    coordinated workers or Airflow mapped tasks writing to it would hand
+    out the same ids and overwrite each other's `_ids.json`.
+
+    Raises:
+        SinkError: If the sink is a file sink
+    """
+    if isinstance(sink, FileSink):
+        raise SinkError(
+            "The file sink (ETL_OUTPUT_DIR) only supports single-process runs; "
+            "use `python -m etl run --role local`, or unset ETL_OUTPUT_DIR to load MySQL"
+        )
+
+
+def create_sink(output_dir: Optional[str] = OUTPUT_DIR) -> Sink:
+    """
+    Creates the sink for this run: files when `output_dir` is set, else MySQL.
+
+    A file sink installs a `LocalIdAllocator`, restoring the id map of
+    earlier runs into the same directory, so nothing queries MySQL.
+    """
+    if not output_dir:
+        return MySQLSink()
+    from utils.id_allocator import LocalIdAllocator, set_id_allocator
+
+    sink = FileSink(output_dir)
+    allocator = LocalIdAllocator()
+    if os.path.exists(sink.id_map_path):
+        allocator.load(sink.id_map_path)
+    set_id_allocator(allocator)
+    atexit.register(sink.close)
+    logger.info(f"Writing {sink.file_format} files to {output_dir} instead of MySQL")
+    return sink
+
+
+_sink: Optional[Sink] = None
+_sink_lock = threading.Lock()
+
+
+def get_sink() -> Sink:
+    """Returns the process-wide sink, creating it on first use."""
+    global _sink
+    with _sink_lock:
+        if _sink is None:
+            _sink = create_sink()
+        return _sink
+
+
+def set_sink(sink: Optional[Sink]) -> None:
+    """Replaces the process-wide sink (None: create it again on next use)."""
+    global _sink
+    with _sink_lock:
+        _sink = sink
@@ -0,0 +1,99 @@
+from typing import Callable, Dict, Iterable, List, Set, Tuple
+
+# Steps that fill each table: (source collection, transform function, load function).
+# Functions are referenced by name so the graph can be built without importing
+# the ETL modules, e.g. while Airflow parses the DAG file.
+TABLE_STEPS: Dict[str, List[Tuple[str, str, str]]] = {
+    "stars": [("star", "transform_star_data", "load_star_data")],
+    "countries": [("country", "transform_country_data", "load_country_data")],
+    "cities": [("city", "transform_city_data", "load_city_data")],
+    "zones": [("zone", "transform_zone_data", "load_zone_data")],
+    "receivers": [("receiver", "transform_receiver_data", "load_receiver_data")],
+    "addresses": [
+        ("order", "transform_pickup_address_data", "load_address_data"),
+        ("order", "transform_dropoff_address_data", "load_address_data"),
+    ],
+    "orders": [("order", "transform_order_data", "load_order_data")],
+    "confirmations": [
+        ("order", "transform_confirmation_data", "load_confirmation_data")
+    ],
+    "cod_payments": [("order", "transform_cod_payment_data", "load_codpayment_data")],
+    "trackers": [("tracker", "transform_tracker_data", "load_tracker_data")],
+}
+
+
+def resolve_steps(table: str) -> List[Tuple[str, Callable, Callable]]:
+    """Imports the transform and load functions of a table's steps."""
+    import etl.load as load_module
+    import etl.transform as transform_module
+
+    return [
+        (
+            collection,
+            getattr(transform_module, transform_name),
+            getattr(load_module, load_name),
+        )
+        for collection, transform_name, load_name in TABLE_STEPS[table]
+    ]
+
+
+# Tables each table references through the ForeignKeys of the SQL models,
+# parents first. Declared rather than read from the models so the graph is
+# available without importing SQLAlchemy; scripts/check_import_time.py
+# verifies it against `model_references()`.
+TABLE_REFERENCES: Dict[str, Set[str]] = {
+    "stars": set(),
+    "countries": set(),
+    "cities": set(),
+    "zones": set(),
+    "receivers": set(),
+    "addresses": {"cities", "countries", "zones"},
+    "orders": {"addresses", "receivers", "stars"},
+    "confirmations": {"orders"},
+    "cod_payments": {"orders"},
+    "trackers": {"orders"},
+}
+
+
+def model_references() -> Dict[str, Set[str]]:
+    """Derives the references of every TABLE_STEPS table from the model ForeignKeys."""
+    from models.sql.sql_models import Base
+
+    return {
+        table.name: {
+            fk.column.table.name
+            for fk in table.foreign_keys
+            if fk.column.table.name in TABLE_STEPS
+            and fk.column.table.name != table.name
+        }
+        for table in Base.metadata.sorted_tables
+        if table.name in TABLE_STEPS
+    }
+
+
+def build_dependency_graph(tables: Iterable[str] = None) -> Dict[str, Set[str]]:
+    """
+    Builds table dependencies from TABLE_REFERENCES.
+
+    Args:
+        tables: Tables to include (default: every table in TABLE_STEPS).
+            Parents outside this set are assumed to be loaded already.
+
+    Returns:
+        Dictionary mapping each table to the set of tables it references
+    """
+    tables = set(tables or TABLE_STEPS)
+    return {
+        table: {parent for parent in parents if parent in tables}
+        for table, parents in TABLE_REFERENCES.items()
+        if table in tables
+    }
+
+
+def build_dependents(graph: Dict[str, Set[str]]) -> Dict[str, Set[str]]:
+    """Inverts a dependency graph into a mapping of table -> tables waiting on it."""
+    dependents = {table: set() for table in graph}
+    for table, parents in graph.items():
+        for parent in parents:
+            dependents[parent].add(table)
+    return dependents
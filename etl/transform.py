@@ -1,9 +1,5 @@
 import pandas as pd
-from utils.sql_data_access import (
-    get_ids_by_mongo_ids,
-    get_address_id_and_type_by_mongo_ids,
-    write_query_to_read,
-)
+from utils.id_allocator import get_id_allocator, id_key
 
 
 def convert_id_columns_to_string(df):
@@ -19,18 +15,43 @@ def convert_id_columns_to_string(df):
     return df.astype({col: str for col in df.columns if "_id" in col.lower()})
 
 
+def assign_ids(
+    df, table_name, key_column="mongo_id", value_name="mongo_id", filters=None
+):
+    """
+    Fills the `id` column with ids reserved by the id allocator.
+
+    Rows that already exist in MySQL keep their stored id, new rows get a
+    freshly allocated one, so child tables can reference them before load.
+    """
+    id_mapping = get_id_allocator().assign(
+        table_name, df[key_column].tolist(), value_name, filters
+    )
+    df["id"] = df[key_column].map(lambda value: id_mapping.get(id_key(value)))
+    return df
+
+
+def lookup_ids(df, key_column, table_name, value_name="mongo_id", filters=None):
+    """Maps a column of referenced keys to the ids known to the id allocator."""
+    id_mapping = get_id_allocator().lookup(
+        table_name, df[key_column].tolist(), value_name, filters
+    )
+    return df[key_column].map(lambda value: id_mapping.get(id_key(value)))
+
+
 def transform_common_datatypes(df):
 
     if "mongo_id" in df.columns:
         df["mongo_id"] = df["mongo_id"].astype(str)
-    if "createdAt" in df.columns:
-        df["created_at"] = pd.to_datetime(df["createdAt"]).dt.strftime(
-            "%Y-%m-%d %H:%M:%S"
-        )
-    if "updatedAt" in df.columns:
-        df["updated_at"] = pd.to_datetime(df["updatedAt"]).dt.strftime(
-            "%Y-%m-%d %H:%M:%S"
-        )
+    # Timestamps are stored to the second, whether or not a transform already
+    # renamed them; MySQL would round the milliseconds instead of dropping them
+    for source, column in (("createdAt", "created_at"), ("updatedAt", "updated_at")):
+        if source in df.columns:
+            df[column] = df[source]
+        if column in df.columns:
+            df[column] = pd.to_datetime(df[column], errors="coerce").dt.strftime(
+                "%Y-%m-%d %H:%M:%S"
+            )
     df.rename(
         columns={
             "firstName": "first_name",
@@ -58,6 +79,7 @@ def transform_zone_data(zoneCollection):
         inplace=True,
     )
     df = convert_id_columns_to_string(df)
+    df = assign_ids(df, "zones")
     return transform_common_datatypes(df)
 
 
@@ -72,6 +94,7 @@ def transform_city_data(cityCollection):
         inplace=True,
     )
     df = convert_id_columns_to_string(df)
+    df = assign_ids(df, "cities")
     return transform_common_datatypes(df)
 
 
@@ -86,6 +109,7 @@ def transform_country_data(countryCollection):
         inplace=True,
     )
     df = convert_id_columns_to_string(df)
+    df = assign_ids(df, "countries")
 
     return transform_common_datatypes(df)
 
@@ -141,26 +165,31 @@ def transform_address_data(orderCollection, address_type):
     # Convert IDs to strings if they exist
 
     if "zone_mongo_id" in df.columns:
-        zone_id_mapping = get_ids_by_mongo_ids("zones", list(df["zone_mongo_id"]))
-        df["zone_id"] = df["zone_mongo_id"].map(zone_id_mapping)
+        df["zone_id"] = lookup_ids(df, "zone_mongo_id", "zones")
 
     if "city_mongo_id" in df.columns:
-        city_id_mapping = get_ids_by_mongo_ids("cities", list(df["city_mongo_id"]))
-        df["city_id"] = df["city_mongo_id"].map(city_id_mapping)
+        df["city_id"] = lookup_ids(df, "city_mongo_id", "cities")
 
     if "country_mongo_id" in df.columns:
-        country_id_mapping = get_ids_by_mongo_ids(
-            "countries", list(df["country_mongo_id"])
-        )
-        df["country_id"] = df["country_mongo_id"].map(country_id_mapping)
+        df["country_id"] = lookup_ids(df, "country_mongo_id", "countries")
 
     if "geo_location" in df.columns:
+        # Sources store [longitude, latitude]; MySQL reads SRID 4326 WKT
+        # latitude first
         df["geo_location"] = df["geo_location"].apply(
-            lambda x: f"POINT({x[0]} {x[1]})" if isinstance(x, list) else None
+            lambda x: f"POINT({x[1]} {x[0]})" if isinstance(x, list) else None
         )
     df["type"] = "pickup" if "pickup" == address_type else "dropoff"
+    df = assign_ids(
+        df,
+        "addresses",
+        key_column="order_mongo_id",
+        value_name="order_mongo_id",
+        filters={"type": "pickup" if "pickup" == address_type else "dropoff"},
+    )
     # Select the relevant columns
     selected_columns = [
+        "id",
         "order_mongo_id",
         "first_line",
         "second_line",
@@ -205,6 +234,7 @@ def transform_receiver_data(receiverCollection):
         inplace=True,
     )
     df = convert_id_columns_to_string(df)
+    df = assign_ids(df, "receivers")
     return transform_common_datatypes(df)
 
 
@@ -219,6 +249,7 @@ def transform_star_data(starCollection):
         inplace=True,
     )
     df = convert_id_columns_to_string(df)
+    df = assign_ids(df, "stars")
 
     return transform_common_datatypes(df)
 
@@ -235,13 +266,8 @@ def transform_tracker_data(trackerCollection):
         inplace=True,
     )
     df = convert_id_columns_to_string(df)
-    query = f"""
-    select order_number, id from orders where order_number in 
-    ({','.join(map(str, df['order_number'].tolist()))})"""
-    order_id_mapping = write_query_to_read(query)
-    order_id_mapping = {order[0]: order[1] for order in order_id_mapping}
-
-    df["order_id"] = df["order_number"].map(order_id_mapping)
+    df = assign_ids(df, "trackers")
+    df["order_id"] = lookup_ids(df, "order_number", "orders", value_name="order_number")
     return transform_common_datatypes(df)
 
 
@@ -263,8 +289,8 @@ def transform_cod_payment_data(orderCollection):
         )
     df = pd.DataFrame(cod_data)
     df = convert_id_columns_to_string(df)
-    order_id_mapping = get_ids_by_mongo_ids("orders", list(df["mongo_id"]))
-    df["order_id"] = df["mongo_id"].map(order_id_mapping)
+    df["order_id"] = lookup_ids(df, "mongo_id", "orders")
+    df = assign_ids(df, "cod_payments", key_column="order_id", value_name="order_id")
 
     return transform_common_datatypes(df)
 
@@ -286,8 +312,8 @@ def transform_confirmation_data(orderCollection):
 
     df = pd.DataFrame(confirmation_data)
     df = convert_id_columns_to_string(df)
-    order_id_mapping = get_ids_by_mongo_ids("orders", list(df["order_mongo_id"]))
-    df["order_id"] = df["order_mongo_id"].map(order_id_mapping)
+    df["order_id"] = lookup_ids(df, "order_mongo_id", "orders")
+    df = assign_ids(df, "confirmations", key_column="order_id", value_name="order_id")
     return transform_common_datatypes(df)
 
 
@@ -307,36 +333,27 @@ def transform_order_data(orderCollection):
         }
     )
     df = convert_id_columns_to_string(df)
-    address_id_mapping = get_address_id_and_type_by_mongo_ids(list(df["mongo_id"]))
-    # Initialize the pickup and dropoff mappings
-    pickup_address_id_mapping = {}
-    dropoff_address_id_mapping = {}
-
-    # Populate the mappings based on the type
-    for address_id, address_data in address_id_mapping.items():
-        for id_num, address_type in address_data:
-            if address_type == "pickup":
-                pickup_address_id_mapping[address_id] = id_num
-            elif address_type == "dropoff":
-                dropoff_address_id_mapping[address_id] = id_num
-            else:
-                print("Unknown address type:", address_type)
-
-    receiver_id_mapping = get_ids_by_mongo_ids(
-        "receivers", list(df["receiver_mongo_id"])
+    df = assign_ids(df, "orders")
+    # Trackers reference orders by their number, so register it as an alternate key
+    get_id_allocator().remember(
+        "orders", dict(zip(df["order_number"], df["id"])), value_name="order_number"
     )
 
-    star_id_mapping = get_ids_by_mongo_ids("stars", list(df["star_mongo_id"]))
-
-    df["dropoff_address_id"] = df["mongo_id"].map(dropoff_address_id_mapping)
-    df["pickup_address_id"] = df["mongo_id"].map(pickup_address_id_mapping)
+    # Addresses are assigned ids per (order_mongo_id, type) when they are transformed
+    df["pickup_address_id"] = lookup_ids(
+        df, "mongo_id", "addresses", "order_mongo_id", {"type": "pickup"}
+    )
+    df["dropoff_address_id"] = lookup_ids(
+        df, "mongo_id", "addresses", "order_mongo_id", {"type": "dropoff"}
+    )
 
-    df["receiver_id"] = df["receiver_mongo_id"].map(receiver_id_mapping)
-    df["star_id"] = df["star_mongo_id"].map(star_id_mapping)
+    df["receiver_id"] = lookup_ids(df, "receiver_mongo_id", "receivers")
+    df["star_id"] = lookup_ids(df, "star_mongo_id", "stars")
 
     # Select relevant columns for the SQL model
     df = df[
         [
+            "id",
             "mongo_id",
             "order_number",
             "type",
@@ -0,0 +1,197 @@
+import logging
+import threading
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from bson import DBRef, Int64, ObjectId
+
+from config.settings import VALIDATION_CONFIG
+from etl.dead_letter import get_dead_letter_sink
+from utils.metrics import INVALID_DOCUMENTS
+
+logger = logging.getLogger(__name__)
+
+VALIDATION_ENABLED = VALIDATION_CONFIG.get("enabled", True)
+
+# Python types pymongo decodes each mongoengine field type to, matched
+# exactly (`type(value) in types`), which is cheaper than isinstance and
+# keeps booleans out of number fields
+FIELD_TYPES = {
+    "StringField": (str,),
+    "FloatField": (float, int, Int64),
+    "IntField": (int, Int64),
+    "BooleanField": (bool,),
+    "DateTimeField": (datetime,),
+    "ObjectIdField": (ObjectId,),
+    "ReferenceField": (ObjectId, DBRef),
+    "ListField": (list,),
+    "EmbeddedDocumentField": (dict,),
+}
+
+# Returns None for a valid value, else what is wrong with it
+Check = Callable[[object], Optional[str]]
+
+
+class DocumentValidationError(Exception):
+    """Custom exception for source documents that do not match their model"""
+
+    pass
+
+
+def _compile_field(field) -> Tuple[Tuple[type, ...], Optional[Check]]:
+    """Returns the accepted types of a field's values, and a check of their content."""
+    field_type = type(field).__name__
+    types = FIELD_TYPES.get(field_type)
+    check = None
+
+    if field_type == "EmbeddedDocumentField":
+        check = compile_validator(field.document_type)
+    elif field_type == "ListField" and field.field is not None:
+        item_types, item_check = _compile_field(field.field)
+
+        def check(values):
+            for position, value in enumerate(values):
+                if value is None:
+                    continue
+                if item_types and type(value) not in item_types:
+                    return f"[{position}] is a {type(value).__name__}"
+                if item_check is not None:
+                    problem = item_check(value)
+                    if problem:
+                        return f"[{position}]{problem}"
+            return None
+
+    if field.choices:
+        choices = frozenset(
+            choice[0] if isinstance(choice, (list, tuple)) else choice
+            for choice in field.choices
+        )
+        content_check = check
+
+        def check(value):
+            if value not in choices:
+                return f" is {value!r}, not one of {sorted(choices)}"
+            return content_check(value) if content_check else None
+
+    return types, check
+
+
+def compile_validator(model) -> Check:
+    """
+    Compiles a mongoengine document class into a check of raw pymongo dicts.
+
+    Every field becomes a (key, required, types, check) entry, so checking
+    a document is one dictionary lookup and one type lookup per field,
+    without building model instances. Required fields without a default
+    must be present and not None (lists also not empty, as in mongoengine);
+    other fields with a default may be missing, since mongoengine would
+    fill them in. Keys the model does not define are ignored.
+
+    Returns:
+        Function returning None for a valid document, or its first problem
+    """
+    fields = []
+    for field in model._fields.values():
+        types, check = _compile_field(field)
+        # mongoengine fills a missing list with an empty one, which still
+        # fails a required field
+        required = field.required and (
+            field.default is None or type(field).__name__ == "ListField"
+        )
+        fields.append((field.db_field, required, types, check))
+    fields = tuple(fields)
+
+    def validate(document):
+        for key, required, types, check in fields:
+            value = document.get(key)
+            if value is None or (required and value == []):
+                if required:
+                    return f".{key} is required"
+                continue
+            if types and type(value) not in types:
+                return f".{key} is a {type(value).__name__}"
+            if check is not None:
+                problem = check(value)
+                if problem:
+                    return f".{key}{problem}"
+        return None
+
+    return validate
+
+
+class DocumentValidator:
+    """
+    Splits extracted batches into documents matching their model and the rest.
+
+    Validators are compiled from the mongoengine models in `models/mongodb`
+    on first use. Rejected documents go to the dead-letter sink under their
+    collection name, so they are dropped before any transform or lookup
+    runs on them.
+    """
+
+    def __init__(self, enabled: bool = VALIDATION_ENABLED):
+        self.enabled = enabled
+        self._validators: Optional[Dict[str, Check]] = None
+        self._lock = threading.Lock()
+
+    def _compile(self) -> Dict[str, Check]:
+        with self._lock:
+            if self._validators is None:
+                # Imported here as mongoengine pulls in pymongo
+                import models.mongodb as mongo_models
+
+                self._validators = {
+                    model._get_collection_name(): compile_validator(model)
+                    for model in vars(mongo_models).values()
+                    if isinstance(model, type)
+                    and hasattr(model, "_get_collection_name")
+                }
+            return self._validators
+
+    def validate(self, collection_name: str, document: Dict) -> Optional[str]:
+        """Returns None for a valid document, or what is wrong with it."""
+        validator = self._compile().get(collection_name)
+        return validator(document) if validator else None
+
+    def split(self, collection_name: str, batch: List[Dict]) -> List[Dict]:
+        """
+        Returns the valid documents of a batch, dead-lettering the others.
+
+        Args:
+            collection_name: Collection the batch was extracted from
+            batch: Raw documents, as returned by pymongo
+
+        Returns:
+            The valid documents, in their original order
+        """
+        if not self.enabled:
+            return batch
+        validator = self._compile().get(collection_name)
+        if validator is None:
+            return batch
+
+        valid = []
+        sink = get_dead_letter_sink()
+        for document in batch:
+            problem = validator(document)
+            if problem is None:
+                valid.append(document)
+            else:
+                sink.write(
+                    collection_name,
+                    document,
+                    DocumentValidationError(f"{collection_name}{problem}"),
+                )
+        rejected = len(batch) - len(valid)
+        if rejected:
+            INVALID_DOCUMENTS.inc(rejected, collection=collection_name)
+            logger.info(f"Rejected {rejected} invalid {collection_name} documents")
+        return valid
+
+
+_validator = DocumentValidator()
+
+
+def get_document_validator() -> DocumentValidator:
+    """Returns the process-wide document validator."""
+    return _validator
@@ -1,8 +1,21 @@
+import argparse
+from contextlib import nullcontext
+
 from scripts import create_dummy_data
 from etl.etl_pipeline import run_pipeline
+from utils.profiling import profiling
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Write per-stage collapsed stacks to data/profiles",
+    )
+    args = parser.parse_args()
+
     # Generate dummy data for testing
     create_dummy_data()
     # Run the ETL pipeline
-    run_pipeline()
+    with profiling() if args.profile else nullcontext():
+        run_pipeline()
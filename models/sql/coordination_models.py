@@ -0,0 +1,29 @@
+from sqlalchemy import Column, DateTime, Integer, String, Text, UniqueConstraint
+from sqlalchemy.orm import declarative_base
+
+# Kept apart from the migration models so the coordination table can live in
+# a different database (e.g. a SQLite file) than the tables being loaded
+CoordinationBase = declarative_base()
+
+
+class WorkUnit(CoordinationBase):
+    """One `_id` range partition of a table, claimed by workers through a lease."""
+
+    __tablename__ = "etl_work_units"
+    __table_args__ = (UniqueConstraint("run_id", "table_name", "partition_index"),)
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    run_id = Column(String(64), nullable=False, index=True)
+    table_name = Column(String(64), nullable=False)
+    partition_index = Column(Integer, nullable=False)
+    lower_id = Column(String(24))
+    upper_id = Column(String(24))
+    status = Column(String(16), nullable=False, default="pending")
+    owner = Column(String(128))
+    lease_expires_at = Column(DateTime)
+    checkpoint_id = Column(String(24))
+    attempts = Column(Integer, nullable=False, default=0)
+    # Bumped on every ownership change, so claims are optimistic updates
+    version = Column(Integer, nullable=False, default=0)
+    error = Column(Text)
+    updated_at = Column(DateTime)
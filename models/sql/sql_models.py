@@ -6,12 +6,14 @@ from sqlalchemy import (
     ForeignKey,
     Enum,
     DateTime,
+    Date,
     Boolean,
     Numeric,
     Index,
     Float,
+    text,
 )
-from sqlalchemy.dialects.mysql import INTEGER
+from sqlalchemy.dialects.mysql import DATETIME, INTEGER
 from sqlalchemy.orm import relationship, declarative_base
 from geoalchemy2 import Geometry
 from datetime import datetime
@@ -19,6 +21,26 @@ from datetime import datetime
 Base = declarative_base()
 
 
+def _loaded_at() -> Column:
+    """
+    Time the row was last written to MySQL, kept by the server.
+
+    Unlike `updated_at`, which comes from the source documents, it is set
+    when the loader inserts or changes a row, which is what incremental
+    exports need to find new rows (see etl.export).
+    """
+    return Column(
+        DATETIME(fsp=6),
+        nullable=False,
+        server_default=text("CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6)"),
+    )
+
+
+def _loaded_at_index(table: str) -> Index:
+    """Index incremental exports find new rows through (see etl.export)."""
+    return Index(f"idx_{table}_loaded_at", "loaded_at", "id")
+
+
 class Country(Base):
     __tablename__ = "countries"
 
@@ -26,12 +48,16 @@ class Country(Base):
     mongo_id = Column(String(24), unique=True)
     name = Column(String(50), nullable=False)
     code = Column(String(2), nullable=False)
+    row_hash = Column(String(32))
     created_at = Column(DateTime, default=lambda: datetime.now(datetime.timezone.utc))
     updated_at = Column(
         DateTime,
         default=lambda: datetime.now(datetime.timezone.utc),
         onupdate=lambda: datetime.now(datetime.timezone.utc),
     )
+    loaded_at = _loaded_at()
+
+    __table_args__ = (_loaded_at_index("countries"),)
 
 
 class City(Base):
@@ -40,6 +66,7 @@ class City(Base):
     id = Column(INTEGER(unsigned=True), primary_key=True, autoincrement=True)
     mongo_id = Column(String(24), unique=True)
     name = Column(String(50), nullable=False)
+    row_hash = Column(String(32))
     created_at = Column(
         DateTime, nullable=False, default=lambda: datetime.now(datetime.timezone.utc)
     )
@@ -48,6 +75,9 @@ class City(Base):
         default=lambda: datetime.now(datetime.timezone.utc),
         onupdate=lambda: datetime.now(datetime.timezone.utc),
     )
+    loaded_at = _loaded_at()
+
+    __table_args__ = (_loaded_at_index("cities"),)
 
 
 class Zone(Base):
@@ -56,12 +86,16 @@ class Zone(Base):
     id = Column(INTEGER(unsigned=True), primary_key=True, autoincrement=True)
     mongo_id = Column(String(24), unique=True)
     name = Column(String(50), nullable=False)
+    row_hash = Column(String(32))
     created_at = Column(DateTime, default=lambda: datetime.now(datetime.timezone.utc))
     updated_at = Column(
         DateTime,
         default=lambda: datetime.now(datetime.timezone.utc),
         onupdate=lambda: datetime.now(datetime.timezone.utc),
     )
+    loaded_at = _loaded_at()
+
+    __table_args__ = (_loaded_at_index("zones"),)
 
 
 class Address(Base):
@@ -74,24 +108,52 @@ class Address(Base):
     district = Column(String(50))
     floor = Column(String(10))
     apartment = Column(String(10))
-    geo_location = Column(Geometry("POINT", srid=4326))
+    # Not every source address has a location, so the SPATIAL index, which
+    # MySQL only builds on NOT NULL columns, is kept on AddressLocation
+    geo_location = Column(Geometry("POINT", srid=4326, spatial_index=False))
     zone_id = Column(INTEGER(unsigned=True), ForeignKey("zones.id"))
     city_id = Column(INTEGER(unsigned=True), ForeignKey("cities.id"))
     country_id = Column(INTEGER(unsigned=True), ForeignKey("countries.id"))
+    row_hash = Column(String(32))
     created_at = Column(DateTime, default=lambda: datetime.now(datetime.timezone.utc))
     updated_at = Column(
         DateTime,
         default=lambda: datetime.now(datetime.timezone.utc),
         onupdate=lambda: datetime.now(datetime.timezone.utc),
     )
+    loaded_at = _loaded_at()
     type = Column(Enum("dropoff", "pickup"), nullable=False)
     zone = relationship("Zone")
     city = relationship("City")
     country = relationship("Country")
 
     __table_args__ = (
-        Index("idx_addresses_geo", "geo_location", mysql_using="gist"),
         Index("idx_order_mongo_address_type", "order_mongo_id", "type", unique=True),
+        _loaded_at_index("addresses"),
+    )
+
+
+class AddressLocation(Base):
+    """
+    The located addresses, with their point under a SPATIAL index.
+
+    Maintained from `addresses.geo_location` by the loader (see
+    utils.spatial_queries), so addresses without a location have no row.
+    """
+
+    __tablename__ = "address_locations"
+
+    address_id = Column(
+        INTEGER(unsigned=True),
+        ForeignKey("addresses.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    geo_point = Column(
+        Geometry("POINT", srid=4326, spatial_index=False), nullable=False
+    )
+
+    __table_args__ = (
+        Index("idx_address_locations_geo", "geo_point", mysql_prefix="SPATIAL"),
     )
 
 
@@ -103,12 +165,16 @@ class Receiver(Base):
     first_name = Column(String(50), nullable=False)
     last_name = Column(String(50), nullable=False)
     phone = Column(String(20), nullable=False)
+    row_hash = Column(String(32))
     created_at = Column(DateTime, default=lambda: datetime.now(datetime.timezone.utc))
     updated_at = Column(
         DateTime,
         default=lambda: datetime.now(datetime.timezone.utc),
         onupdate=lambda: datetime.now(datetime.timezone.utc),
     )
+    loaded_at = _loaded_at()
+
+    __table_args__ = (_loaded_at_index("receivers"),)
 
 
 class Star(Base):
@@ -118,12 +184,16 @@ class Star(Base):
     mongo_id = Column(String(24), unique=True)
     name = Column(String(200), nullable=False)
     phone = Column(String(20), nullable=False)
+    row_hash = Column(String(32))
     created_at = Column(DateTime, default=lambda: datetime.now(datetime.timezone.utc))
     updated_at = Column(
         DateTime,
         default=lambda: datetime.now(datetime.timezone.utc),
         onupdate=lambda: datetime.now(datetime.timezone.utc),
     )
+    loaded_at = _loaded_at()
+
+    __table_args__ = (_loaded_at_index("stars"),)
 
 
 class Order(Base):
@@ -143,12 +213,14 @@ class Order(Base):
         INTEGER(unsigned=True), ForeignKey("receivers.id"), nullable=False
     )
     star_id = Column(INTEGER(unsigned=True), ForeignKey("stars.id"))
+    row_hash = Column(String(32))
     created_at = Column(DateTime, default=lambda: datetime.now(datetime.timezone.utc))
     updated_at = Column(
         DateTime,
         default=lambda: datetime.now(datetime.timezone.utc),
         onupdate=lambda: datetime.now(datetime.timezone.utc),
     )
+    loaded_at = _loaded_at()
     pickup_address = relationship("Address", foreign_keys=[pickup_address_id])
     dropoff_address = relationship("Address", foreign_keys=[dropoff_address_id])
     receiver = relationship("Receiver")
@@ -161,6 +233,7 @@ class Order(Base):
         Index("idx_orders_created_at", "created_at"),
         Index("idx_orders_updated_at", "updated_at"),
         Index("idx_orders_type", "type"),
+        _loaded_at_index("orders"),
     )
 
 
@@ -173,6 +246,7 @@ class CodPayment(Base):
     collected_amount = Column(Numeric(10, 2))
     is_paid_back = Column(Boolean, default=False)
     collected_from_business_at = Column(DateTime)
+    row_hash = Column(String(32))
     created_at = Column(
         DateTime, nullable=False, default=lambda: datetime.now(datetime.timezone.utc)
     )
@@ -182,12 +256,14 @@ class CodPayment(Base):
         default=lambda: datetime.now(datetime.timezone.utc),
         onupdate=lambda: datetime.now(datetime.timezone.utc),
     )
+    loaded_at = _loaded_at()
 
     order = relationship("Order")
 
     __table_args__ = (
         Index("idx_cod_payments_order_id", "order_id"),
         Index("idx_cod_payments_amount", "amount"),
+        _loaded_at_index("cod_payments"),
     )
 
 
@@ -201,16 +277,21 @@ class Confirmation(Base):
     )
     is_confirmed = Column(Boolean, default=False)
     number_of_sms_trials = Column(INTEGER(unsigned=True), default=0)
+    row_hash = Column(String(32))
     created_at = Column(DateTime, default=lambda: datetime.now(datetime.timezone.utc))
     updated_at = Column(
         DateTime,
         default=lambda: datetime.now(datetime.timezone.utc),
         onupdate=lambda: datetime.now(datetime.timezone.utc),
     )
+    loaded_at = _loaded_at()
 
     order = relationship("Order")
 
-    __table_args__ = (Index("idx_confirmations_order_id", "order_id"),)
+    __table_args__ = (
+        Index("idx_confirmations_order_id", "order_id"),
+        _loaded_at_index("confirmations"),
+    )
 
 
 class Tracker(Base):
@@ -220,6 +301,7 @@ class Tracker(Base):
     mongo_id = Column(String(24), unique=True)
     order_id = Column(INTEGER(unsigned=True), ForeignKey("orders.id"), nullable=False)
     order_number = Column(String(50), unique=True, nullable=False)
+    row_hash = Column(String(32))
 
     created_at = Column(
         DateTime, nullable=False, default=lambda: datetime.now(datetime.timezone.utc)
@@ -230,7 +312,69 @@ class Tracker(Base):
         default=lambda: datetime.now(datetime.timezone.utc),
         onupdate=lambda: datetime.now(datetime.timezone.utc),
     )
+    loaded_at = _loaded_at()
 
     order = relationship("Order")
 
-    __table_args__ = (Index("idx_trackers_order_id", "order_id"),)
+    __table_args__ = (
+        Index("idx_trackers_order_id", "order_id"),
+        _loaded_at_index("trackers"),
+    )
+
+
+class SchemaMigration(Base):
+    """Data migrations run by the connector, with the progress of unfinished ones."""
+
+    __tablename__ = "schema_migrations"
+
+    name = Column(String(64), primary_key=True)
+    last_id = Column(INTEGER(unsigned=True), nullable=False, server_default="0")
+    completed_at = Column(DATETIME(fsp=6))
+
+
+class IdSequence(Base):
+    __tablename__ = "id_sequences"
+
+    table_name = Column(String(64), primary_key=True)
+    next_id = Column(INTEGER(unsigned=True), nullable=False)
+
+
+class OrderDailyZoneStats(Base):
+    """
+    Orders and COD amounts per day and drop-off zone, maintained by the loader.
+
+    Rows are recomputed from `orders`, `addresses` and `cod_payments` for
+    the days loaded batches touched, once each collection finishes loading
+    (see etl.aggregates). Orders without a drop-off zone or city are
+    counted under id 0.
+    """
+
+    __tablename__ = "order_daily_zone_stats"
+
+    day = Column(Date, primary_key=True)
+    city_id = Column(INTEGER(unsigned=True), primary_key=True)
+    zone_id = Column(INTEGER(unsigned=True), primary_key=True)
+    order_count = Column(INTEGER(unsigned=True), nullable=False)
+    cod_order_count = Column(INTEGER(unsigned=True), nullable=False)
+    cod_amount = Column(Numeric(14, 2), nullable=False)
+    cod_collected_amount = Column(Numeric(14, 2), nullable=False)
+    refreshed_at = Column(DATETIME(fsp=6), nullable=False)
+
+    __table_args__ = (Index("idx_order_daily_zone_stats_zone_day", "zone_id", "day"),)
+
+
+class OrderStatsPendingDay(Base):
+    """
+    Days whose order statistics are out of date.
+
+    The loader queues the days each committed batch touches; they are
+    dequeued once their statistics are recomputed, so days whose refresh
+    failed stay queued until the next one.
+    """
+
+    __tablename__ = "order_daily_zone_stats_pending"
+
+    day = Column(Date, primary_key=True)
+    queued_at = Column(
+        DATETIME(fsp=6), nullable=False, server_default=text("CURRENT_TIMESTAMP(6)")
+    )
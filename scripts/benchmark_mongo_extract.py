@@ -0,0 +1,241 @@
+"""
+Measures what the extraction client profile saves on the wire and on the primary.
+
+Scans collections once through the default MongoDB client and once through
+the `extraction` profile (compression, secondaryPreferred, large cursor
+batches), and compares the `serverStatus` counters of every replica set
+member before and after each scan:
+
+    python scripts/benchmark_mongo_extract.py --docker --orders 200000
+    python scripts/benchmark_mongo_extract.py --collections order tracker
+
+With --docker, a three-member replica set is started on ports --docker-port
+to --docker-port + 2 and seeded with generated orders; otherwise MONGO_URI
+must point at a replica set that already holds data. Run nothing else
+against it meanwhile, as the counters are server-wide.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+# Add the parent directory to the system path to import the ETL modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+
+RESULTS_DIR = "data/benchmarks"
+MONGO_IMAGE = "mongo:7.0"
+REPLICA_SET = "rs0"
+
+
+def start_replica_set(image, first_port):
+    """Starts three mongod containers on the host network, returning their ids."""
+    container_ids = []
+    for port in range(first_port, first_port + 3):
+        container_ids.append(
+            subprocess.run(
+                [
+                    "docker",
+                    "run",
+                    "-d",
+                    "--rm",
+                    "--network",
+                    "host",
+                    image,
+                    "mongod",
+                    "--replSet",
+                    REPLICA_SET,
+                    "--port",
+                    str(port),
+                    "--bind_ip",
+                    "127.0.0.1",
+                    "--networkMessageCompressors",
+                    "zstd,snappy,zlib",
+                ],
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout.strip()
+        )
+    print(f"Started replica set {REPLICA_SET} on ports {first_port}-{first_port + 2}")
+    return container_ids
+
+
+def initiate_replica_set(first_port, timeout=120):
+    """Initiates the replica set and waits for a primary and two secondaries."""
+    from pymongo import MongoClient
+    from pymongo.errors import PyMongoError
+
+    members = [
+        {"_id": index, "host": f"127.0.0.1:{first_port + index}"} for index in range(3)
+    ]
+    client = MongoClient(
+        "127.0.0.1", first_port, directConnection=True, serverSelectionTimeoutMS=2000
+    )
+    deadline = time.monotonic() + timeout
+    initiated = False
+    try:
+        while True:
+            try:
+                if not initiated:
+                    client.admin.command(
+                        "replSetInitiate", {"_id": REPLICA_SET, "members": members}
+                    )
+                    initiated = True
+                states = [
+                    member["stateStr"]
+                    for member in client.admin.command("replSetGetStatus")["members"]
+                ]
+                if sorted(states) == ["PRIMARY", "SECONDARY", "SECONDARY"]:
+                    return
+            except PyMongoError:
+                pass
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Replica set {REPLICA_SET} did not come up")
+            time.sleep(2)
+    finally:
+        client.close()
+
+
+def seed(orders):
+    """Inserts generated dimensions, orders and trackers."""
+    from config.settings import MONGO_DATABASE
+    from scripts.generate_bulk_data import BulkDataGenerator, MongoWriter, generate
+
+    generate(BulkDataGenerator(orders=orders), MongoWriter(MONGO_DATABASE), 10000)
+
+
+def scan(profile, collections):
+    """Scans the collections through a profile's client, counting documents."""
+    from connections.mongo_connector import scan_cursor
+    from etl.extract import get_collection
+
+    documents = 0
+    for collection_name in collections:
+        with scan_cursor(
+            get_collection(collection_name, profile), {}, profile=profile
+        ) as cursor:
+            for _ in cursor:
+                documents += 1
+    return documents
+
+
+def measure(profile, collections):
+    """Scans through a profile, returning its documents, time and counter deltas."""
+    from connections.mongo_connector import get_mongo_client, server_counters
+
+    client = get_mongo_client(profile)
+    before = server_counters(client)
+    start_time = time.perf_counter()
+    documents = scan(profile, collections)
+    seconds = time.perf_counter() - start_time
+    after = server_counters(client)
+
+    members = {}
+    for member, counters in after.items():
+        delta = {
+            name: value - before.get(member, {}).get(name, 0)
+            for name, value in counters.items()
+            if name != "is_primary"
+        }
+        delta["is_primary"] = counters["is_primary"]
+        delta["reads"] = delta["query"] + delta["getmore"]
+        members[member] = delta
+
+    bytes_out = sum(member["bytes_out"] for member in members.values())
+    physical_bytes_out = sum(
+        member["physical_bytes_out"] for member in members.values()
+    )
+    reads = sum(member["reads"] for member in members.values())
+    primary_reads = sum(
+        member["reads"] for member in members.values() if member["is_primary"]
+    )
+    return {
+        "profile": profile or "default",
+        "documents": documents,
+        "seconds": round(seconds, 3),
+        "bytes_out": bytes_out,
+        "physical_bytes_out": physical_bytes_out,
+        "compression_ratio": (
+            round(bytes_out / physical_bytes_out, 2) if physical_bytes_out else None
+        ),
+        "reads": reads,
+        "primary_read_share": round(primary_reads / reads, 3) if reads else None,
+        "members": members,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--collections", nargs="+", default=["order", "tracker"], metavar="COLLECTION"
+    )
+    parser.add_argument(
+        "--docker", action="store_true", help="Start and seed a replica set"
+    )
+    parser.add_argument("--docker-image", default=MONGO_IMAGE)
+    parser.add_argument("--docker-port", type=int, default=27117)
+    parser.add_argument(
+        "--orders", type=int, default=100000, help="Orders seeded with --docker"
+    )
+    parser.add_argument("--output", help="Results file (default: data/benchmarks/)")
+    args = parser.parse_args()
+
+    container_ids = []
+    if args.docker:
+        # The ETL settings are read from the environment on import
+        hosts = ",".join(
+            f"127.0.0.1:{port}"
+            for port in range(args.docker_port, args.docker_port + 3)
+        )
+        os.environ["MONGO_URI"] = f"mongodb://{hosts}/?replicaSet={REPLICA_SET}"
+        os.environ["MONGO_DATABASE"] = "logistics_benchmark"
+        container_ids = start_replica_set(args.docker_image, args.docker_port)
+
+    try:
+        if args.docker:
+            initiate_replica_set(args.docker_port)
+            seed(args.orders)
+        from connections.mongo_connector import EXTRACTION_PROFILE
+
+        results = [
+            measure(profile, args.collections) for profile in (None, EXTRACTION_PROFILE)
+        ]
+    finally:
+        for container_id in container_ids:
+            subprocess.run(["docker", "stop", container_id], capture_output=True)
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"mongo-extract-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as output_file:
+        json.dump(
+            {"timestamp": datetime.now().isoformat(), "results": results},
+            output_file,
+            indent=2,
+        )
+
+    for result in results:
+        share = result["primary_read_share"]
+        print(
+            f"{result['profile']:10} {result['documents']:>9} docs "
+            f"{result['seconds']:8.3f}s  {result['physical_bytes_out']:>12} bytes "
+            f"on the wire (x{result['compression_ratio']} compression)  "
+            f"{result['reads']} reads, "
+            f"{'-' if share is None else f'{share:.0%}'} on the primary"
+        )
+    default, extraction = results
+    if default["physical_bytes_out"]:
+        saved = 1 - extraction["physical_bytes_out"] / default["physical_bytes_out"]
+        print(f"Extraction profile sent {saved:.0%} fewer bytes")
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
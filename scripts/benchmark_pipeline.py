@@ -0,0 +1,233 @@
+"""
+End-to-end throughput benchmark of the ETL pipeline.
+
+Extracts from mongoexport files instead of MongoDB and loads into a
+throwaway MySQL, either a container started for the run (--docker) or the
+server configured through the SQL_* environment variables:
+
+    python scripts/benchmark_pipeline.py --docker
+    python scripts/benchmark_pipeline.py --source-dir data/bulk --reset \\
+        --baseline data/benchmarks/baseline.json --threshold 0.2
+
+Rows/sec per table and total wall time are written to a results file. With
+--baseline, the run fails when any table's throughput, or the total wall
+time, is worse than the baseline by more than --threshold.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+# Add the parent directory to the system path to import the ETL modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+
+RESULTS_DIR = "data/benchmarks"
+MYSQL_IMAGE = "mysql:8.0"
+
+
+def start_mysql_container(image, port, password, database):
+    """Starts a disposable MySQL container, returning its id."""
+    container_id = subprocess.run(
+        [
+            "docker",
+            "run",
+            "-d",
+            "--rm",
+            "-e",
+            f"MYSQL_ROOT_PASSWORD={password}",
+            "-e",
+            f"MYSQL_DATABASE={database}",
+            "-p",
+            f"127.0.0.1:{port}:3306",
+            image,
+        ],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout.strip()
+    print(f"Started MySQL container {container_id[:12]} on port {port}")
+    return container_id
+
+
+def wait_for_mysql(config, timeout=180):
+    """Waits until the server accepts connections."""
+    import mysql.connector
+
+    # The database itself is created by the connector on first use
+    server_config = {key: value for key, value in config.items() if key != "database"}
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            mysql.connector.connect(**server_config).close()
+            return
+        except mysql.connector.Error:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(2)
+
+
+def reset_tables():
+    """Drops and recreates every model table, so each run loads from scratch."""
+    from connections.sql_connector import get_mysql_engine
+    from models.sql.sql_models import Base
+
+    engine = get_mysql_engine()
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+
+
+def collect_results(total_seconds, source_dir):
+    """Builds per-table throughput from the metrics registry."""
+    from etl.table_graph import TABLE_STEPS
+    from utils.metrics import ROWS, TABLE_SECONDS
+
+    step_tables = {
+        transform_name: table
+        for table, steps in TABLE_STEPS.items()
+        for _, transform_name, _ in steps
+    }
+    rows = {}
+    for series in ROWS.snapshot():
+        labels = series["labels"]
+        table = step_tables.get(labels.get("step"))
+        if labels.get("stage") == "load" and table:
+            rows[table] = rows.get(table, 0) + int(series["value"])
+
+    tables = {}
+    for series in TABLE_SECONDS.snapshot():
+        table = series["labels"]["table"]
+        seconds = series["value"]
+        table_rows = rows.get(table, 0)
+        tables[table] = {
+            "rows": table_rows,
+            "seconds": round(seconds, 3),
+            "rows_per_second": round(table_rows / seconds, 1) if seconds else None,
+        }
+
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "source_dir": source_dir,
+        "total_seconds": round(total_seconds, 3),
+        "total_rows": sum(rows.values()),
+        "tables": tables,
+    }
+
+
+def find_regressions(results, baseline, threshold):
+    """Lists every metric that is worse than the baseline by more than `threshold`."""
+    regressions = []
+    for table, expected in baseline.get("tables", {}).items():
+        actual = results["tables"].get(table)
+        if not actual or not expected.get("rows_per_second"):
+            continue
+        floor = expected["rows_per_second"] * (1 - threshold)
+        if (actual["rows_per_second"] or 0) < floor:
+            regressions.append(
+                f"{table}: {actual['rows_per_second']} rows/s, "
+                f"baseline {expected['rows_per_second']} rows/s"
+            )
+    if baseline.get("total_seconds"):
+        ceiling = baseline["total_seconds"] * (1 + threshold)
+        if results["total_seconds"] > ceiling:
+            regressions.append(
+                f"total: {results['total_seconds']}s, "
+                f"baseline {baseline['total_seconds']}s"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--source-dir",
+        default="data/source_sample",
+        help="Directory of mongoexport files (see scripts/generate_bulk_data.py)",
+    )
+    parser.add_argument("--docker", action="store_true", help="Start a MySQL container")
+    parser.add_argument("--docker-image", default=MYSQL_IMAGE)
+    parser.add_argument("--docker-port", type=int, default=3307)
+    parser.add_argument(
+        "--reset",
+        action="store_true",
+        help="Drop and recreate the target tables first (destroys their data)",
+    )
+    parser.add_argument("--max-workers", type=int, default=3)
+    parser.add_argument("--output", help="Results file (default: data/benchmarks/)")
+    parser.add_argument("--baseline", help="Results file to compare against")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="Allowed relative slowdown against the baseline (default: 0.2)",
+    )
+    args = parser.parse_args()
+
+    # The ETL settings are read from the environment on import
+    os.environ["ETL_SOURCE_DIR"] = args.source_dir
+    container_id = None
+    if args.docker:
+        os.environ.update(
+            {
+                "SQL_HOST": "127.0.0.1",
+                "SQL_PORT": str(args.docker_port),
+                "SQL_USER": "root",
+                "SQL_PASSWORD": "benchmark",
+                "SQL_DATABASE": "logistics_benchmark",
+            }
+        )
+        container_id = start_mysql_container(
+            args.docker_image, args.docker_port, "benchmark", "logistics_benchmark"
+        )
+
+    try:
+        from config.settings import SQL_CONFIG
+
+        wait_for_mysql(SQL_CONFIG)
+        if args.reset or args.docker:
+            reset_tables()
+
+        from etl.etl_pipeline import run_tables
+
+        start_time = time.perf_counter()
+        run_tables(max_workers=args.max_workers)
+        total_seconds = time.perf_counter() - start_time
+    finally:
+        if container_id:
+            subprocess.run(["docker", "stop", container_id], capture_output=True)
+
+    results = collect_results(total_seconds, args.source_dir)
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"pipeline-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as output_file:
+        json.dump(results, output_file, indent=2)
+
+    for table, result in sorted(results["tables"].items()):
+        print(
+            f"{table:15} {result['rows']:>9} rows {result['seconds']:9.3f}s "
+            f"{result['rows_per_second']} rows/s"
+        )
+    print(f"Total: {results['total_rows']} rows in {results['total_seconds']}s")
+    print(f"Results written to {output}")
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = find_regressions(results, baseline, args.threshold)
+        if regressions:
+            print("Throughput regressed past the threshold:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"No regression beyond {args.threshold:.0%} of {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
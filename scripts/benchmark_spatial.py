@@ -0,0 +1,329 @@
+"""
+Benchmarks the spatial queries over the indexed address_locations.geo_point.
+
+Loads generated addresses (clustered around city centres like real pickups
+and drop-offs, with a uniform background over Egypt) into MySQL, then times
+radius, nearest-N and density-grid queries through utils.spatial_queries
+against the same queries scanning addresses.geo_location, which has no index:
+
+    python scripts/benchmark_spatial.py --docker --rows 1000000
+    python scripts/benchmark_spatial.py --reset --rows 200000 --queries 50
+    python scripts/benchmark_spatial.py --queries 100   # existing addresses
+
+Loading needs --docker or --reset, since it replaces the tables' contents.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+# Add the parent directory to the system path to import the ETL modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+
+from scripts.benchmark_pipeline import (
+    MYSQL_IMAGE,
+    RESULTS_DIR,
+    reset_tables,
+    start_mysql_container,
+    wait_for_mysql,
+)
+
+# Longitude and latitude bounds of the generated addresses
+BOUNDS = (29.0, 25.0, 32.0, 31.0)
+CITY_CENTRES = 20
+CLUSTERED_SHARE = 0.8
+INSERT_SQL = (
+    "INSERT INTO addresses (order_mongo_id, type, geo_location) VALUES "
+    "(%s, %s, ST_GeomFromText(%s, 4326, 'axis-order=long-lat'))"
+)
+# What the loader's post-commit hook does for every batch of addresses
+LOCATIONS_SQL = (
+    "INSERT INTO address_locations (address_id, geo_point) "
+    "SELECT id, geo_location FROM addresses WHERE id > %s"
+)
+
+
+def generate_points(count, rng):
+    """Returns (lon, lat) arrays, mostly clustered around random city centres."""
+    min_lon, min_lat, max_lon, max_lat = BOUNDS
+    centres = np.column_stack(
+        [
+            rng.uniform(min_lon, max_lon, CITY_CENTRES),
+            rng.uniform(min_lat, max_lat, CITY_CENTRES),
+        ]
+    )
+    clustered = rng.random(count) < CLUSTERED_SHARE
+    chosen = centres[rng.integers(0, CITY_CENTRES, count)]
+    lon = np.where(
+        clustered,
+        chosen[:, 0] + rng.normal(0, 0.05, count),
+        rng.uniform(min_lon, max_lon, count),
+    )
+    lat = np.where(
+        clustered,
+        chosen[:, 1] + rng.normal(0, 0.05, count),
+        rng.uniform(min_lat, max_lat, count),
+    )
+    return np.clip(lon, min_lon, max_lon), np.clip(lat, min_lat, max_lat)
+
+
+def load_addresses(engine, count, batch_size, rng):
+    """Inserts `count` generated addresses, alternating pickups and drop-offs."""
+    lon, lat = generate_points(count, rng)
+    start_time = time.perf_counter()
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        for start in range(0, count, batch_size):
+            rows = [
+                (
+                    f"{(start + i) // 2:024x}",
+                    "pickup" if (start + i) % 2 == 0 else "dropoff",
+                    f"POINT({lon[start + i]} {lat[start + i]})",
+                )
+                for i in range(min(batch_size, count - start))
+            ]
+            cursor.execute("SELECT COALESCE(MAX(id), 0) FROM addresses")
+            (last_id,) = cursor.fetchone()
+            cursor.executemany(INSERT_SQL, rows)
+            cursor.execute(LOCATIONS_SQL, (last_id,))
+            connection.commit()
+            print(f"Loaded {start + len(rows)}/{count} addresses", end="\r")
+        cursor.close()
+    finally:
+        connection.close()
+    seconds = time.perf_counter() - start_time
+    print(f"Loaded {count} addresses in {seconds:.1f}s" + " " * 20)
+    return seconds
+
+
+def timed(function, *args, **kwargs):
+    start_time = time.perf_counter()
+    result = function(*args, **kwargs)
+    return (time.perf_counter() - start_time) * 1000, result
+
+
+def scan_within_radius(conn, lon, lat, radius_m):
+    """The radius query without the spatial index, as ad-hoc queries ran it."""
+    from sqlalchemy import text
+
+    return conn.execute(
+        text(
+            "SELECT id FROM addresses "
+            "WHERE ST_Distance_Sphere(geo_location, "
+            "ST_GeomFromText(:point, 4326, 'axis-order=long-lat')) <= :radius"
+        ),
+        {"point": f"POINT({lon} {lat})", "radius": radius_m},
+    ).fetchall()
+
+
+def scan_nearest(conn, lon, lat, count):
+    from sqlalchemy import text
+
+    return conn.execute(
+        text(
+            "SELECT id FROM addresses "
+            "WHERE type = 'pickup' ORDER BY ST_Distance_Sphere(geo_location, "
+            "ST_GeomFromText(:point, 4326, 'axis-order=long-lat')) LIMIT :count"
+        ),
+        {"point": f"POINT({lon} {lat})", "count": count},
+    ).fetchall()
+
+
+def uses_spatial_index(conn, lon, lat, radius_m):
+    """Checks with EXPLAIN that the radius prefilter reads idx_address_locations_geo."""
+    from sqlalchemy import text
+
+    from utils.spatial_queries import radius_envelope
+
+    envelope = radius_envelope(lon, lat, radius_m).compile(
+        dialect=conn.dialect, compile_kwargs={"literal_binds": True}
+    )
+    plan = (
+        conn.execute(
+            text(
+                "EXPLAIN SELECT address_id FROM address_locations "
+                f"WHERE MBRContains({envelope}, geo_point)"
+            )
+        )
+        .mappings()
+        .all()
+    )
+    return any(row.get("key") == "idx_address_locations_geo" for row in plan)
+
+
+def summarize(name, indexed, scanned):
+    indexed, scanned = np.array(indexed), np.array(scanned)
+    result = {
+        "query": name,
+        "indexed_p50_ms": round(float(np.percentile(indexed, 50)), 2),
+        "indexed_p95_ms": round(float(np.percentile(indexed, 95)), 2),
+        "scan_p50_ms": round(float(np.percentile(scanned, 50)), 2),
+        "scan_p95_ms": round(float(np.percentile(scanned, 95)), 2),
+    }
+    result["speedup_p50"] = round(result["scan_p50_ms"] / result["indexed_p50_ms"], 1)
+    print(
+        f"{name:18} indexed p50 {result['indexed_p50_ms']:8.2f} ms "
+        f"p95 {result['indexed_p95_ms']:8.2f} ms | scan p50 "
+        f"{result['scan_p50_ms']:9.2f} ms p95 {result['scan_p95_ms']:9.2f} ms | "
+        f"{result['speedup_p50']}x"
+    )
+    return result
+
+
+def run_queries(engine, queries, radius_m, nearest, cell_degrees, rng):
+    from utils.spatial_queries import (
+        addresses_within_radius,
+        density_grid,
+        nearest_addresses,
+    )
+
+    lon, lat = generate_points(queries, rng)
+    timings = {"radius": ([], []), "nearest": ([], []), "density_grid": ([], [])}
+    mismatches = 0
+    with engine.connect() as conn:
+        index_used = uses_spatial_index(conn, lon[0], lat[0], radius_m)
+        for x, y in zip(lon.tolist(), lat.tolist()):
+            milliseconds, rows = timed(
+                addresses_within_radius, x, y, radius_m, engine=engine
+            )
+            timings["radius"][0].append(milliseconds)
+            milliseconds, scanned = timed(scan_within_radius, conn, x, y, radius_m)
+            timings["radius"][1].append(milliseconds)
+            mismatches += {row["id"] for row in rows} != {row[0] for row in scanned}
+
+            milliseconds, _ = timed(nearest_addresses, x, y, nearest, engine=engine)
+            timings["nearest"][0].append(milliseconds)
+            milliseconds, _ = timed(scan_nearest, conn, x, y, nearest)
+            timings["nearest"][1].append(milliseconds)
+
+            box = (x - 0.25, y - 0.25, x + 0.25, y + 0.25)
+            milliseconds, _ = timed(density_grid, *box, cell_degrees, engine=engine)
+            timings["density_grid"][0].append(milliseconds)
+            milliseconds, _ = timed(scan_density_grid, conn, box, cell_degrees)
+            timings["density_grid"][1].append(milliseconds)
+
+    print(f"Spatial index used by the prefilter: {index_used}")
+    if mismatches:
+        print(f"WARNING: {mismatches} radius queries differ from the full scan")
+    results = [summarize(name, *pair) for name, pair in timings.items()]
+    return results, index_used, mismatches
+
+
+def scan_density_grid(conn, box, cell_degrees):
+    from sqlalchemy import text
+
+    min_lon, min_lat, max_lon, max_lat = box
+    return conn.execute(
+        text(
+            "SELECT FLOOR((ST_Longitude(geo_location) - :min_lon) / :cell), "
+            "FLOOR((ST_Latitude(geo_location) - :min_lat) / :cell), COUNT(*) "
+            "FROM addresses "
+            "WHERE ST_Longitude(geo_location) >= :min_lon "
+            "AND ST_Longitude(geo_location) < :max_lon "
+            "AND ST_Latitude(geo_location) >= :min_lat "
+            "AND ST_Latitude(geo_location) < :max_lat GROUP BY 1, 2"
+        ),
+        {
+            "min_lon": min_lon,
+            "min_lat": min_lat,
+            "max_lon": max_lon,
+            "max_lat": max_lat,
+            "cell": cell_degrees,
+        },
+    ).fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--radius", type=float, default=2000, help="Meters")
+    parser.add_argument("--nearest", type=int, default=10)
+    parser.add_argument("--cell-degrees", type=float, default=0.01)
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--docker", action="store_true", help="Start a MySQL container")
+    parser.add_argument("--docker-image", default=MYSQL_IMAGE)
+    parser.add_argument("--docker-port", type=int, default=3307)
+    parser.add_argument(
+        "--reset",
+        action="store_true",
+        help="Drop and recreate the target tables, then load (destroys their data)",
+    )
+    parser.add_argument("--output", help="Results file (default: data/benchmarks/)")
+    args = parser.parse_args()
+
+    container_id = None
+    if args.docker:
+        os.environ.update(
+            {
+                "SQL_HOST": "127.0.0.1",
+                "SQL_PORT": str(args.docker_port),
+                "SQL_USER": "root",
+                "SQL_PASSWORD": "benchmark",
+                "SQL_DATABASE": "logistics_benchmark",
+            }
+        )
+        container_id = start_mysql_container(
+            args.docker_image, args.docker_port, "benchmark", "logistics_benchmark"
+        )
+
+    rng = np.random.default_rng(args.seed)
+    try:
+        from config.settings import SQL_CONFIG
+        from connections.sql_connector import get_mysql_engine
+
+        wait_for_mysql(SQL_CONFIG)
+        load_seconds = None
+        if args.reset or args.docker:
+            reset_tables()
+            load_seconds = load_addresses(
+                get_mysql_engine(), args.rows, args.batch_size, rng
+            )
+        results, index_used, mismatches = run_queries(
+            get_mysql_engine(),
+            args.queries,
+            args.radius,
+            args.nearest,
+            args.cell_degrees,
+            rng,
+        )
+    finally:
+        if container_id:
+            subprocess.run(["docker", "stop", container_id], capture_output=True)
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"spatial-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as output_file:
+        json.dump(
+            {
+                "timestamp": datetime.now().isoformat(),
+                "rows": args.rows if load_seconds is not None else None,
+                "load_seconds": load_seconds,
+                "queries": args.queries,
+                "radius_m": args.radius,
+                "spatial_index_used": index_used,
+                "radius_mismatches": mismatches,
+                "results": results,
+            },
+            output_file,
+            indent=2,
+        )
+    print(f"Results written to {output}")
+    if mismatches or not index_used:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""
+Micro-benchmarks for the transform functions.
+
+Builds synthetic order documents shaped like
+data/source_sample/logistics.order.json and times each transform over them
+in pipeline-sized batches, with ids served by an in-memory allocator, so
+no MongoDB or MySQL is needed:
+
+    python scripts/benchmark_transforms.py
+    python scripts/benchmark_transforms.py --sizes 1000 100000 --output bench.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+
+# Add the parent directory to the system path to import the ETL modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+
+from etl.transform import (
+    transform_common_datatypes,
+    transform_confirmation_data,
+    transform_cod_payment_data,
+    transform_dropoff_address_data,
+    transform_order_data,
+    transform_pickup_address_data,
+)
+from scripts.generate_bulk_data import BulkDataGenerator
+from utils.id_allocator import LocalIdAllocator, set_id_allocator
+
+DEFAULT_SIZES = [1000, 100000, 1000000]
+# Source collection of the rows each table's transforms reference
+REFERENCED_TABLES = {
+    "countries": "country",
+    "cities": "city",
+    "zones": "zone",
+    "receivers": "receiver",
+    "stars": "star",
+}
+
+
+def build_order_documents(count, seed=0):
+    """
+    Builds `count` order documents with the types pymongo returns.
+
+    Returns:
+        Tuple of (documents, pools), pools mapping each referenced table to
+        the ObjectIds its documents point at
+    """
+    generator = BulkDataGenerator(orders=count, seed=seed)
+    documents = [
+        order for orders, _ in generator.order_batches(count) for order in orders
+    ]
+    pools = {
+        table: [document["_id"] for document in generator.dimensions[collection]]
+        for table, collection in REFERENCED_TABLES.items()
+    }
+    return documents, pools
+
+
+def normalized_batches(batches):
+    """Input of `transform_common_datatypes`: flattened, renamed order batches."""
+    return [
+        pd.json_normalize(batch).rename(columns={"_id": "mongo_id"})
+        for batch in batches
+    ]
+
+
+# (name, transform, input builder), in pipeline order: addresses first, so
+# orders resolve the address ids they assigned, then orders, whose ids COD
+# payments and confirmations resolve
+BENCHMARKS = [
+    ("transform_pickup_address_data", transform_pickup_address_data, None),
+    ("transform_dropoff_address_data", transform_dropoff_address_data, None),
+    ("transform_order_data", transform_order_data, None),
+    ("transform_cod_payment_data", transform_cod_payment_data, None),
+    ("transform_confirmation_data", transform_confirmation_data, None),
+    ("transform_common_datatypes", transform_common_datatypes, normalized_batches),
+]
+
+
+def seeded_allocator(pools):
+    """Returns an in-memory allocator that already knows every referenced row."""
+    allocator = LocalIdAllocator()
+    for table, object_ids in pools.items():
+        allocator.assign(table, [str(object_id) for object_id in object_ids])
+    set_id_allocator(allocator)
+    return allocator
+
+
+def run_benchmark(transform, batches, measure_memory):
+    """Runs `transform` over every batch, returning (seconds, peak bytes)."""
+    if measure_memory:
+        tracemalloc.start()
+    start_time = time.perf_counter()
+    for batch in batches:
+        transform(batch)
+    seconds = time.perf_counter() - start_time
+    peak = None
+    if measure_memory:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return seconds, peak
+
+
+def benchmark_size(size, batch_size, measure_memory, seed):
+    documents, pools = build_order_documents(size, seed)
+    batches = [
+        documents[start : start + batch_size] for start in range(0, size, batch_size)
+    ]
+    seeded_allocator(pools)
+    results = []
+    for name, transform, build_input in BENCHMARKS:
+        # Transforms may modify frames they are given, so every pass builds its own
+        inputs = build_input(batches) if build_input else batches
+        seconds, _ = run_benchmark(transform, inputs, measure_memory=False)
+
+        peak = None
+        if measure_memory:
+            # Tracing slows allocations down, so memory is measured in a second pass
+            inputs = build_input(batches) if build_input else batches
+            _, peak = run_benchmark(transform, inputs, measure_memory=True)
+
+        results.append(
+            {
+                "transform": name,
+                "rows": size,
+                "batch_size": batch_size,
+                "seconds": round(seconds, 4),
+                "rows_per_second": round(size / seconds) if seconds else None,
+                "peak_memory_mb": round(peak / 2**20, 2) if peak is not None else None,
+            }
+        )
+        print(
+            f"{name:34} {size:>9} rows {seconds:9.3f}s "
+            f"{results[-1]['rows_per_second']:>10} rows/s "
+            f"{results[-1]['peak_memory_mb'] if peak is not None else '-':>8} MiB peak"
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=1000,
+        help="Documents per transform call, as extracted by the pipeline",
+    )
+    parser.add_argument("--no-memory", action="store_true", help="Skip tracemalloc")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        results.extend(
+            benchmark_size(size, args.batch_size, not args.no_memory, args.seed)
+        )
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
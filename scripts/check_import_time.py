@@ -0,0 +1,147 @@
+"""
+Checks that the ETL entry points import quickly and without side effects.
+
+Each module is imported in a fresh interpreter with network connections
+disabled, and fails the check if importing it takes longer than the budget,
+opens a connection, or loads one of the heavy libraries that must wait for
+first use (pandas, SQLAlchemy, geoalchemy2, pymongo, the MySQL driver):
+
+    python scripts/check_import_time.py
+    python scripts/check_import_time.py --budget-ms 150
+
+The DAG file is only checked when Airflow is installed; Airflow itself is
+imported before timing starts, so only the DAG's own cost is measured. The
+declared table graph is also compared with the model ForeignKeys, which is
+what keeps building it free of SQLAlchemy.
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "../"))
+# Add the parent directory to the system path to import the ETL modules
+sys.path.append(ROOT)
+
+# (module, modules imported before timing starts)
+ENTRY_POINTS = [
+    ("etl.table_graph", []),
+    ("etl.extract", []),
+    ("etl.etl_pipeline", []),
+    ("etl.__main__", []),
+    ("dags.etl_pipeline_dag", ["airflow", "airflow.operators.python"]),
+]
+HEAVY_MODULES = ["pandas", "sqlalchemy", "geoalchemy2", "pymongo", "mysql.connector"]
+
+# Runs in the child interpreter: times one import and reports what it loaded
+PROBE = """
+import importlib, json, socket, sys, time
+
+for name in {preload!r}:
+    importlib.import_module(name)
+before = set(sys.modules)
+
+def refuse(*args, **kwargs):
+    raise RuntimeError("network connection attempted during import")
+
+socket.socket.connect = refuse
+socket.socket.connect_ex = refuse
+
+error = None
+start = time.perf_counter()
+try:
+    importlib.import_module({module!r})
+except Exception as e:
+    error = f"{{type(e).__name__}}: {{e}}"
+seconds = time.perf_counter() - start
+print(json.dumps({{
+    "seconds": seconds,
+    "loaded": sorted(set(sys.modules) - before),
+    "error": error,
+}}))
+"""
+
+
+def measure_import(module, preload, runs):
+    """Imports `module` in `runs` fresh interpreters, keeping the fastest run."""
+    results = []
+    for _ in range(runs):
+        completed = subprocess.run(
+            [sys.executable, "-c", PROBE.format(module=module, preload=preload)],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+        )
+        if completed.returncode != 0:
+            return {"seconds": None, "loaded": [], "error": completed.stderr.strip()}
+        results.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+    return min(results, key=lambda result: result["seconds"])
+
+
+def check_table_graph():
+    """Lists the tables whose declared references differ from the models'."""
+    from etl.table_graph import TABLE_REFERENCES, model_references
+
+    references = model_references()
+    return [
+        f"{table}: declared {sorted(TABLE_REFERENCES.get(table, ()))}, "
+        f"models {sorted(references.get(table, ()))}"
+        for table in sorted(set(references) | set(TABLE_REFERENCES))
+        if TABLE_REFERENCES.get(table) != references.get(table)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=300,
+        help="Maximum import time per entry point (default: 300)",
+    )
+    parser.add_argument(
+        "--runs", type=int, default=3, help="Imports per module; the fastest counts"
+    )
+    args = parser.parse_args()
+
+    failures = []
+    for module, preload in ENTRY_POINTS:
+        if preload and importlib.util.find_spec(preload[0]) is None:
+            print(f"{module:24} skipped ({preload[0]} is not installed)")
+            continue
+        result = measure_import(module, preload, args.runs)
+        if result["error"]:
+            failures.append(f"{module}: {result['error']}")
+            print(f"{module:24} failed")
+            continue
+        milliseconds = result["seconds"] * 1000
+        heavy = [
+            name
+            for name in result["loaded"]
+            if name.split(".")[0] in HEAVY_MODULES or name in HEAVY_MODULES
+        ]
+        print(f"{module:24} {milliseconds:8.1f} ms")
+        if milliseconds > args.budget_ms:
+            failures.append(
+                f"{module}: {milliseconds:.1f} ms, budget {args.budget_ms} ms"
+            )
+        if heavy:
+            roots = sorted({name.split(".")[0] for name in heavy})
+            failures.append(f"{module}: imports {', '.join(roots)}")
+
+    failures += check_table_graph()
+    if failures:
+        print("Import check failed:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+    print(f"All entry points import within {args.budget_ms:g} ms")
+
+
+if __name__ == "__main__":
+    main()
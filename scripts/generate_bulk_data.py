@@ -0,0 +1,405 @@
+"""
+High-volume synthetic data generator for load testing.
+
+Unlike create_dummy_data, which saves every document through mongoengine,
+this builds dimension pools up front and generates orders and trackers in
+vectorised batches. Output goes to MongoDB with unordered `insert_many`, or
+to mongoexport-format JSON lines files readable through ETL_SOURCE_DIR:
+
+    python scripts/generate_bulk_data.py --orders 1000000 --output-dir data/bulk
+    python scripts/generate_bulk_data.py --orders 100000 --mongo --skew 1.2
+
+Receivers and stars are picked with a Zipf-like skew, so a few of them own
+most orders as in production; --skew 0 picks uniformly.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+from bson import ObjectId
+
+# Add the parent directory to the system path to import the project modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+
+FIRST_NAMES = ["Ahmed", "Omar", "Youssef", "Karim", "Mohamed", "Ali", "Hassan"]
+LAST_NAMES = ["Hesham", "Mostafa", "Khaled", "Mahmoud", "Saeed", "Gamal", "Tarek"]
+CITY_NAMES = [
+    "Cairo",
+    "Alexandria",
+    "Giza",
+    "Luxor",
+    "Aswan",
+    "Mansoura",
+    "Suez",
+    "Hurghada",
+    "Port Said",
+    "Damietta",
+    "Ismailia",
+    "Faiyum",
+    "Zagazig",
+    "Asyut",
+    "Sohag",
+    "Tanta",
+    "Minya",
+    "Qena",
+    "Beni Suef",
+    "Damanhur",
+]
+START_DATE = datetime(2024, 1, 1)
+
+
+def _object_ids(seconds: np.ndarray, rng: np.random.Generator) -> List[ObjectId]:
+    """Builds ObjectIds whose embedded timestamps match `seconds` since epoch."""
+    raw = np.zeros((len(seconds), 12), dtype=np.uint8)
+    raw[:, :4] = seconds.astype(">u4").view(np.uint8).reshape(-1, 4)
+    raw[:, 4:] = rng.integers(0, 256, size=(len(seconds), 8), dtype=np.uint8)
+    return [ObjectId(row.tobytes()) for row in raw]
+
+
+def _datetimes(seconds: np.ndarray) -> List[datetime]:
+    """Converts seconds since epoch to naive UTC datetimes, as pymongo returns."""
+    return seconds.astype("datetime64[s]").tolist()
+
+
+def _popularity(pool_size: int, skew: float):
+    """Probability of picking each pool index, proportional to 1 / rank ** skew."""
+    if skew <= 0:
+        return None
+    weights = 1.0 / np.arange(1, pool_size + 1) ** skew
+    return weights / weights.sum()
+
+
+class BulkDataGenerator:
+    """
+    Generates source documents shaped like data/source_sample.
+
+    Dimension documents (country, cities, zones, receivers, stars) are
+    created once and referenced by ObjectId from every order. Order `_id`s
+    embed their creation time, so `_id` order follows `createdAt` as it
+    does in MongoDB.
+    """
+
+    def __init__(
+        self,
+        orders: int,
+        cities: int = len(CITY_NAMES),
+        zones: int = 50,
+        receivers: int = None,
+        stars: int = None,
+        skew: float = 1.1,
+        span_days: int = 365,
+        seed: int = 0,
+    ):
+        """
+        Args:
+            orders: Number of orders (and trackers) to generate
+            cities: Number of cities
+            zones: Number of zones
+            receivers: Number of receivers (default: half the orders)
+            stars: Number of stars (default: one per 100 orders)
+            skew: Zipf exponent of receiver and star popularity (0: uniform)
+            span_days: Period the order creation times are spread over
+            seed: Seed of the random generator
+        """
+        self.orders = orders
+        self.skew = skew
+        self.span_seconds = span_days * 86400
+        self.rng = np.random.default_rng(seed)
+        self.sizes = {
+            "country": 1,
+            "city": cities,
+            "zone": zones,
+            "receiver": receivers or max(1, orders // 2),
+            "star": stars or max(1, orders // 100),
+        }
+        self._start = int((START_DATE - datetime(1970, 1, 1)).total_seconds())
+        self.dimensions = self._build_dimensions()
+
+    def _timestamps(self, count: int) -> np.ndarray:
+        return np.sort(self._start + self.rng.integers(0, self.span_seconds, count))
+
+    def _phones(self, count: int) -> List[str]:
+        prefixes = self.rng.integers(0, 3, count)
+        numbers = self.rng.integers(100000000, 999999999, count)
+        return [f"01{prefix}{number}" for prefix, number in zip(prefixes, numbers)]
+
+    def _build_dimensions(self) -> Dict[str, List[Dict]]:
+        seconds = {name: self._timestamps(size) for name, size in self.sizes.items()}
+        created = {name: _datetimes(values) for name, values in seconds.items()}
+        ids = {name: _object_ids(values, self.rng) for name, values in seconds.items()}
+
+        def documents(name, fields):
+            return [
+                {"_id": _id, **values, "createdAt": at, "updatedAt": at}
+                for _id, values, at in zip(ids[name], fields, created[name])
+            ]
+
+        first = self.rng.integers(0, len(FIRST_NAMES), self.sizes["receiver"])
+        last = self.rng.integers(0, len(LAST_NAMES), self.sizes["receiver"])
+        star_first = self.rng.integers(0, len(FIRST_NAMES), self.sizes["star"])
+        star_last = self.rng.integers(0, len(LAST_NAMES), self.sizes["star"])
+        return {
+            "country": documents("country", [{"name": "Egypt", "code": "EG"}]),
+            "city": documents(
+                "city",
+                [
+                    {"name": CITY_NAMES[i] if i < len(CITY_NAMES) else f"City-{i + 1}"}
+                    for i in range(self.sizes["city"])
+                ],
+            ),
+            "zone": documents(
+                "zone", [{"name": f"Zone-{i + 1}"} for i in range(self.sizes["zone"])]
+            ),
+            "receiver": documents(
+                "receiver",
+                [
+                    {
+                        "firstName": FIRST_NAMES[f],
+                        "lastName": LAST_NAMES[l],
+                        "phone": phone,
+                    }
+                    for f, l, phone in zip(
+                        first, last, self._phones(self.sizes["receiver"])
+                    )
+                ],
+            ),
+            "star": documents(
+                "star",
+                [
+                    {"name": f"{FIRST_NAMES[f]} {LAST_NAMES[l]}", "phone": phone}
+                    for f, l, phone in zip(
+                        star_first, star_last, self._phones(self.sizes["star"])
+                    )
+                ],
+            ),
+        }
+
+    def order_batches(self, batch_size: int) -> Iterator[Tuple[List[Dict], List[Dict]]]:
+        """
+        Yields (orders, trackers) batches, in `_id` order.
+
+        Random values for a whole batch are drawn as arrays at once; only the
+        final assembly into documents runs per row.
+        """
+        dimension_ids = {
+            name: [document["_id"] for document in documents]
+            for name, documents in self.dimensions.items()
+        }
+        city_names = [document["name"] for document in self.dimensions["city"]]
+        country_id = dimension_ids["country"][0]
+        # Creation times of all orders, so `_id`s increase across batches
+        all_seconds = self._timestamps(self.orders)
+        receiver_popularity = _popularity(self.sizes["receiver"], self.skew)
+        star_popularity = _popularity(self.sizes["star"], self.skew)
+
+        for start in range(0, self.orders, batch_size):
+            seconds = all_seconds[start : start + batch_size]
+            count = len(seconds)
+            rng = self.rng
+            order_ids = _object_ids(seconds, rng)
+            tracker_ids = _object_ids(seconds, rng)
+            created = _datetimes(seconds)
+            updated = _datetimes(seconds + rng.integers(60, 15 * 86400, count))
+            cities = rng.integers(0, self.sizes["city"], count)
+            pickup_zones = rng.integers(0, self.sizes["zone"], count)
+            dropoff_zones = rng.integers(0, self.sizes["zone"], count)
+            receivers = rng.choice(
+                self.sizes["receiver"], size=count, p=receiver_popularity
+            )
+            stars = rng.choice(self.sizes["star"], size=count, p=star_popularity)
+            amounts = rng.integers(300, 500, count)
+            collected = rng.integers(300, 500, count)
+            paid_back = rng.random(count) < 0.3
+            confirmed = rng.random(count) < 0.6
+            sms_trials = rng.integers(0, 4, count)
+            floors = rng.integers(1, 11, count)
+            apartments = rng.integers(1, 51, count)
+            streets = rng.integers(10, 51, count)
+            districts = rng.integers(1, 6, count)
+            locations = np.column_stack(
+                [
+                    rng.uniform(29.0, 32.0, count),
+                    rng.uniform(25.0, 31.0, count),
+                    rng.uniform(29.0, 32.0, count),
+                    rng.uniform(25.0, 31.0, count),
+                ]
+            ).tolist()
+
+            orders, trackers = [], []
+            for i in range(count):
+                city_name = city_names[cities[i]]
+                city_id = dimension_ids["city"][cities[i]]
+                order_number = f"{start + i + 1:09d}"
+                orders.append(
+                    {
+                        "_id": order_ids[i],
+                        "cod": {
+                            "amount": int(amounts[i]),
+                            "isPaidBack": bool(paid_back[i]),
+                            "collectedAmount": int(collected[i]),
+                        },
+                        "collectedFromBusiness": created[i],
+                        "confirmation": {
+                            "isConfirmed": bool(confirmed[i]),
+                            "numberOfSmsTrials": int(sms_trials[i]),
+                        },
+                        "dropOffAddress": {
+                            "secondLine": f"{city_name} - District {districts[i]}",
+                            "city": city_id,
+                            "zone": dimension_ids["zone"][dropoff_zones[i]],
+                            "district": f"{city_name} District",
+                            "firstLine": f"{city_name}, Egypt",
+                            "geoLocation": locations[i][2:],
+                        },
+                        "pickupAddress": {
+                            "floor": str(floors[i]),
+                            "apartment": str(apartments[i]),
+                            "secondLine": f"{streets[i]} Random Street, {city_name}",
+                            "city": city_id,
+                            "zone": dimension_ids["zone"][pickup_zones[i]],
+                            "district": city_name,
+                            "firstLine": f"{city_name}, Egypt",
+                            "geoLocation": locations[i][:2],
+                            "country": country_id,
+                        },
+                        "receiver": dimension_ids["receiver"][receivers[i]],
+                        "star": dimension_ids["star"][stars[i]],
+                        "tracker": tracker_ids[i],
+                        "orderId": order_number,
+                        "type": "SEND",
+                        "updatedAt": updated[i],
+                        "createdAt": created[i],
+                    }
+                )
+                trackers.append(
+                    {
+                        "_id": tracker_ids[i],
+                        "orderId": order_number,
+                        "createdAt": created[i],
+                        "updatedAt": updated[i],
+                    }
+                )
+            yield orders, trackers
+
+
+def _extended_json(value):
+    """Encodes the BSON types of generated documents as relaxed extended JSON."""
+    if isinstance(value, ObjectId):
+        return {"$oid": str(value)}
+    if isinstance(value, datetime):
+        return {"$date": value.isoformat(timespec="milliseconds") + "Z"}
+    raise TypeError(f"Cannot encode {type(value).__name__}")
+
+
+class JsonLinesWriter:
+    """Writes collections as mongoexport JSON lines (`<database>.<name>.json`)."""
+
+    def __init__(self, directory: str, database: str):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.database = database
+        self._files = {}
+
+    def write(self, collection_name: str, documents: List[Dict]) -> None:
+        if collection_name not in self._files:
+            path = os.path.join(
+                self.directory, f"{self.database}.{collection_name}.json"
+            )
+            self._files[collection_name] = open(path, "w")
+        self._files[collection_name].writelines(
+            # json.dumps with a default hook is several times faster than json_util
+            json.dumps(document, default=_extended_json) + "\n"
+            for document in documents
+        )
+
+    def close(self) -> None:
+        for export_file in self._files.values():
+            export_file.close()
+
+
+class MongoWriter:
+    """Inserts documents with unordered bulk inserts."""
+
+    def __init__(self, database: str):
+        from connections.mongo_connector import get_mongo_client
+
+        self.database = get_mongo_client()[database]
+
+    def write(self, collection_name: str, documents: List[Dict]) -> None:
+        if documents:
+            self.database[collection_name].insert_many(documents, ordered=False)
+
+    def close(self) -> None:
+        pass
+
+
+def generate(generator: BulkDataGenerator, writer, batch_size: int) -> None:
+    start_time = time.perf_counter()
+    for collection_name, documents in generator.dimensions.items():
+        for start in range(0, len(documents), batch_size):
+            writer.write(collection_name, documents[start : start + batch_size])
+        print(f"Wrote {len(documents)} {collection_name} documents")
+
+    written = 0
+    for orders, trackers in generator.order_batches(batch_size):
+        writer.write("order", orders)
+        writer.write("tracker", trackers)
+        written += len(orders)
+        elapsed = time.perf_counter() - start_time
+        print(f"Wrote {written} orders ({written / elapsed:.0f} orders/s)", end="\r")
+    writer.close()
+    print(f"\nDone in {time.perf_counter() - start_time:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--orders", type=int, default=100000)
+    parser.add_argument("--cities", type=int, default=len(CITY_NAMES))
+    parser.add_argument("--zones", type=int, default=50)
+    parser.add_argument("--receivers", type=int, help="Default: orders / 2")
+    parser.add_argument("--stars", type=int, help="Default: orders / 100")
+    parser.add_argument(
+        "--skew", type=float, default=1.1, help="Zipf exponent, 0 for uniform"
+    )
+    parser.add_argument("--span-days", type=int, default=365)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=10000)
+    output = parser.add_mutually_exclusive_group(required=True)
+    output.add_argument("--output-dir", help="Write mongoexport JSON lines files")
+    output.add_argument("--mongo", action="store_true", help="Insert into MongoDB")
+    parser.add_argument(
+        "--database",
+        default=None,
+        help="Database name (default: MONGO_DATABASE, or logistics for files)",
+    )
+    args = parser.parse_args()
+
+    generator = BulkDataGenerator(
+        orders=args.orders,
+        cities=args.cities,
+        zones=args.zones,
+        receivers=args.receivers,
+        stars=args.stars,
+        skew=args.skew,
+        span_days=args.span_days,
+        seed=args.seed,
+    )
+    if args.mongo:
+        from config.settings import MONGO_DATABASE
+
+        writer = MongoWriter(args.database or MONGO_DATABASE)
+    else:
+        writer = JsonLinesWriter(args.output_dir, args.database or "logistics")
+    generate(generator, writer, args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
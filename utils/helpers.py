@@ -1,6 +1,3 @@
-import requests
-
-
 def load_env():
     """
     Reads development configuration from environment variables
@@ -18,6 +15,8 @@ def load_env():
 
 
 def send_failure_email(context):
+    import requests
+
     config = load_env()
     MAILGUN_API_KEY = config["MAILGUN_API_KEY"]
     MAILGUN_DOMAIN = config["MAILGUN_DOMAIN"]
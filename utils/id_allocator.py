@@ -0,0 +1,399 @@
+import json
+import logging
+import math
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects.mysql import insert
+
+from config.settings import ID_ALLOCATOR_CONFIG
+from connections.sql_connector import get_mysql_engine
+from models.sql.sql_models import IdSequence
+from utils.id_lookup import get_id_lookup_service
+from utils.metrics import BATCH_SECONDS, ID_LOOKUPS
+from utils.sql_data_access import TABLE_MAPPING
+
+logger = logging.getLogger(__name__)
+
+# Constants
+ID_BLOCK_SIZE = 1000
+# Keys remembered per table and key column; older ones are looked up again.
+# Must stay well above the rows in flight between transform and load
+ID_CACHE_SIZE = ID_ALLOCATOR_CONFIG.get("cache_size", 500000)
+# Column, and scoping columns, each table's ids are assigned by in
+# etl.transform (default: mongo_id)
+ALLOCATION_KEYS = {
+    "addresses": ("order_mongo_id", ("type",)),
+    "cod_payments": ("order_id", ()),
+    "confirmations": ("order_id", ()),
+}
+
+
+def id_key(value) -> Optional[str]:
+    """
+    Normalizes a lookup value to the string form used as allocator key.
+
+    Integral floats (what pandas produces for integer columns with gaps) are
+    collapsed to their integer form, and missing values map to None.
+    """
+    if value is None:
+        return None
+    if isinstance(value, float):
+        if math.isnan(value):
+            return None
+        if value.is_integer():
+            return str(int(value))
+    return str(value)
+
+
+class IdAllocator:
+    """
+    Assigns MySQL surrogate ids to rows before they are loaded.
+
+    Ids for new rows are reserved in contiguous blocks through the
+    `id_sequences` table, so child rows can be built with their foreign keys
+    already filled in. Recent assignments are remembered by key, up to
+    `cache_size` keys per table and key column, which lets later transforms
+    resolve foreign keys without a query; older keys are looked up again.
+
+    Lookups and allocations are not atomic across processes, so two
+    workers can give the same new key different ids. The table's unique
+    key decides: the loader writes both rows into one, and
+    `resolve_stored_ids` then replaces the losing id with the stored one.
+    """
+
+    def __init__(
+        self,
+        engine=None,
+        block_size: int = ID_BLOCK_SIZE,
+        cache_size: Optional[int] = ID_CACHE_SIZE,
+    ):
+        """
+        Args:
+            engine: SQLAlchemy engine (default: the MySQL target, on first use)
+            block_size: Ids reserved per round trip to `id_sequences`
+            cache_size: Keys remembered per namespace (None: unbounded)
+        """
+        self._engine = engine
+        self.block_size = block_size
+        self.cache_size = cache_size
+        self._lock = threading.RLock()
+        self._blocks: Dict[str, Tuple[int, int]] = {}
+        self._assigned: Dict[Tuple, "OrderedDict[str, int]"] = {}
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            self._engine = get_mysql_engine()
+        return self._engine
+
+    @staticmethod
+    def _namespace(table_name: str, value_name: str, filters: Dict = None) -> Tuple:
+        return (table_name, value_name, tuple(sorted((filters or {}).items())))
+
+    def remember(
+        self,
+        table_name: str,
+        mapping: Dict[Hashable, int],
+        value_name: str = "mongo_id",
+        filters: Dict = None,
+    ) -> None:
+        """Records known key -> id pairs, e.g. an alternate key of assigned rows."""
+        namespace = self._namespace(table_name, value_name, filters)
+        with self._lock:
+            known = self._assigned.setdefault(namespace, OrderedDict())
+            for key, id_ in mapping.items():
+                key = id_key(key)
+                if key is not None and id_ is not None:
+                    known[key] = int(id_)
+                    known.move_to_end(key)
+            if self.cache_size is not None:
+                while len(known) > self.cache_size:
+                    known.popitem(last=False)
+
+    def _fetch_existing(
+        self, table_name: str, keys: List[str], value_name: str, filters: Dict
+    ) -> Dict[str, int]:
+        """
+        Looks up ids of rows that are already stored in MySQL.
+
+        Goes through the lookup service, so misses of transforms running in
+        other threads at the same time are answered by the same query.
+        """
+        return get_id_lookup_service().lookup(table_name, keys, value_name, filters)
+
+    def lookup(
+        self,
+        table_name: str,
+        keys: Iterable,
+        value_name: str = "mongo_id",
+        filters: Dict = None,
+    ) -> Dict[str, int]:
+        """
+        Resolves keys to ids without allocating new ones.
+
+        Args:
+            table_name: Name of the table the ids belong to
+            keys: Values of `value_name` to resolve
+            value_name: Column the keys are matched against (default: "mongo_id")
+            filters: Optional equality filters that scope the keys (e.g. address type)
+
+        Returns:
+            Dictionary mapping normalized keys to ids, for the keys that exist
+        """
+        namespace = self._namespace(table_name, value_name, filters)
+        wanted = {key for key in map(id_key, keys) if key is not None}
+
+        with self._lock:
+            known = self._assigned.setdefault(namespace, OrderedDict())
+            result = {key: known[key] for key in wanted if key in known}
+            for key in result:
+                known.move_to_end(key)
+        missing = [key for key in wanted if key not in result]
+        ID_LOOKUPS.inc(len(result), table=table_name, result="hit")
+        ID_LOOKUPS.inc(len(missing), table=table_name, result="miss")
+
+        if missing:
+            with BATCH_SECONDS.time(
+                collection=table_name, step=value_name, stage="id_lookup"
+            ):
+                found = self._fetch_existing(table_name, missing, value_name, filters)
+            found = {id_key(key): int(id_) for key, id_ in found.items()}
+            self.remember(table_name, found, value_name, filters)
+            result.update(found)
+        return result
+
+    def assign(
+        self,
+        table_name: str,
+        keys: Iterable,
+        value_name: str = "mongo_id",
+        filters: Dict = None,
+    ) -> Dict[str, int]:
+        """
+        Resolves keys to ids, allocating fresh ids for rows not stored yet.
+
+        Args:
+            table_name: Name of the table the rows are loaded into
+            keys: Values of `value_name` identifying the rows
+            value_name: Column the keys are matched against (default: "mongo_id")
+            filters: Optional equality filters that scope the keys (e.g. address type)
+
+        Returns:
+            Dictionary mapping every normalized key to its id
+        """
+        keys = list(dict.fromkeys(key for key in map(id_key, keys) if key is not None))
+        result = self.lookup(table_name, keys, value_name, filters)
+        new_keys = [key for key in keys if key not in result]
+
+        if new_keys:
+            new_ids = dict(zip(new_keys, self._take(table_name, len(new_keys))))
+            self.remember(table_name, new_ids, value_name, filters)
+            result.update(new_ids)
+        return result
+
+    def resolve_stored_ids(self, conn, table_name: str, records: List[Dict]) -> int:
+        """
+        Replaces remembered ids that lost an allocation race with the stored ones.
+
+        Called after records were upserted: where another process stored the
+        same key first, the table's unique key merged the rows under its id,
+        and children transformed later must reference that one.
+
+        Args:
+            conn: Connection to read the stored ids with
+            table_name: Table the records were written to
+            records: Written records, with their allocation key
+
+        Returns:
+            Number of remembered ids replaced
+        """
+        Model = TABLE_MAPPING.get(table_name)
+        value_name, scope = ALLOCATION_KEYS.get(table_name, ("mongo_id", ()))
+        if Model is None or not records or value_name not in records[0]:
+            return 0
+        # Without a unique key nothing arbitrates, so stored ids may repeat
+        columns = set((value_name, *scope))
+        table = Model.__table__
+        if not any(
+            {column.name for column in index.columns} == columns
+            for index in table.indexes
+            if index.unique
+        ) and not (len(columns) == 1 and table.columns[value_name].unique):
+            return 0
+
+        scopes: Dict[Tuple, set] = {}
+        for record in records:
+            key = id_key(record.get(value_name))
+            if key is not None:
+                scopes.setdefault(tuple(record.get(name) for name in scope), set()).add(
+                    key
+                )
+
+        replaced = 0
+        for scope_values, keys in scopes.items():
+            filters = dict(zip(scope, scope_values)) or None
+            query = select(Model.id, getattr(Model, value_name)).where(
+                getattr(Model, value_name).in_(keys),
+                *[
+                    getattr(Model, name) == value
+                    for name, value in zip(scope, scope_values)
+                ],
+            )
+            stored = {id_key(key): int(id_) for id_, key in conn.execute(query)}
+            namespace = self._namespace(table_name, value_name, filters)
+            with self._lock:
+                known = self._assigned.get(namespace, {})
+                lost = {
+                    key: id_
+                    for key, id_ in stored.items()
+                    if key in known and known[key] != id_
+                }
+            if lost:
+                self.remember(table_name, lost, value_name, filters)
+                replaced += len(lost)
+        if replaced:
+            logger.warning(
+                f"{replaced} {table_name} ids were allocated by another writer "
+                "first; using the stored ids"
+            )
+        return replaced
+
+    def _take(self, table_name: str, count: int) -> List[int]:
+        """Takes `count` ids from the local block, reserving more when needed."""
+        ids = []
+        with self._lock:
+            while len(ids) < count:
+                start, end = self._blocks.get(table_name, (0, 0))
+                if start >= end:
+                    needed = max(count - len(ids), self.block_size)
+                    start, end = self._reserve(table_name, needed)
+                take = min(count - len(ids), end - start)
+                ids.extend(range(start, start + take))
+                self._blocks[table_name] = (start + take, end)
+        return ids
+
+    def _reserve(self, table_name: str, count: int) -> Tuple[int, int]:
+        """
+        Reserves a contiguous range of `count` ids for a table.
+
+        The sequence row is locked for the duration of the transaction, and is
+        never allowed to fall behind ids inserted by other writers.
+
+        Returns:
+            Half-open range (start, end) of reserved ids
+        """
+        Model = TABLE_MAPPING.get(table_name)
+        if not Model:
+            raise ValueError(f"Invalid table name provided: {table_name}")
+
+        with self.engine.begin() as conn:
+            conn.execute(
+                insert(IdSequence)
+                .prefix_with("IGNORE")
+                .values(table_name=table_name, next_id=1)
+            )
+            next_id = conn.execute(
+                select(IdSequence.next_id)
+                .where(IdSequence.table_name == table_name)
+                .with_for_update()
+            ).scalar_one()
+            max_id = conn.execute(select(func.coalesce(func.max(Model.id), 0))).scalar()
+
+            start = max(int(next_id), int(max_id) + 1)
+            end = start + count
+            conn.execute(
+                update(IdSequence)
+                .where(IdSequence.table_name == table_name)
+                .values(next_id=end)
+            )
+        return start, end
+
+
+class LocalIdAllocator(IdAllocator):
+    """
+    Id allocator kept entirely in memory, for runs without a MySQL target.
+
+    Nothing is looked up in or reserved through the database, so ids are
+    only unique within this process (benchmarks, file exports), unless the
+    id map is saved and loaded again by the next run.
+    """
+
+    def __init__(self, block_size: int = ID_BLOCK_SIZE):
+        # The map is the only record of the ids, so nothing is evicted
+        super().__init__(block_size=block_size, cache_size=None)
+        self._next_ids: Dict[str, int] = {}
+
+    def save(self, path: str) -> None:
+        """Writes every assigned id and the next free id of each table to `path`."""
+        with self._lock:
+            state = {
+                "next_ids": dict(self._next_ids),
+                "assigned": [
+                    [table_name, value_name, [list(item) for item in filters], known]
+                    for (table_name, value_name, filters), known in (
+                        self._assigned.items()
+                    )
+                ],
+            }
+        with open(f"{path}.tmp", "w") as state_file:
+            json.dump(state, state_file)
+        os.replace(f"{path}.tmp", path)
+
+    def load(self, path: str) -> None:
+        """Restores an id map written by `save`, so a later run reuses its ids."""
+        with open(path) as state_file:
+            state = json.load(state_file)
+        with self._lock:
+            self._next_ids.update(state["next_ids"])
+            # Unused ids of the saved run's blocks are skipped
+            self._blocks.clear()
+            for table_name, value_name, filters, known in state["assigned"]:
+                namespace = (
+                    table_name,
+                    value_name,
+                    tuple(tuple(item) for item in filters),
+                )
+                self._assigned.setdefault(namespace, OrderedDict()).update(known)
+
+    def _fetch_existing(
+        self, table_name: str, keys: List[str], value_name: str, filters: Dict
+    ) -> Dict[str, int]:
+        return {}
+
+    def resolve_stored_ids(self, conn, table_name: str, records: List[Dict]) -> int:
+        return 0
+
+    def _reserve(self, table_name: str, count: int) -> Tuple[int, int]:
+        start = self._next_ids.get(table_name, 1)
+        self._next_ids[table_name] = start + count
+        return start, start + count
+
+
+_allocator: Optional[IdAllocator] = None
+_allocator_lock = threading.Lock()
+
+
+def get_id_allocator() -> IdAllocator:
+    """Returns the process-wide id allocator, creating it on first use."""
+    global _allocator
+    with _allocator_lock:
+        if _allocator is None:
+            _allocator = IdAllocator()
+        return _allocator
+
+
+def resolve_after_commit(conn, table_name: str, records: List[Dict]) -> None:
+    """Post-commit hook: adopts the stored ids of keys another writer won."""
+    get_id_allocator().resolve_stored_ids(conn, table_name, records)
+    conn.rollback()
+
+
+def set_id_allocator(allocator: IdAllocator) -> None:
+    """Replaces the process-wide id allocator (e.g. with an in-memory one)."""
+    global _allocator
+    with _allocator_lock:
+        _allocator = allocator
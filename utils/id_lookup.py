@@ -0,0 +1,213 @@
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import bindparam, select
+
+from config.settings import ID_LOOKUP_CONFIG
+from connections.sql_connector import get_mysql_engine
+from utils.metrics import ID_LOOKUP_QUERIES
+from utils.sql_data_access import TABLE_MAPPING
+
+logger = logging.getLogger(__name__)
+
+# Requests for the same table arriving within this window share one query
+LOOKUP_WINDOW_MS = ID_LOOKUP_CONFIG.get("window_ms", 5)
+# Larger key sets are sent as several queries, keeping IN lists bounded
+MAX_KEYS_PER_QUERY = ID_LOOKUP_CONFIG.get("max_keys_per_query", 5000)
+# Queries for different tables run concurrently on this many pooled connections
+LOOKUP_CONNECTIONS = ID_LOOKUP_CONFIG.get("connections", 2)
+
+Namespace = Tuple[str, str, Tuple]
+
+
+class IdLookupError(Exception):
+    """Raised when the lookup service cannot accept or answer a request."""
+
+    pass
+
+
+class IdLookupService:
+    """
+    Resolves keys to MySQL ids for concurrent callers with as few queries as possible.
+
+    Callers submit key sets and get futures back. Requests for the same
+    table, key column and filters that arrive within the coalescing window
+    are merged into one query, which runs on a pooled connection of the
+    shared engine rather than on a session shared between threads. Each
+    namespace's statement is built once with an expanding IN parameter, so
+    SQLAlchemy compiles it once and reuses it for every key list.
+    """
+
+    def __init__(
+        self,
+        engine=None,
+        window_ms: float = LOOKUP_WINDOW_MS,
+        max_keys_per_query: int = MAX_KEYS_PER_QUERY,
+        connections: int = LOOKUP_CONNECTIONS,
+    ):
+        """
+        Args:
+            engine: SQLAlchemy engine (default: the MySQL target, on first query)
+            window_ms: How long a request waits for others to join its query
+            max_keys_per_query: Keys per query; larger merged sets are split
+            connections: Queries for different tables run in parallel
+        """
+        self._engine = engine
+        self.window = window_ms / 1000
+        self.max_keys_per_query = max_keys_per_query
+        self._statements: Dict[Namespace, object] = {}
+        self._pending: Dict[Namespace, List[Tuple[set, Future]]] = {}
+        self._deadlines: Dict[Namespace, float] = {}
+        self._condition = threading.Condition()
+        self._closed = False
+        self._queries = ThreadPoolExecutor(
+            max_workers=connections, thread_name_prefix="id-lookup"
+        )
+        self._dispatcher = threading.Thread(
+            target=self._dispatch, name="id-lookup-dispatcher", daemon=True
+        )
+        self._dispatcher.start()
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            self._engine = get_mysql_engine()
+        return self._engine
+
+    def submit(
+        self,
+        table_name: str,
+        keys: Iterable[str],
+        value_name: str = "mongo_id",
+        filters: Dict = None,
+    ) -> Future:
+        """
+        Queues a lookup, returning a future of the id of every key that exists.
+
+        Args:
+            table_name: Name of the table to query
+            keys: Values of `value_name` to resolve
+            value_name: Column the keys are matched against (default: "mongo_id")
+            filters: Optional equality filters that scope the keys
+
+        Returns:
+            Future resolving to a dictionary mapping found keys to ids
+
+        Raises:
+            ValueError: If table_name is invalid
+            IdLookupError: If the service has been closed
+        """
+        if table_name not in TABLE_MAPPING:
+            raise ValueError(f"Invalid table name provided: {table_name}")
+        future = Future()
+        keys = {str(key) for key in keys}
+        if not keys:
+            future.set_result({})
+            return future
+
+        namespace = (table_name, value_name, tuple(sorted((filters or {}).items())))
+        with self._condition:
+            if self._closed:
+                raise IdLookupError("Id lookup service is closed")
+            requests = self._pending.setdefault(namespace, [])
+            requests.append((keys, future))
+            if namespace not in self._deadlines:
+                self._deadlines[namespace] = time.monotonic() + self.window
+            if sum(len(request_keys) for request_keys, _ in requests) >= (
+                self.max_keys_per_query
+            ):
+                # A full query gains nothing from waiting
+                self._deadlines[namespace] = 0
+            self._condition.notify()
+        return future
+
+    def lookup(
+        self,
+        table_name: str,
+        keys: Iterable[str],
+        value_name: str = "mongo_id",
+        filters: Dict = None,
+    ) -> Dict[str, int]:
+        """Blocking form of `submit`."""
+        return self.submit(table_name, keys, value_name, filters).result()
+
+    def close(self) -> None:
+        """Answers the queued requests, then stops the service."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._dispatcher.join()
+        self._queries.shutdown(wait=True)
+
+    def _dispatch(self) -> None:
+        """Hands each namespace's merged requests to a query thread once its window ends."""
+        while True:
+            with self._condition:
+                while not self._pending and not self._closed:
+                    self._condition.wait()
+                if not self._pending:
+                    return
+                namespace = min(self._deadlines, key=self._deadlines.get)
+                remaining = self._deadlines[namespace] - time.monotonic()
+                if remaining > 0 and not self._closed:
+                    self._condition.wait(remaining)
+                    continue
+                requests = self._pending.pop(namespace)
+                del self._deadlines[namespace]
+            self._queries.submit(self._answer, namespace, requests)
+
+    def _statement(self, namespace: Namespace):
+        statement = self._statements.get(namespace)
+        if statement is None:
+            table_name, value_name, filters = namespace
+            Model = TABLE_MAPPING[table_name]
+            column = getattr(Model, value_name)
+            statement = select(column, Model.id).where(
+                column.in_(bindparam("keys", expanding=True)),
+                *[getattr(Model, name) == value for name, value in filters],
+            )
+            self._statements[namespace] = statement
+        return statement
+
+    def _answer(self, namespace: Namespace, requests: List[Tuple[set, Future]]) -> None:
+        """Runs one merged lookup and resolves every request's future from it."""
+        keys = sorted(set().union(*(request_keys for request_keys, _ in requests)))
+        try:
+            statement = self._statement(namespace)
+            found = {}
+            with self.engine.connect() as conn:
+                for start in range(0, len(keys), self.max_keys_per_query):
+                    chunk = keys[start : start + self.max_keys_per_query]
+                    found.update(
+                        (str(value), id_)
+                        for value, id_ in conn.execute(statement, {"keys": chunk})
+                    )
+                    ID_LOOKUP_QUERIES.inc(table=namespace[0])
+        except Exception as e:
+            logger.error(f"Id lookup on {namespace[0]} failed: {e}")
+            for _, future in requests:
+                future.set_exception(e)
+            return
+
+        logger.debug(
+            f"Resolved {len(requests)} id lookups on {namespace[0]} "
+            f"({len(keys)} keys) together"
+        )
+        for request_keys, future in requests:
+            future.set_result({key: found[key] for key in request_keys if key in found})
+
+
+_service: Optional[IdLookupService] = None
+_service_lock = threading.Lock()
+
+
+def get_id_lookup_service() -> IdLookupService:
+    """Returns the process-wide id lookup service, starting it on first use."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = IdLookupService()
+        return _service
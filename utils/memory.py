@@ -0,0 +1,278 @@
+import atexit
+import logging
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from typing import Any, Iterable, Iterator, List, Optional
+
+from config.settings import MEMORY_CONFIG
+from utils.metrics import RESIDENT_BYTES, SPILLED_BYTES
+
+logger = logging.getLogger(__name__)
+
+# Resident memory allowed before batches spill (None: a share of the container)
+BUDGET_MB = MEMORY_CONFIG.get("budget_mb")
+# Share of the container's memory limit used when no budget is configured
+CONTAINER_FRACTION = MEMORY_CONFIG.get("container_fraction", 0.8)
+# Share of the budget resident memory must fall below before spilling stops
+LOW_WATER_FRACTION = MEMORY_CONFIG.get("low_water_fraction", 0.9)
+SPILL_DIR = MEMORY_CONFIG.get("spill_dir", "data/spill")
+# zlib level of spilled segments; 1 is several times faster than the default
+COMPRESSION_LEVEL = MEMORY_CONFIG.get("compression_level", 1)
+# Seconds a resident memory sample is reused for
+SAMPLE_INTERVAL = MEMORY_CONFIG.get("sample_interval", 0.5)
+# cgroup v2, then v1
+CGROUP_LIMIT_FILES = [
+    "/sys/fs/cgroup/memory.max",
+    "/sys/fs/cgroup/memory/memory.limit_in_bytes",
+]
+# cgroup v1 reports "no limit" as a huge number
+UNLIMITED = 1 << 60
+
+
+def resident_bytes() -> int:
+    """Current resident set size of the process."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+
+        # Only the peak is available outside Linux; kilobytes except on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def container_limit() -> Optional[int]:
+    """Memory limit of the container the process runs in, or None."""
+    for path in CGROUP_LIMIT_FILES:
+        try:
+            with open(path) as limit_file:
+                value = limit_file.read().strip()
+        except OSError:
+            continue
+        if value.isdigit() and int(value) < UNLIMITED:
+            return int(value)
+        return None
+    return None
+
+
+class MemoryBudget:
+    """
+    Global limit on the pipeline's resident memory.
+
+    Resident memory is sampled from the OS at most every `sample_interval`
+    seconds, so checking the budget before queueing every batch is cheap.
+    Stages holding batches check it and spill them to disk while it is
+    exceeded (see `spill` and `SpillableList`). Once over the limit, the
+    budget stays exceeded until resident memory falls below a low-water
+    mark, so batches do not flip between memory and disk while it hovers
+    around the limit.
+    """
+
+    def __init__(
+        self,
+        limit_bytes: Optional[int],
+        sample_interval: float = SAMPLE_INTERVAL,
+        low_water_fraction: float = LOW_WATER_FRACTION,
+    ):
+        """
+        Args:
+            limit_bytes: Resident bytes allowed (None: never exceeded)
+            sample_interval: Seconds a resident memory sample is reused for
+            low_water_fraction: Share of `limit_bytes` resident memory must
+                fall below before an exceeded budget is met again
+        """
+        self.limit_bytes = limit_bytes
+        self.low_water_bytes = (
+            None if limit_bytes is None else int(limit_bytes * low_water_fraction)
+        )
+        self.sample_interval = sample_interval
+        self._sample = 0
+        self._sampled_at = float("-inf")
+        self._exceeded = False
+        self._lock = threading.Lock()
+
+    def resident(self) -> int:
+        """Returns the latest resident memory sample, refreshing it when stale."""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._sampled_at >= self.sample_interval:
+                self._sample = resident_bytes()
+                self._sampled_at = now
+                RESIDENT_BYTES.set(self._sample)
+            return self._sample
+
+    def exceeded(self) -> bool:
+        if self.limit_bytes is None:
+            return False
+        resident = self.resident()
+        with self._lock:
+            threshold = self.low_water_bytes if self._exceeded else self.limit_bytes
+            self._exceeded = resident > threshold
+            return self._exceeded
+
+
+_spill_dir = None
+_spill_lock = threading.Lock()
+
+
+def _spill_directory() -> str:
+    """This process's spill directory, removed again when the process exits."""
+    global _spill_dir
+    with _spill_lock:
+        if _spill_dir is None:
+            os.makedirs(SPILL_DIR, exist_ok=True)
+            _spill_dir = tempfile.mkdtemp(prefix=f"etl-{os.getpid()}-", dir=SPILL_DIR)
+            atexit.register(shutil.rmtree, _spill_dir, ignore_errors=True)
+        return _spill_dir
+
+
+class SpilledBatch:
+    """A batch pickled into a compressed segment file, read back on demand."""
+
+    def __init__(
+        self, path: str, size: int, rows: int, raw_size: int, shared: bool = False
+    ):
+        """
+        Args:
+            path: Segment file
+            size: Compressed bytes of the segment
+            rows: Documents or rows of the batch
+            raw_size: Pickled bytes of the batch before compression
+            shared: The segment belongs to a `SpillableList` read by several
+                consumers, so readers must not remove it
+        """
+        self.path = path
+        self.size = size
+        self.rows = rows
+        self.raw_size = raw_size
+        self.shared = shared
+
+    def load(self, remove: bool = False) -> Any:
+        """
+        Reads the batch back.
+
+        Args:
+            remove: Delete the segment, for batches read only once
+        """
+        with open(self.path, "rb") as segment:
+            batch = pickle.loads(zlib.decompress(segment.read()))
+        if remove:
+            self.remove()
+        return batch
+
+    def remove(self) -> None:
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def spill(batch: Any, shared: bool = False) -> SpilledBatch:
+    """Writes a batch (documents or a DataFrame) to a compressed segment file."""
+    pickled = pickle.dumps(batch, protocol=pickle.HIGHEST_PROTOCOL)
+    data = zlib.compress(pickled, COMPRESSION_LEVEL)
+    descriptor, path = tempfile.mkstemp(suffix=".spill", dir=_spill_directory())
+    with os.fdopen(descriptor, "wb") as segment:
+        segment.write(data)
+    SPILLED_BYTES.inc(len(data))
+    return SpilledBatch(path, len(data), len(batch), len(pickled), shared)
+
+
+class SpillableList:
+    """
+    Append-only list of batches that moves to disk while the budget is exceeded.
+
+    Once the budget is exceeded, the batches held in memory and every
+    further one are spilled, so memory stays bounded however many batches
+    are added. Iterating reads spilled batches back one at a time, in
+    order, and can be repeated by several consumers; `batches` hands out
+    the segments themselves, for consumers that read them back later.
+    `close` deletes the segments.
+    """
+
+    def __init__(self, batches: Iterable = (), budget: MemoryBudget = None):
+        self.budget = budget or get_memory_budget()
+        self._items: List[Any] = []
+        self._lock = threading.Lock()
+        self.extend(batches)
+
+    def append(self, batch: Any) -> None:
+        if self.budget.exceeded():
+            with self._lock:
+                resident = [
+                    position
+                    for position, item in enumerate(self._items)
+                    if not isinstance(item, SpilledBatch)
+                ]
+            if resident:
+                logger.info(f"Memory budget exceeded, spilling {len(resident)} batches")
+            for position in resident:
+                spilled = spill(self._items[position], shared=True)
+                with self._lock:
+                    self._items[position] = spilled
+            batch = spill(batch, shared=True)
+        with self._lock:
+            self._items.append(batch)
+
+    def extend(self, batches: Iterable) -> None:
+        for batch in batches:
+            self.append(batch)
+
+    def spilled(self) -> int:
+        """Number of batches currently on disk."""
+        with self._lock:
+            return sum(isinstance(item, SpilledBatch) for item in self._items)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def batches(self) -> Iterator[Any]:
+        """Yields the batches as stored: in memory, or as `SpilledBatch` segments."""
+        with self._lock:
+            items = list(self._items)
+        yield from items
+
+    def __iter__(self) -> Iterator[Any]:
+        for item in self.batches():
+            yield item.load() if isinstance(item, SpilledBatch) else item
+
+    def close(self) -> None:
+        with self._lock:
+            items, self._items = self._items, []
+        for item in items:
+            if isinstance(item, SpilledBatch):
+                item.remove()
+
+
+def create_memory_budget() -> MemoryBudget:
+    """Budget of `MEMORY.budget_mb`, or `container_fraction` of the container limit."""
+    if BUDGET_MB is not None:
+        return MemoryBudget(int(BUDGET_MB * 1024 * 1024))
+    limit = container_limit()
+    if limit is None:
+        return MemoryBudget(None)
+    return MemoryBudget(int(limit * CONTAINER_FRACTION))
+
+
+_budget = None
+_budget_lock = threading.Lock()
+
+
+def get_memory_budget() -> MemoryBudget:
+    """Returns the process-wide memory budget, creating it on first use."""
+    global _budget
+    with _budget_lock:
+        if _budget is None:
+            _budget = create_memory_budget()
+            if _budget.limit_bytes is not None:
+                logger.info(
+                    f"Memory budget: {_budget.limit_bytes // (1024 * 1024)} MB resident"
+                )
+        return _budget
@@ -0,0 +1,316 @@
+import atexit
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+from config.settings import METRICS_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds, from sub-millisecond lookups to multi-minute loads
+DEFAULT_BUCKETS = (
+    0.001,
+    0.005,
+    0.01,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    300.0,
+)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key: LabelKey, extra: Dict[str, str] = None) -> str:
+    pairs = list(key) + sorted((extra or {}).items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Metric:
+    """Base class for labelled metrics"""
+
+    type_name = "untyped"
+
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self._lock = threading.Lock()
+        self._values: Dict[LabelKey, float] = {}
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        return [
+            f"{self.name}{_format_labels(key)} {value}" for key, value in values.items()
+        ]
+
+    def snapshot(self) -> List[Dict]:
+        with self._lock:
+            return [
+                {"labels": dict(key), "value": value}
+                for key, value in self._values.items()
+            ]
+
+
+class Counter(Metric):
+    type_name = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    type_name = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+
+class Histogram(Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, description: str, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, description)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelKey, Dict] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+                self._series[key] = series
+            position = bisect.bisect_left(self.buckets, value)
+            if position < len(self.buckets):
+                series["counts"][position] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observes the wall time of the enclosed block."""
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start_time, **labels)
+
+    def render(self) -> List[str]:
+        lines = []
+        with self._lock:
+            series = {key: dict(value) for key, value in self._series.items()}
+        for key, values in series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, values["counts"]):
+                cumulative += count
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(key, {'le': str(bound)})} {cumulative}"
+                )
+            lines.append(
+                f"{self.name}_bucket{_format_labels(key, {'le': '+Inf'})} {values['count']}"
+            )
+            lines.append(f"{self.name}_sum{_format_labels(key)} {values['sum']}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {values['count']}")
+        return lines
+
+    def snapshot(self) -> List[Dict]:
+        with self._lock:
+            return [
+                {
+                    "labels": dict(key),
+                    "count": values["count"],
+                    "sum": values["sum"],
+                    "buckets": dict(zip(map(str, self.buckets), values["counts"])),
+                }
+                for key, values in self._series.items()
+            ]
+
+
+class MetricsRegistry:
+    """Holds the pipeline metrics and renders them for export."""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric_class, name: str, description: str, **kwargs):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = metric_class(name, description, **kwargs)
+            return self._metrics[name]
+
+    def counter(self, name: str, description: str) -> Counter:
+        return self._register(Counter, name, description)
+
+    def gauge(self, name: str, description: str) -> Gauge:
+        return self._register(Gauge, name, description)
+
+    def histogram(self, name: str, description: str, **kwargs) -> Histogram:
+        return self._register(Histogram, name, description, **kwargs)
+
+    def render_prometheus(self) -> str:
+        """Renders every metric in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.description}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> Dict:
+        """Returns every metric as a JSON-serialisable dictionary."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {
+            "timestamp": time.time(),
+            "metrics": {
+                metric.name: {"type": metric.type_name, "series": metric.snapshot()}
+                for metric in metrics
+            },
+        }
+
+
+REGISTRY = MetricsRegistry()
+
+ROWS = REGISTRY.counter("etl_rows_total", "Rows handled per collection and stage")
+BYTES = REGISTRY.counter("etl_bytes_total", "Bytes handled per collection and stage")
+BATCH_SECONDS = REGISTRY.histogram(
+    "etl_batch_seconds", "Per-batch latency per collection and stage"
+)
+QUEUE_DEPTH = REGISTRY.gauge("etl_queue_depth", "Batches waiting between stages")
+ID_LOOKUPS = REGISTRY.counter(
+    "etl_id_lookups_total", "Id lookups per table, by cache hit or miss"
+)
+ID_LOOKUP_QUERIES = REGISTRY.counter(
+    "etl_id_lookup_queries_total", "Id lookup queries per table, after coalescing"
+)
+TABLE_SECONDS = REGISTRY.gauge(
+    "etl_table_seconds", "Wall time of the last load of each table"
+)
+FUNCTION_SECONDS = REGISTRY.histogram(
+    "etl_function_seconds", "Wall time of instrumented functions"
+)
+INVALID_DOCUMENTS = REGISTRY.counter(
+    "etl_invalid_documents_total", "Source documents rejected by validation"
+)
+RESIDENT_BYTES = REGISTRY.gauge("etl_resident_bytes", "Resident memory of the process")
+SPILLED_BYTES = REGISTRY.counter(
+    "etl_spilled_bytes_total", "Compressed bytes of batches spilled to disk"
+)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = REGISTRY.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(f"Metrics request: {format % args}")
+
+
+def start_http_server(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Serves the registry at http://host:port/metrics from a daemon thread."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(
+        target=server.serve_forever, name="metrics-http", daemon=True
+    ).start()
+    logger.info(f"Serving Prometheus metrics on {host}:{port}/metrics")
+    return server
+
+
+def write_snapshot(path: str) -> None:
+    """Atomically writes a JSON snapshot of the registry to `path`."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w") as snapshot_file:
+        json.dump(REGISTRY.snapshot(), snapshot_file, indent=2)
+    os.replace(temp_path, path)
+
+
+def start_snapshot_writer(path: str, interval: float = 30) -> threading.Thread:
+    """
+    Writes a JSON snapshot every `interval` seconds from a daemon thread.
+
+    A last snapshot is written at exit, so short runs and the final
+    interval of long ones are not lost.
+    """
+
+    def write():
+        try:
+            write_snapshot(path)
+        except OSError as e:
+            logger.warning(f"Failed to write metrics snapshot: {e}")
+
+    def run():
+        while True:
+            time.sleep(interval)
+            write()
+
+    atexit.register(write)
+    thread = threading.Thread(target=run, name="metrics-snapshot", daemon=True)
+    thread.start()
+    return thread
+
+
+_exporters_started = False
+_exporters_lock = threading.Lock()
+
+
+def start_metrics_exporters(config: Optional[Dict] = None) -> None:
+    """
+    Starts the exporters enabled in config.json's METRICS section, once.
+
+    `prometheus_port` enables the HTTP endpoint, `snapshot_path` enables
+    periodic JSON snapshots every `snapshot_interval` seconds.
+    """
+    global _exporters_started
+    config = METRICS_CONFIG if config is None else config
+    with _exporters_lock:
+        if _exporters_started:
+            return
+        _exporters_started = True
+
+    if config.get("prometheus_port"):
+        start_http_server(int(config["prometheus_port"]))
+    if config.get("snapshot_path"):
+        start_snapshot_writer(
+            config["snapshot_path"], float(config.get("snapshot_interval", 30))
+        )
@@ -0,0 +1,204 @@
+import cProfile
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Constants
+PROFILE_DIR = "data/profiles"
+SAMPLE_INTERVAL = 0.005
+
+Label = Tuple[str, str, str]
+
+# Shared by every call while profiling is off, so stages pay one global lookup
+_NULL_CONTEXT = nullcontext()
+_profiler = None
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return (
+        f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    )
+
+
+def _collapse(frame) -> Tuple[str, ...]:
+    """Returns the stack of `frame` from the outermost call inwards."""
+    stack = []
+    while frame is not None:
+        stack.append(_frame_name(frame))
+        frame = frame.f_back
+    return tuple(reversed(stack))
+
+
+class SamplingProfiler:
+    """
+    Samples the stacks of threads running a labelled stage.
+
+    A background thread reads every labelled thread's current frame each
+    `interval` seconds. Stacks are prefixed with the (collection, step,
+    stage) label and aggregated into collapsed-stack lines for flamegraph
+    tools. Threads outside a stage are never sampled.
+    """
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self.seconds: Counter = Counter()
+        self._labels: Dict[int, Label] = {}
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @contextmanager
+    def stage(self, label: Label):
+        ident = threading.get_ident()
+        previous = self._labels.get(ident)
+        self._labels[ident] = label
+        try:
+            yield
+        finally:
+            if previous is None:
+                self._labels.pop(ident, None)
+            else:
+                self._labels[ident] = previous
+
+    def _run(self) -> None:
+        last_sample = time.perf_counter()
+        while not self._stopped.wait(self.interval):
+            # Busy threads delay the sampler through the GIL, so each sample
+            # stands for the time actually elapsed since the previous one
+            now = time.perf_counter()
+            elapsed, last_sample = now - last_sample, now
+            frames = sys._current_frames()
+            for ident, label in list(self._labels.items()):
+                frame = frames.get(ident)
+                if frame is not None:
+                    self.samples[label + _collapse(frame)] += 1
+                    self.seconds[label] += elapsed
+
+    def start(self) -> None:
+        self._thread = threading.Thread(
+            target=self._run, name="profiler-sampler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def stage_seconds(self) -> Dict[Label, float]:
+        """Estimated wall time per (collection, step, stage)."""
+        return dict(self.seconds)
+
+    def write(self, output_dir: str, prefix: str) -> List[str]:
+        path = os.path.join(output_dir, f"{prefix}.folded")
+        with open(path, "w") as folded_file:
+            for stack, count in sorted(self.samples.items()):
+                frames = [frame.replace(";", ":") for frame in stack]
+                folded_file.write(f"{';'.join(frames)} {count}\n")
+        return [path]
+
+
+class DeterministicProfiler:
+    """
+    Runs cProfile around every labelled stage, merging stats per label.
+
+    From Python 3.12 only one cProfile can be active per process, so stages
+    overlapping in other threads are not profiled; run with one worker per
+    stage for complete output.
+    """
+
+    def __init__(self):
+        self.stats: Dict[Label, pstats.Stats] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, label: Label):
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            logger.debug(f"Another profiler is active, not profiling {label}")
+            profile = None
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+                with self._lock:
+                    if label in self.stats:
+                        self.stats[label].add(profile)
+                    else:
+                        self.stats[label] = pstats.Stats(profile)
+
+    def start(self) -> None:
+        pass
+
+    def stop(self) -> None:
+        pass
+
+    def stage_seconds(self) -> Dict[Label, float]:
+        return {label: stats.total_tt for label, stats in self.stats.items()}
+
+    def write(self, output_dir: str, prefix: str) -> List[str]:
+        paths = []
+        for label, stats in self.stats.items():
+            path = os.path.join(output_dir, f"{prefix}.{'.'.join(label)}.prof")
+            stats.dump_stats(path)
+            paths.append(path)
+        return paths
+
+
+PROFILERS = {"sampling": SamplingProfiler, "cprofile": DeterministicProfiler}
+
+
+def profile_stage(collection: str, step: str, stage: str):
+    """
+    Attributes the enclosed block to a collection, step and pipeline stage.
+
+    Returns a shared no-op context manager when profiling is off.
+    """
+    if _profiler is None:
+        return _NULL_CONTEXT
+    return _profiler.stage((collection, step, stage))
+
+
+@contextmanager
+def profiling(output_dir: str = PROFILE_DIR, mode: str = "sampling"):
+    """
+    Profiles every pipeline stage run inside the block.
+
+    Args:
+        output_dir: Directory the profiles are written to on exit
+        mode: "sampling" for collapsed stacks (`.folded`, for flamegraph.pl or
+            speedscope), "cprofile" for one pstats file per stage (`.prof`)
+    """
+    global _profiler
+    if mode not in PROFILERS:
+        raise ValueError(f"Unknown profiling mode {mode}; use one of {list(PROFILERS)}")
+
+    profiler = PROFILERS[mode]()
+    profiler.start()
+    _profiler = profiler
+    try:
+        yield profiler
+    finally:
+        _profiler = None
+        profiler.stop()
+        os.makedirs(output_dir, exist_ok=True)
+        prefix = f"profile-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+        paths = profiler.write(output_dir, prefix)
+        for label, seconds in sorted(
+            profiler.stage_seconds().items(), key=lambda item: -item[1]
+        ):
+            logger.info(f"Profiled {'/'.join(label)}: {seconds:.2f}s")
+        logger.info(f"Wrote profiles: {paths}")
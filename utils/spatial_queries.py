@@ -0,0 +1,262 @@
+import math
+from typing import Dict, List, Optional
+
+from sqlalchemy import bindparam, func, literal, select, text
+
+from connections.sql_connector import get_mysql_engine
+from models.sql.sql_models import Address, AddressLocation
+
+# Mean Earth radius used by ST_Distance_Sphere
+EARTH_RADIUS_M = 6370986
+METERS_PER_DEGREE = math.pi * EARTH_RADIUS_M / 180
+# Envelopes are widened by this fraction against rounding, so that
+# prefiltering never drops a point the exact distance check would keep
+ENVELOPE_MARGIN = 0.01
+# Radius of the first envelope tried by nearest_addresses, in meters
+NEAREST_START_RADIUS_M = 1000
+SRID = 4326
+# MySQL reads SRID 4326 WKT latitude first unless told otherwise
+AXIS_ORDER = "axis-order=long-lat"
+
+
+def _point(lon: float, lat: float):
+    return func.ST_GeomFromText(f"POINT({lon} {lat})", SRID, AXIS_ORDER)
+
+
+def _box(min_lon: float, min_lat: float, max_lon: float, max_lat: float):
+    """
+    Polygon containing the lon/lat box.
+
+    MySQL joins the corners of geographic polygons with geodesics, which
+    bend towards the pole, so east-west edges are pushed out by the
+    furthest such an edge can stray from its parallel.
+    """
+    span = math.radians(max_lon - min_lon)
+    widest = math.radians(min(max(abs(min_lat), abs(max_lat)), 89.9))
+    bend = 2 * math.degrees(span**2 / 8 * math.sin(widest) * math.cos(widest))
+    min_lat, max_lat = max(min_lat - bend, -90), min(max_lat + bend, 90)
+    ring = (
+        f"{min_lon} {min_lat}, {max_lon} {min_lat}, {max_lon} {max_lat}, "
+        f"{min_lon} {max_lat}, {min_lon} {min_lat}"
+    )
+    return func.ST_GeomFromText(f"POLYGON(({ring}))", SRID, AXIS_ORDER)
+
+
+def radius_envelope(lon: float, lat: float, radius_m: float):
+    """
+    Returns a lon/lat box containing every point within `radius_m` of (lon, lat).
+
+    Returns:
+        SQL polygon expression usable with MBRContains
+    """
+    radius_m *= 1 + ENVELOPE_MARGIN
+    lat_delta = radius_m / METERS_PER_DEGREE
+    # Longitude degrees shrink towards the poles; use the widest latitude
+    widest = min(abs(lat) + lat_delta, 89.9)
+    lon_delta = min(
+        radius_m / (METERS_PER_DEGREE * math.cos(math.radians(widest))), 180
+    )
+    return _box(
+        max(lon - lon_delta, -180),
+        max(lat - lat_delta, -90),
+        min(lon + lon_delta, 180),
+        min(lat + lat_delta, 90),
+    )
+
+
+def sync_locations_after_commit(conn, table_name: str, records: List[Dict]) -> None:
+    """
+    Post-commit hook: copies the locations of written addresses to `address_locations`.
+
+    The points are read back from `addresses`, so the copy holds exactly
+    what was stored; addresses that lost their location lose their row.
+    """
+    if table_name != "addresses":
+        return
+    ids = [record["id"] for record in records if record.get("id") is not None]
+    if not ids:
+        return
+    params = {"ids": ids}
+    conn.execute(
+        text(
+            "INSERT INTO address_locations (address_id, geo_point) "
+            "SELECT id, geo_location FROM addresses "
+            "WHERE id IN :ids AND geo_location IS NOT NULL "
+            "ON DUPLICATE KEY UPDATE geo_point = VALUES(geo_point)"
+        ).bindparams(bindparam("ids", expanding=True)),
+        params,
+    )
+    conn.execute(
+        text(
+            "DELETE address_locations FROM address_locations "
+            "JOIN addresses ON addresses.id = address_locations.address_id "
+            "WHERE addresses.id IN :ids AND addresses.geo_location IS NULL"
+        ).bindparams(bindparam("ids", expanding=True)),
+        params,
+    )
+    conn.commit()
+
+
+def _type_filter(address_type: Optional[str]):
+    return [Address.type == address_type] if address_type else []
+
+
+def _located_addresses(*columns):
+    """Selects from the located addresses, whose points carry the SPATIAL index."""
+    return select(*columns).join_from(
+        AddressLocation, Address, Address.id == AddressLocation.address_id
+    )
+
+
+def _address_rows(conn, query) -> List[Dict]:
+    return [dict(row._mapping) for row in conn.execute(query)]
+
+
+def _address_columns(lon: float, lat: float):
+    return [
+        Address.id,
+        Address.order_mongo_id,
+        Address.type,
+        func.ST_Longitude(AddressLocation.geo_point).label("lon"),
+        func.ST_Latitude(AddressLocation.geo_point).label("lat"),
+        func.ST_Distance_Sphere(AddressLocation.geo_point, _point(lon, lat)).label(
+            "distance_m"
+        ),
+    ]
+
+
+def addresses_within_radius(
+    lon: float,
+    lat: float,
+    radius_m: float,
+    address_type: Optional[str] = None,
+    limit: Optional[int] = None,
+    engine=None,
+) -> List[Dict]:
+    """
+    Finds the addresses within `radius_m` meters of a point, closest first.
+
+    The spatial index narrows the table to the radius' bounding box with
+    MBRContains; only those candidates are checked with ST_Distance_Sphere.
+
+    Args:
+        lon: Longitude of the center
+        lat: Latitude of the center
+        radius_m: Search radius in meters
+        address_type: "pickup" or "dropoff" (default: both)
+        limit: Maximum number of addresses returned (default: all)
+        engine: SQLAlchemy engine (default: the MySQL target)
+
+    Returns:
+        List of dicts with id, order_mongo_id, type, lon, lat and distance_m
+    """
+    columns = _address_columns(lon, lat)
+    distance = columns[-1]
+    query = (
+        _located_addresses(*columns)
+        .where(
+            func.MBRContains(
+                radius_envelope(lon, lat, radius_m), AddressLocation.geo_point
+            ),
+            distance <= radius_m,
+            *_type_filter(address_type),
+        )
+        .order_by(distance)
+    )
+    if limit:
+        query = query.limit(limit)
+    with (engine or get_mysql_engine()).connect() as conn:
+        return _address_rows(conn, query)
+
+
+def nearest_addresses(
+    lon: float,
+    lat: float,
+    count: int = 10,
+    address_type: Optional[str] = "pickup",
+    max_radius_m: float = 100000,
+    engine=None,
+) -> List[Dict]:
+    """
+    Finds the `count` addresses closest to a point (default: pickups).
+
+    Searches a growing radius, doubling it until it holds `count` addresses
+    or reaches `max_radius_m`. Every search is an index-assisted radius
+    query, so no query sorts the whole table by distance.
+
+    Args:
+        lon: Longitude of the point
+        lat: Latitude of the point
+        count: Number of addresses wanted
+        address_type: "pickup" or "dropoff", or None for both
+        max_radius_m: Addresses further away than this are never returned
+        engine: SQLAlchemy engine (default: the MySQL target)
+
+    Returns:
+        Up to `count` dicts as returned by addresses_within_radius
+    """
+    engine = engine or get_mysql_engine()
+    radius_m = min(NEAREST_START_RADIUS_M, max_radius_m)
+    while True:
+        rows = addresses_within_radius(
+            lon, lat, radius_m, address_type, limit=count, engine=engine
+        )
+        # Anything outside the radius is further away than what was found
+        if len(rows) >= count or radius_m >= max_radius_m:
+            return rows
+        radius_m = min(radius_m * 2, max_radius_m)
+
+
+def density_grid(
+    min_lon: float,
+    min_lat: float,
+    max_lon: float,
+    max_lat: float,
+    cell_degrees: float = 0.01,
+    address_type: Optional[str] = None,
+    engine=None,
+) -> List[Dict]:
+    """
+    Counts addresses per grid cell of a bounding box.
+
+    Args:
+        min_lon: West edge of the box
+        min_lat: South edge of the box
+        max_lon: East edge of the box
+        max_lat: North edge of the box
+        cell_degrees: Cell width and height in degrees
+        address_type: "pickup" or "dropoff" (default: both)
+        engine: SQLAlchemy engine (default: the MySQL target)
+
+    Returns:
+        List of dicts with the cell's south-west corner (lon, lat) and its
+        address count, for non-empty cells only
+    """
+    point_lon = func.ST_Longitude(AddressLocation.geo_point)
+    point_lat = func.ST_Latitude(AddressLocation.geo_point)
+    column = func.floor((point_lon - literal(min_lon)) / cell_degrees).label("column")
+    row = func.floor((point_lat - literal(min_lat)) / cell_degrees).label("row")
+    query = (
+        _located_addresses(column, row, func.count().label("count"))
+        .where(
+            func.MBRContains(
+                _box(min_lon, min_lat, max_lon, max_lat), AddressLocation.geo_point
+            ),
+            # The prefilter box is slightly larger than the requested one
+            point_lon >= min_lon,
+            point_lon < max_lon,
+            point_lat >= min_lat,
+            point_lat < max_lat,
+            *_type_filter(address_type),
+        )
+        .group_by(column, row)
+    )
+    with (engine or get_mysql_engine()).connect() as conn:
+        return [
+            {
+                "lon": min_lon + int(cell_column) * cell_degrees,
+                "lat": min_lat + int(cell_row) * cell_degrees,
+                "count": int(count),
+            }
+            for cell_column, cell_row, count in conn.execute(query)
+        ]